@@ -7,6 +7,7 @@ from app.config.database import get_db
 from app.schemas.user import User
 
 security = HTTPBearer()
+optional_security = HTTPBearer(auto_error=False)
 
 async def get_current_user(
     credentials: HTTPAuthorizationCredentials = Depends(security),
@@ -35,13 +36,16 @@ async def get_current_user(
     return user
 
 async def get_current_user_optional(
-    credentials: HTTPAuthorizationCredentials = Depends(security),
+    credentials: HTTPAuthorizationCredentials = Depends(optional_security),
     db: AsyncSession = Depends(get_db)
 ):
     """
     Obtiene el usuario actual desde el JWT (opcional)
     Retorna None si no hay token o es inválido
     """
+    if credentials is None:
+        return None
+
     try:
         token = credentials.credentials
         user_id = security_core.verify_token(token)
@@ -55,4 +59,16 @@ async def get_current_user_optional(
         
         return user
     except Exception:
-        return None
\ No newline at end of file
+        return None
+
+
+async def get_current_admin(current_user: User = Depends(get_current_user)):
+    """
+    Exige que el usuario actual sea administrador
+    """
+    if current_user.tipo != "admin":
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Se requieren permisos de administrador"
+        )
+    return current_user
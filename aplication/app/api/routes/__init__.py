@@ -1,5 +1,7 @@
 from .auth import router as auth_router
 from .videos import router as videos_router
 from .public import router as public_router
+from .storage import router as storage_router
+from .admin import router as admin_router
 
-__all__ = ["auth_router", "videos_router", "public_router"]
\ No newline at end of file
+__all__ = ["auth_router", "videos_router", "public_router", "storage_router", "admin_router"]
\ No newline at end of file
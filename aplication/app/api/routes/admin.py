@@ -0,0 +1,75 @@
+import redis
+from fastapi import APIRouter, Depends, HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+from typing import List
+
+from app.config.database import get_db
+from app.config.settings import settings
+from app.api.deps import get_current_admin
+from app.models.admin import ReprocessJobResponse, QueueMetricsResponse
+from app.services.reprocess_service import ReprocessService
+from app.workers.queue_routing import queue_metrics_summary
+
+router = APIRouter()
+
+@router.post(
+    "/reprocesamientos",
+    response_model=ReprocessJobResponse,
+    status_code=status.HTTP_202_ACCEPTED,
+    summary="Reprocesar videos desactualizados",
+    description="Reprocesa por lotes los videos cuya salida se generó con otros parámetros (logo, resolución, duración o pipeline)."
+)
+async def start_reprocess(
+    current_user=Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Los lotes se encolan en una cola de baja prioridad y esperan mientras haya
+    subidas nuevas acumuladas. Requiere JWT de administrador.
+    """
+    try:
+        return await ReprocessService(db).start_job()
+
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error interno del servidor: {str(e)}"
+        )
+
+@router.get(
+    "/reprocesamientos/{job_id}",
+    response_model=ReprocessJobResponse,
+    summary="Progreso del reprocesamiento"
+)
+async def get_reprocess(
+    job_id: str,
+    current_user=Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    return await ReprocessService(db).get_job(job_id)
+
+@router.delete(
+    "/reprocesamientos/{job_id}",
+    response_model=ReprocessJobResponse,
+    summary="Cancelar el reprocesamiento",
+    description="Detiene el encolado de nuevos lotes. Los videos ya encolados terminan."
+)
+async def cancel_reprocess(
+    job_id: str,
+    current_user=Depends(get_current_admin),
+    db: AsyncSession = Depends(get_db)
+):
+    return await ReprocessService(db).cancel_job(job_id)
+
+@router.get(
+    "/metricas/colas",
+    response_model=List[QueueMetricsResponse],
+    summary="Métricas de colas de procesamiento",
+    description="Tareas pendientes y percentiles (segundos) de espera en cola y de tiempo hasta procesado por clase."
+)
+async def get_queue_metrics(current_user=Depends(get_current_admin)):
+    redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+    return await run_in_threadpool(queue_metrics_summary, redis_client)
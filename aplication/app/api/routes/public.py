@@ -1,9 +1,11 @@
 import uuid
-from fastapi import APIRouter, Depends, HTTPException, Query, status
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, status
 from sqlalchemy.ext.asyncio import AsyncSession
 from typing import List, Optional
 
 from app.config.database import get_db
+from app.config.settings import settings
+from app.core.pagination import NEXT_CURSOR_HEADER
 from app.api.deps import get_current_user_optional
 from app.models.user import UserResponse
 from app.models.video import VideoResponse
@@ -20,8 +22,10 @@ router = APIRouter()
     description="Lista todos los videos públicos disponibles para votación. JWT opcional."
 )
 async def list_videos_for_voting(
-    skip: int = 0,
-    limit: int = 50,
+    response: Response,
+    cursor: Optional[str] = Query(None, description="Cursor de la cabecera X-Next-Cursor de la página anterior"),
+    skip: int = Query(0, ge=0, le=settings.PAGINATION_MAX_SKIP, description="Número de registros a saltar (sin cursor)"),
+    limit: int = Query(50, ge=1, le=100, description="Número máximo de registros"),
     db: AsyncSession = Depends(get_db)
 ):
     """
@@ -31,11 +35,17 @@ async def list_videos_for_voting(
     - Estado: 'procesado'
     - Visibilidad: 'publico'
     - Ordenados por fecha de subida (más recientes primero)
+    - Paginación por cursor: si hay más páginas, X-Next-Cursor trae el cursor siguiente
     """
     try:
         video_service = VideoService(db)
-        return await video_service.get_videos_for_voting(skip, limit)
+        videos, siguiente = await video_service.get_videos_for_voting(skip, limit, cursor)
+        if siguiente:
+            response.headers[NEXT_CURSOR_HEADER] = siguiente
+        return videos
     
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -96,8 +106,10 @@ async def vote_for_video(
     description="Muestra el ranking actual de jugadores por votos acumulados. Soporta paginación y filtros por ciudad."
 )
 async def get_rankings(
-    ciudad: Optional[str] = Query(None, description="Filtrar por ciudad"),
-    skip: int = Query(0, ge=0, description="Número de registros a saltar"),
+    response: Response,
+    ciudad: Optional[str] = Query(None, description="Filtrar por ciudad: id o slug exacto (p. ej. santa-marta)"),
+    cursor: Optional[str] = Query(None, description="Cursor de la cabecera X-Next-Cursor de la página anterior"),
+    skip: int = Query(0, ge=0, le=settings.PAGINATION_MAX_SKIP, description="Número de registros a saltar (sin cursor)"),
     limit: int = Query(50, ge=1, le=100, description="Número máximo de registros"),
     db: AsyncSession = Depends(get_db)
 ):
@@ -105,19 +117,23 @@ async def get_rankings(
     Obtiene el ranking de jugadores ordenados por votos.
     
     Características:
-    - Caching con Redis (5 minutos)
-    - Paginación incluida
-    - Filtro por ciudad opcional
+    - Servido desde la tabla de posiciones en Redis, actualizada en cada voto
+    - Si la tabla aún no existe, se calcula desde la BD (cache de 5 minutos)
+    - Paginación por cursor (X-Next-Cursor) o por skip, hasta PAGINATION_MAX_SKIP
+    - Filtro por ciudad opcional (id o slug); las posiciones son las de la ciudad
     - Ordenamiento por votos descendente
     """
     try:
         vote_service = VoteService(db)
-        rankings = await vote_service.get_rankings(
+        rankings, siguiente = await vote_service.get_rankings(
             ciudad=ciudad,
             skip=skip,
-            limit=limit
+            limit=limit,
+            cursor=cursor
         )
         
+        if siguiente:
+            response.headers[NEXT_CURSOR_HEADER] = siguiente
         return rankings
     
     except HTTPException:
@@ -0,0 +1,40 @@
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, status
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.config.database import get_db
+from app.core.storage_backend import get_storage, LocalStorageBackend
+from app.services.direct_upload_service import DirectUploadService
+
+router = APIRouter()
+
+@router.put(
+    "/{key:path}",
+    status_code=status.HTTP_204_NO_CONTENT,
+    summary="Recibir subida firmada",
+    description="Receptor de subidas directas del backend local. Equivale a una URL prefirmada de S3."
+)
+async def receive_signed_upload(
+    key: str,
+    request: Request,
+    expires: int = Query(..., description="Expiración de la firma (epoch)"),
+    signature: str = Query(..., description="Firma HMAC del destino"),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    No requiere JWT: la autorización es la firma emitida por `POST /api/videos/direct-uploads`.
+    Cada firma admite una sola escritura, y ninguna después de confirmar la subida.
+    """
+    storage = get_storage()
+    if not isinstance(storage, LocalStorageBackend):
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Las subidas firmadas se hacen directamente contra el almacenamiento"
+        )
+
+    if not storage.verify_put_signature(key, expires, signature):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Firma inválida o expirada"
+        )
+
+    await DirectUploadService(db).receive_signed_upload(key, request.stream())
@@ -1,13 +1,21 @@
 import uuid
-from fastapi import APIRouter, Depends, UploadFile, File, logger, status, Form, HTTPException
+from fastapi import APIRouter, Depends, UploadFile, File, logger, status, Form, HTTPException, Query, Request
 from sqlalchemy.ext.asyncio import AsyncSession
-from typing import List
+from starlette.concurrency import run_in_threadpool
+from typing import List, Optional
 
 from app.config.database import get_db
-from app.api.deps import get_current_user
+from app.api.deps import get_current_user, get_current_user_optional
 from app.models.user import UserResponse
-from app.models.video import VideoCreate, VideoResponse, VideoUploadResponse, VideoDetailResponse, VideoDeleteResponse
+from app.models.video import (
+    VideoCreate, VideoResponse, VideoUploadResponse, VideoDetailResponse, VideoDeleteResponse,
+    UploadSessionCreate, UploadSessionResponse, UploadProgressResponse,
+    DirectUploadCreate, DirectUploadResponse
+)
+from app.core.streaming import stream_response, media_type_for
 from app.services.video_service import VideoService
+from app.services.upload_service import UploadSessionService
+from app.services.direct_upload_service import DirectUploadService
 
 router = APIRouter()
 
@@ -48,6 +56,128 @@ async def upload_video(
             detail=f"Error interno del servidor: {str(e)}"
         )
 
+@router.post(
+    "/uploads",
+    response_model=UploadSessionResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Crear sesión de subida reanudable",
+    description="Inicia una subida por chunks para videos grandes o conexiones inestables."
+)
+async def create_upload_session(
+    data: UploadSessionCreate,
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Crea una sesión de subida reanudable.
+
+    El cliente debe enviar cada chunk con `PUT /uploads/{upload_id}/chunks/{index}`
+    usando el `chunk_size` retornado, y finalizar con `POST /uploads/{upload_id}/complete`.
+    """
+    upload_service = UploadSessionService(db)
+    return await upload_service.create_session(current_user.id, data)
+
+@router.put(
+    "/uploads/{upload_id}/chunks/{index}",
+    response_model=UploadProgressResponse,
+    summary="Subir chunk",
+    description="Sube el chunk número `index` de una sesión. Reenviar un chunk lo reemplaza."
+)
+async def upload_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Offset en bytes del chunk dentro del archivo"),
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Recibe el cuerpo crudo del request como contenido del chunk.
+    """
+    upload_service = UploadSessionService(db)
+    return await upload_service.upload_chunk(current_user.id, upload_id, index, offset, request.stream())
+
+@router.get(
+    "/uploads/{upload_id}",
+    response_model=UploadProgressResponse,
+    summary="Consultar progreso de subida",
+    description="Indica qué chunks se han recibido y cuáles faltan para poder reanudar."
+)
+async def get_upload_progress(
+    upload_id: str,
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    upload_service = UploadSessionService(db)
+    return await upload_service.get_progress(current_user.id, upload_id)
+
+@router.post(
+    "/uploads/{upload_id}/complete",
+    response_model=VideoUploadResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Finalizar subida reanudable",
+    description="Ensambla los chunks recibidos e inicia el procesamiento asíncrono del video."
+)
+async def complete_upload_session(
+    upload_id: str,
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    try:
+        upload_service = UploadSessionService(db)
+        return await upload_service.complete_session(current_user.id, upload_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error interno del servidor: {str(e)}"
+        )
+
+@router.post(
+    "/direct-uploads",
+    response_model=DirectUploadResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Solicitar subida directa",
+    description="Retorna un destino firmado para subir el video directamente al almacenamiento, sin pasar por el API."
+)
+async def create_direct_upload(
+    data: DirectUploadCreate,
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    """
+    Autoriza una subida directa.
+
+    El cliente envía el archivo con el `method` y `headers` indicados a `upload_url`
+    antes de `expires_at`, y luego confirma con `POST /direct-uploads/{video_id}/complete`.
+    """
+    direct_upload_service = DirectUploadService(db)
+    return await direct_upload_service.create_upload(current_user.id, data)
+
+@router.post(
+    "/direct-uploads/{video_id}/complete",
+    response_model=VideoUploadResponse,
+    status_code=status.HTTP_201_CREATED,
+    summary="Confirmar subida directa",
+    description="Verifica el objeto subido e inicia el procesamiento asíncrono del video."
+)
+async def complete_direct_upload(
+    video_id: str,
+    current_user: UserResponse = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    try:
+        direct_upload_service = DirectUploadService(db)
+        return await direct_upload_service.complete_upload(current_user.id, video_id)
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"Error interno del servidor: {str(e)}"
+        )
+
 @router.get(
     "",
     response_model=List[VideoResponse],
@@ -119,6 +249,40 @@ async def get_video_detail(
             detail=f"Error interno del servidor: {str(e)}"
         )
 
+@router.get(
+    "/{video_id}/stream",
+    summary="Reproducir video",
+    description="Entrega el video con soporte de Range (206). Los videos públicos no requieren JWT; los originales solo para su dueño."
+)
+async def stream_video(
+    video_id: str,
+    request: Request,
+    variante: str = Query("procesado", pattern="^(procesado|original)$", description="procesado u original"),
+    current_user: Optional[UserResponse] = Depends(get_current_user_optional),
+    db: AsyncSession = Depends(get_db)
+):
+    video_service = VideoService(db)
+    storage_key = await video_service.get_stream_key(current_user.id if current_user else None, video_id, variante)
+    return await run_in_threadpool(stream_response, video_service.storage, storage_key, request.headers.get("range"))
+
+@router.get(
+    "/{video_id}/assets/{nombre:path}",
+    summary="Archivos derivados del video",
+    description="Póster, sprite, índice VTT y HLS del video procesado, con el mismo control de acceso que /stream."
+)
+async def get_video_asset(
+    video_id: str,
+    nombre: str,
+    request: Request,
+    current_user: Optional[UserResponse] = Depends(get_current_user_optional),
+    db: AsyncSession = Depends(get_db)
+):
+    video_service = VideoService(db)
+    storage_key = await video_service.get_asset_key(current_user.id if current_user else None, video_id, nombre)
+    return await run_in_threadpool(
+        stream_response, video_service.storage, storage_key, request.headers.get("range"), media_type_for(storage_key)
+    )
+
 @router.delete(
     "/{video_id}",
     response_model=VideoDeleteResponse,
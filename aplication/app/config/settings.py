@@ -23,8 +23,33 @@ class Settings(BaseSettings):
     UPLOAD_DIR: str = "/storage/uploads"
     PROCESSED_DIR: str = "/storage/processed"
     MAX_FILE_SIZE: int = 100 * 1024 * 1024  # 100MB
+    UPLOAD_CHUNK_SIZE: int = 1024 * 1024  # 1MB por bloque al escribir uploads
+    RESUMABLE_CHUNK_SIZE: int = 5 * 1024 * 1024  # 5MB por chunk en subidas reanudables
+    RESUMABLE_SESSION_TTL: int = 24 * 60 * 60  # Sesiones de subida expiran en 24h
     ALLOWED_EXTENSIONS: List[str] = ["mp4"]
     
+    # Storage backend ("local" = volumen compartido, "s3" = API compatible con S3)
+    STORAGE_BACKEND: str = "local"
+    STORAGE_ROOT: str = "/storage"
+    STORAGE_PUBLIC_URL: str = "/storage"  # Prefijo servido por nginx para el backend local
+    STORAGE_STAGING_DIR: str = "/storage/uploads/tmp"  # Uploads en curso antes de guardarse
+    PROCESSING_WORK_DIR: str = "/storage/processed/tmp"  # Espacio de trabajo de ffmpeg
+    PROCESSING_LEASE_TTL: int = 60  # Segundos de la concesión por video (se renueva cada TTL/3)
+    LOGO_PATH: str = "/storage/assets/logoANB.png"
+    DIRECT_UPLOAD_EXPIRATION: int = 15 * 60  # Validez de los destinos de subida firmados
+    LOCAL_SIGNED_UPLOAD_URL: str = "/api/storage"  # Receptor de PUT firmados del backend local
+    STREAM_ACCEL_REDIRECT: Optional[str] = None  # Prefijo interno de nginx (p. ej. "/protected") para X-Accel-Redirect
+    STREAM_URL_EXPIRATION: int = 300  # Validez de la URL prefirmada al reproducir desde S3
+    S3_BUCKET: str = "anb-videos"
+    S3_ENDPOINT_URL: Optional[str] = None  # p. ej. http://minio:9000 para pruebas locales
+    S3_REGION: Optional[str] = None
+    S3_ACCESS_KEY_ID: Optional[str] = None  # Sin credenciales se usa el rol IAM de la instancia
+    S3_SECRET_ACCESS_KEY: Optional[str] = None
+    S3_PUBLIC_URL: Optional[str] = None  # CDN/URL pública; si no, URLs prefirmadas
+    S3_PART_SIZE: int = 8 * 1024 * 1024
+    S3_MAX_CONCURRENCY: int = 4
+    S3_URL_EXPIRATION: int = 3600
+    
     # CORS
     ALLOWED_HOSTS: List[str] = ["http://localhost:3000", "http://127.0.0.1:3000","http://localhost:8000"]
     
@@ -32,6 +57,59 @@ class Settings(BaseSettings):
     MAX_VIDEO_DURATION: int = 480  # 5 minutos máximo original
     TARGET_DURATION: int = 30      # 30 segundos procesado
     TARGET_RESOLUTION: str = "1280x720"
+    TARGET_CODECS: List[str] = ["h264"]  # Códecs que pueden copiarse sin recodificar
+    TARGET_PIX_FMT: str = "yuv420p"  # Formato de píxel de la salida (8 bits 4:2:0)
+    TARGET_H264_PROFILES: List[int] = [66, 77, 100]  # Baseline, Main y High: se copian sin recodificar
+    FAST_PATH_LOGO_OVERLAY: bool = True  # Camino rápido: logo con codificación ligera (False: remux sin logo)
+    PARALLEL_ENCODING: bool = False  # Codificar por segmentos en paralelo
+    PARALLEL_SEGMENTS: int = 0       # Número de segmentos (0: núcleos disponibles)
+    HLS_ENABLED: bool = False        # Generar además una escalera HLS
+    HLS_RENDITIONS: List[str] = ["1280x720:2800k", "854x480:1400k", "640x360:800k"]
+    HLS_SEGMENT_DURATION: int = 4    # Segundos por segmento (keyframes alineados)
+    THUMBNAIL_FORMAT: str = "jpg"    # jpg o webp para póster y sprite
+    SPRITE_INTERVAL: int = 2         # Segundos entre miniaturas del sprite
+    SPRITE_COLUMNS: int = 5
+    SPRITE_THUMBNAIL_SIZE: str = "160x90"
+    PIPELINE_VERSION: str = "1"      # Incrementar al cambiar la salida del pipeline (invalida el caché)
+    LOGO_VERSION: str = "1"          # Incrementar al reemplazar el archivo de LOGO_PATH
+    OUTPUT_CACHE_ENABLED: bool = True
+    OUTPUT_CACHE_DIR: str = "/storage/processed/cache"  # Mismo volumen que PROCESSING_WORK_DIR para enlazar sin copiar
+    OUTPUT_CACHE_MAX_BYTES: int = 5 * 1024 * 1024 * 1024
+
+    # Colas por costo de procesamiento (segundos efectivos × píxeles del original)
+    VIDEO_EXPRESS_QUEUE: str = "video_express"
+    VIDEO_BULK_QUEUE: str = "video_processing"
+    EXPRESS_MAX_COST: int = 15 * 1280 * 720  # Hasta este costo el video va a la cola express
+    QUEUE_METRICS_SAMPLES: int = 1000        # Muestras recientes por clase para los percentiles
+
+    # Outbox de tareas y recuperación de videos atascados
+    OUTBOX_BATCH_SIZE: int = 100
+    OUTBOX_RETENTION_DAYS: int = 7         # Las filas enviadas se conservan para auditoría
+    STUCK_UPLOADED_AFTER: int = 15 * 60    # Segundos en "subido" sin encolado reciente
+    STUCK_PROCESSING_AFTER: int = 15 * 60  # Segundos en "procesando" sin concesión activa
+    STUCK_MAX_REQUEUES: int = 3            # Reencolados antes de marcarlo como error
+    STUCK_BATCH_SIZE: int = 100
+    STUCK_MAX_BACKLOG: int = 500           # Con más mensajes en la cola no se revisan los "subido"
+
+    # Recolector de archivos huérfanos del almacenamiento local
+    GC_GRACE_PERIOD: int = 24 * 3600  # Solo se eliminan huérfanos sin modificar en este tiempo
+    GC_BATCH_SIZE: int = 1000         # Entradas revisadas por ejecución
+    GC_DRY_RUN: bool = False          # Solo reportar, sin eliminar
+
+    # Reconstrucción de la tabla Ranking
+    RANKING_REBUILD_MODE: str = "sql"  # sql: INSERT ... SELECT con RANK(); orm: un objeto Ranking por jugador
+    RANKING_SNAPSHOT_RETENTION: int = 10 * 60  # Segundos que se conserva un snapshot reemplazado
+    RANKING_WATERMARK_LAG: int = 60  # Segundos de margen: la reconstrucción cuenta los votos anteriores a ahora - margen
+    CITY_CATALOG_TTL: int = 3600               # Segundos de cache del catálogo de ciudades
+
+    # Paginación de listados públicos
+    PAGINATION_MAX_SKIP: int = 1000  # Páginas más profundas deben usar el cursor
+
+    # Reprocesamiento masivo (cola de baja prioridad)
+    REPROCESS_QUEUE: str = "video_reprocessing"
+    REPROCESS_BATCH_SIZE: int = 20       # Videos encolados por lote
+    REPROCESS_BATCH_INTERVAL: int = 60   # Segundos entre lotes
+    REPROCESS_MAX_BACKLOG: int = 10      # Si la cola principal tiene más tareas, el lote espera
     
     class Config:
         env_file = ".env"
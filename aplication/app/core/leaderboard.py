@@ -0,0 +1,221 @@
+"""
+Tabla de posiciones en tiempo real sobre sorted sets de Redis.
+
+Por temporada hay un sorted set global y uno por ciudad con jugador_id ->
+votos, más un hash con el perfil (nombre y ciudad) de cada jugador para
+armar la respuesta sin ir a la BD. Cada voto confirmado incrementa los
+puntajes con ``ZINCRBY``; la reconstrucción periódica desde la BD reemplaza
+los conjuntos completos y corrige cualquier desvío (votos cuyo incremento
+falló, videos que dejaron de ser públicos, etc.).
+
+La reconstrucción cuenta los votos hasta una marca de agua (``fecha_voto``
+en segundos enteros, como la guarda la BD). Cada incremento posterior a la
+marca vigente queda además en un diario de la temporada; al reemplazar las
+tablas se suman los del diario posteriores a la marca nueva, y los
+incrementos que llegan tarde para votos ya contados se descartan. Así no se
+pierden ni se duplican los votos que llegan durante la reconstrucción.
+
+El incremento solo se aplica si la tabla de la temporada ya existe: mientras
+la reconstrucción no la haya creado, las lecturas usan la BD.
+
+Todas las fuentes del ranking usan la misma regla de posiciones que
+``RANK()``: los empates comparten posición y la siguiente salta (1, 2, 2, 4),
+con los empatados ordenados por jugador_id descendente como en el sorted set.
+"""
+import json
+import calendar
+from datetime import datetime
+
+from redis.exceptions import WatchError
+
+PROFILES_KEY = "leaderboard:perfiles"
+TIE_BATCH = 500
+
+INCREMENT_SCRIPT = """
+local marca = redis.call('get', KEYS[6])
+if marca and tonumber(ARGV[6]) <= tonumber(marca) then
+    return 1
+end
+redis.call('zadd', KEYS[5], ARGV[6], ARGV[5])
+redis.call('hset', KEYS[4], ARGV[2], ARGV[4])
+if redis.call('exists', KEYS[1]) == 1 then
+    redis.call('zincrby', KEYS[1], ARGV[1], ARGV[2])
+    redis.call('zincrby', KEYS[2], ARGV[1], ARGV[2])
+    redis.call('sadd', KEYS[3], ARGV[3])
+    return 1
+end
+return 0
+"""
+
+
+def current_season() -> str:
+    """Temporada actual en formato YYYY-Qn"""
+    now = datetime.now()
+    return f"{now.year}-Q{(now.month - 1) // 3 + 1}"
+
+def global_key(temporada: str) -> str:
+    return f"leaderboard:{temporada}:global"
+
+def city_key(temporada: str, ciudad_id: str) -> str:
+    return f"leaderboard:{temporada}:ciudad:{ciudad_id}"
+
+def cities_key(temporada: str) -> str:
+    """Conjunto de ciudades con tabla en la temporada, para poder reemplazarlas"""
+    return f"leaderboard:{temporada}:ciudades"
+
+def journal_key(temporada: str) -> str:
+    """Votos incrementados tras la marca de agua, pendientes de la próxima reconstrucción"""
+    return f"leaderboard:{temporada}:diario"
+
+def watermark_key(temporada: str) -> str:
+    """Marca de agua (epoch) de la última reconstrucción"""
+    return f"leaderboard:{temporada}:marca"
+
+def vote_mark(fecha_voto: datetime) -> int:
+    """Epoch en segundos enteros de una fecha UTC, la misma precisión con que se guarda el voto"""
+    return calendar.timegm(fecha_voto.utctimetuple())
+
+def player_profile(nombre: str, apellido: str, ciudad_nombre: str) -> str:
+    return json.dumps({"username": f"{nombre} {apellido}", "city": ciudad_nombre})
+
+def competition_rank(estado: dict, grupo, puntaje) -> int:
+    """
+    Posición según RANK() para filas recorridas en orden descendente de
+    puntaje; ``estado`` guarda por grupo (global o ciudad) lo ya recorrido.
+    """
+    vistas, ultimo, posicion = estado.get(grupo, (0, None, 0))
+    vistas += 1
+    if puntaje != ultimo:
+        posicion = vistas
+    estado[grupo] = (vistas, puntaje, posicion)
+    return posicion
+
+def _text(valor) -> str:
+    return valor.decode() if isinstance(valor, bytes) else valor
+
+
+class Leaderboard:
+
+    def __init__(self, redis_client, temporada: str = None):
+        self.redis_client = redis_client
+        self.temporada = temporada or current_season()
+        self._increment = redis_client.register_script(INCREMENT_SCRIPT)
+
+    def increment(self, voto_id: str, fecha_voto: datetime, jugador_id: str, ciudad_id: str, perfil: str,
+                  votos: int = 1) -> bool:
+        """
+        Suma votos al jugador; False si la tabla de la temporada aún no existe.
+        Un voto anterior a la marca de agua ya está en la tabla y se ignora.
+        """
+        keys = [global_key(self.temporada), city_key(self.temporada, ciudad_id),
+                cities_key(self.temporada), PROFILES_KEY,
+                journal_key(self.temporada), watermark_key(self.temporada)]
+        entrada = json.dumps([voto_id, jugador_id, ciudad_id, votos])
+        return bool(self._increment(keys=keys, args=[votos, jugador_id, ciudad_id, perfil, entrada,
+                                                     vote_mark(fecha_voto)]))
+
+    def top(self, skip: int = 0, limit: int = 50, ciudad_id: str = None, despues_de: tuple = None):
+        """
+        Página de la tabla global o de una ciudad; con ``despues_de`` (votos,
+        jugador_id) empieza tras esa clave e ignora ``skip``. Retorna None si
+        la tabla no existe o falta algún perfil, para que el llamador use la BD.
+        """
+        key = city_key(self.temporada, ciudad_id) if ciudad_id else global_key(self.temporada)
+        if despues_de:
+            skip = self._offset_after(key, *despues_de)
+        pipe = self.redis_client.pipeline(transaction=False)
+        pipe.exists(global_key(self.temporada))
+        pipe.zrevrange(key, skip, skip + limit - 1, withscores=True)
+        existe, filas = pipe.execute()
+        if not existe:
+            return None
+        if not filas:
+            return []
+
+        jugadores = [_text(jugador_id) for jugador_id, _ in filas]
+        perfiles = self.redis_client.hmget(PROFILES_KEY, jugadores)
+        if any(perfil is None for perfil in perfiles):
+            return None
+
+        # La primera fila se ubica tras quienes tienen estrictamente más votos (puede empatar con la página anterior)
+        mas_votos = self.redis_client.zcount(key, f"({filas[0][1]}", "+inf") if skip else 0
+        estado = {None: (skip, filas[0][1], mas_votos + 1)}
+
+        rankings = []
+        for jugador_id, (_, votos), perfil in zip(jugadores, filas, perfiles):
+            posicion = competition_rank(estado, None, votos)
+            datos = json.loads(perfil)
+            rankings.append({
+                "position": posicion,
+                "username": datos["username"],
+                "city": datos["city"],
+                "votes": int(votos),
+                "player_id": jugador_id
+            })
+        return rankings
+
+    def _offset_after(self, key: str, votos: int, jugador_id: str) -> int:
+        """Índice de la primera fila posterior a (votos, jugador_id) en orden (votos desc, jugador_id desc)"""
+        if self.redis_client.zscore(key, jugador_id) == votos:
+            return self.redis_client.zrevrank(key, jugador_id) + 1
+
+        # El jugador cambió de puntaje: se saltan los de más votos y los empatados con id mayor
+        mayores = self.redis_client.zcount(key, f"({votos}", "+inf")
+        desde = 0
+        while True:
+            empatados = self.redis_client.zrevrangebyscore(key, votos, votos, start=desde, num=TIE_BATCH)
+            for miembro in empatados:
+                if _text(miembro) < jugador_id:
+                    return mayores + desde
+                desde += 1
+            if len(empatados) < TIE_BATCH:
+                return mayores + desde
+
+    def rebuild(self, filas: list, marca: datetime):
+        """
+        Reemplaza las tablas de la temporada en una transacción MULTI/EXEC.
+        ``filas``: (jugador_id, ciudad_id, votos, perfil) con los votos hasta
+        ``marca``; se les suman los del diario posteriores. Si un voto entra
+        al diario mientras tanto, la transacción se reintenta.
+        """
+        corte = vote_mark(marca)
+        with self.redis_client.pipeline(transaction=True) as pipe:
+            while True:
+                try:
+                    pipe.watch(journal_key(self.temporada))
+                    pendientes = pipe.zrangebyscore(journal_key(self.temporada), f"({corte}", "+inf")
+                    anteriores = [_text(c) for c in pipe.smembers(cities_key(self.temporada))]
+                    globales, por_ciudad, perfiles = self._merge(filas, pendientes)
+
+                    pipe.multi()
+                    pipe.delete(global_key(self.temporada), cities_key(self.temporada),
+                                *(city_key(self.temporada, c) for c in anteriores))
+                    if globales:
+                        pipe.zadd(global_key(self.temporada), globales)
+                        for ciudad_id, puntajes in por_ciudad.items():
+                            pipe.zadd(city_key(self.temporada, ciudad_id), puntajes)
+                        pipe.sadd(cities_key(self.temporada), *por_ciudad)
+                    if perfiles:
+                        pipe.hset(PROFILES_KEY, mapping=perfiles)
+                    pipe.set(watermark_key(self.temporada), corte)
+                    pipe.zremrangebyscore(journal_key(self.temporada), "-inf", corte)
+                    pipe.execute()
+                    return
+                except WatchError:
+                    continue
+
+    def _merge(self, filas: list, pendientes: list) -> tuple:
+        """Puntajes (global, por ciudad) y perfiles de las filas más los votos pendientes del diario"""
+        globales, por_ciudad, perfiles = {}, {}, {}
+        for jugador_id, ciudad_id, votos, perfil in filas:
+            globales[jugador_id] = votos
+            por_ciudad.setdefault(ciudad_id, {})[jugador_id] = votos
+            perfiles[jugador_id] = perfil
+
+        # El perfil de los jugadores del diario lo guarda su incremento
+        for entrada in pendientes:
+            _, jugador_id, ciudad_id, votos = json.loads(_text(entrada))
+            globales[jugador_id] = globales.get(jugador_id, 0) + votos
+            ciudad = por_ciudad.setdefault(ciudad_id, {})
+            ciudad[jugador_id] = ciudad.get(jugador_id, 0) + votos
+        return globales, por_ciudad, perfiles
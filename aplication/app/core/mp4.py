@@ -0,0 +1,381 @@
+"""
+Lector mínimo de MP4 (ISO-BMFF) en Python puro.
+
+Obtiene duración, resolución y códec leyendo las cajas ``ftyp`` y ``moov``
+sin lanzar ffprobe, tanto desde un archivo (saltando ``mdat`` con seek) como
+a partir de los bloques de una subida en curso. Para H.264 también el perfil
+y el formato de píxel (del SPS en ``avcC``), la relación de aspecto de píxel
+(``pasp``) y si la cadencia de cuadros es variable (``stts``).
+"""
+import os
+import struct
+from typing import Callable, Dict, Iterator, Optional, Tuple
+
+# Marcas de la familia MP4 aceptadas en ftyp (major o compatible)
+MP4_BRANDS = {
+    b"isom", b"iso2", b"iso3", b"iso4", b"iso5", b"iso6",
+    b"mp41", b"mp42", b"avc1", b"M4V ", b"dash", b"msnv",
+}
+
+CODECS = {
+    b"avc1": "h264", b"avc3": "h264",
+    b"hvc1": "hevc", b"hev1": "hevc",
+    b"mp4v": "mpeg4", b"av01": "av1", b"vp09": "vp9",
+    b"mp4a": "aac", b"Opus": "opus", b"ac-3": "ac3",
+}
+
+# Perfiles H.264 cuyo SPS declara croma y profundidad de bits (el resto es 4:2:0 de 8 bits)
+H264_HIGH_PROFILES = {100, 110, 122, 244, 44, 83, 86, 118, 128, 138, 139, 134, 135}
+CHROMA_FORMATS = {0: "gray", 1: "yuv420p", 2: "yuv422p", 3: "yuv444p"}
+
+# Bytes fijos de una entrada de muestra visual antes de sus cajas hijas (avcC, pasp...)
+VISUAL_SAMPLE_ENTRY_SIZE = 78
+
+# Cajas contenedoras que se recorren para llegar a mvhd/tkhd/stsd
+CONTAINER_BOXES = {b"moov", b"trak", b"mdia", b"minf", b"stbl", b"mvex"}
+
+# Límite de tamaño para cajas que se cargan completas en memoria
+MAX_METADATA_BOX_SIZE = 64 * 1024 * 1024
+
+
+class Mp4Error(ValueError):
+    """El contenido no es un MP4 válido o no se pudo interpretar"""
+
+
+def _read_box_header(data: bytes, offset: int, end: int,
+                     container_end: Optional[int] = None) -> Optional[Tuple[bytes, int, int]]:
+    """
+    Lee la cabecera de una caja. Retorna (tipo, tamaño_cabecera, tamaño_total)
+    o None si no hay bytes suficientes. Una caja de tamaño 0 se extiende hasta
+    ``container_end`` (por defecto ``end``).
+    """
+    if end - offset < 8:
+        return None
+    size, box_type = struct.unpack_from(">I4s", data, offset)
+    header_size = 8
+    if size == 1:
+        if end - offset < 16:
+            return None
+        size = struct.unpack_from(">Q", data, offset + 8)[0]
+        header_size = 16
+    elif size == 0:
+        size = (end if container_end is None else container_end) - offset
+    if size < header_size:
+        raise Mp4Error(f"Caja '{box_type!r}' con tamaño inválido: {size}")
+    return box_type, header_size, size
+
+
+def _iter_boxes(data: bytes, start: int, end: int) -> Iterator[Tuple[bytes, int, int]]:
+    """Itera las cajas hijas en data[start:end] como (tipo, inicio_payload, fin)"""
+    offset = start
+    while offset < end:
+        header = _read_box_header(data, offset, end)
+        if header is None:
+            break
+        box_type, header_size, size = header
+        box_end = min(offset + size, end)
+        yield box_type, offset + header_size, box_end
+        offset += size
+
+
+def parse_ftyp(payload: bytes) -> str:
+    """Valida la caja ftyp y retorna la marca principal"""
+    if len(payload) < 8:
+        raise Mp4Error("Caja ftyp incompleta")
+    major_brand = payload[:4]
+    compatible = {payload[i:i + 4] for i in range(8, len(payload) - 3, 4)}
+    if major_brand not in MP4_BRANDS and not (compatible & MP4_BRANDS):
+        raise Mp4Error(f"Marca de archivo no soportada: {major_brand.decode('latin-1').strip()}")
+    return major_brand.decode("latin-1").strip()
+
+
+def _parse_mvhd(data: bytes, start: int) -> Tuple[int, int]:
+    version = data[start]
+    if version == 1:
+        timescale, duration = struct.unpack_from(">IQ", data, start + 20)
+    else:
+        timescale, duration = struct.unpack_from(">II", data, start + 12)
+    return timescale, duration
+
+
+def _parse_tkhd(data: bytes, start: int) -> Tuple[int, int]:
+    version = data[start]
+    # version/flags + tiempos + track_id + reservado + duración, luego 52 bytes hasta width
+    offset = start + (4 + 32 if version == 1 else 4 + 20) + 52
+    width, height = struct.unpack_from(">II", data, offset)
+    return width >> 16, height >> 16
+
+
+class _BitReader:
+    """Lector de bits con Exp-Golomb para el RBSP de un SPS"""
+
+    def __init__(self, data: bytes):
+        self.data = data
+        self.pos = 0
+
+    def bits(self, n: int) -> int:
+        valor = 0
+        for _ in range(n):
+            valor = (valor << 1) | ((self.data[self.pos >> 3] >> (7 - (self.pos & 7))) & 1)
+            self.pos += 1
+        return valor
+
+    def ue(self) -> int:
+        ceros = 0
+        while not self.bits(1):
+            ceros += 1
+            if ceros > 31:
+                raise ValueError("Exp-Golomb inválido")
+        return (1 << ceros) - 1 + self.bits(ceros)
+
+
+def _parse_h264_sps(nal: bytes) -> Dict:
+    """Perfil y formato de píxel (p. ej. ``yuv420p``, ``yuv420p10le``) de un SPS; vacío si no se entiende"""
+    try:
+        lector = _BitReader(nal[1:].replace(b"\x00\x00\x03", b"\x00\x00"))
+        perfil = lector.bits(8)
+        lector.bits(16)  # restricciones y nivel
+        lector.ue()  # seq_parameter_set_id
+        croma, profundidad = 1, 8
+        if perfil in H264_HIGH_PROFILES:
+            croma = lector.ue()
+            if croma == 3:
+                lector.bits(1)  # separate_colour_plane_flag
+            profundidad = lector.ue() + 8
+    except (IndexError, ValueError):
+        return {}
+    pix_fmt = CHROMA_FORMATS.get(croma)
+    if pix_fmt and profundidad != 8:
+        pix_fmt = f"{pix_fmt}{profundidad}le"
+    return {"perfil": perfil, "pix_fmt": pix_fmt}
+
+
+def _parse_avcc(data: bytes, start: int, end: int) -> Dict:
+    """Lee el primer SPS de la caja avcC"""
+    if end - start < 8 or not data[start + 5] & 0x1F:
+        return {}
+    sps_size = struct.unpack_from(">H", data, start + 6)[0]
+    return _parse_h264_sps(data[start + 8:min(start + 8 + sps_size, end)])
+
+
+def _parse_stsd(data: bytes, start: int, end: int) -> Tuple[Optional[bytes], int, int, Dict]:
+    """Retorna (tipo_muestra, ancho, alto, extras) de la primera entrada de stsd"""
+    entries = list(_iter_boxes(data, start + 8, end))
+    if not entries:
+        return None, 0, 0, {}
+    entry_type, entry_start, entry_end = entries[0]
+    width = height = 0
+    extras = {}
+    if entry_end - entry_start >= 28:
+        # 6 reservados + data_reference_index + 16 predefinidos/reservados
+        width, height = struct.unpack_from(">HH", data, entry_start + 24)
+    for child_type, child_start, child_end in _iter_boxes(data, entry_start + VISUAL_SAMPLE_ENTRY_SIZE, entry_end):
+        if child_type == b"avcC":
+            extras.update(_parse_avcc(data, child_start, child_end))
+        elif child_type == b"pasp" and child_end - child_start >= 8:
+            h_spacing, v_spacing = struct.unpack_from(">II", data, child_start)
+            extras["sar"] = "1:1" if h_spacing == v_spacing else f"{h_spacing}:{v_spacing}"
+    return entry_type, width, height, extras
+
+
+def _variable_frame_rate(data: bytes, start: int) -> bool:
+    """Si stts declara más de una duración de muestra (la última entrada puede ser más corta)"""
+    entradas = struct.unpack_from(">I", data, start + 4)[0]
+    duraciones = {struct.unpack_from(">I", data, start + 8 + i * 8 + 4)[0] for i in range(max(entradas - 1, 0))}
+    return len(duraciones) > 1
+
+
+def _parse_trak(data: bytes, start: int, end: int) -> Dict:
+    track = {"handler": None, "sample_type": None, "ancho": 0, "alto": 0, "extras": {}, "fps_variable": False}
+
+    def walk(box_start: int, box_end: int):
+        for box_type, payload_start, payload_end in _iter_boxes(data, box_start, box_end):
+            if box_type == b"tkhd":
+                track["ancho"], track["alto"] = _parse_tkhd(data, payload_start)
+            elif box_type == b"hdlr":
+                track["handler"] = data[payload_start + 8:payload_start + 12]
+            elif box_type == b"stsd":
+                sample_type, width, height, track["extras"] = _parse_stsd(data, payload_start, payload_end)
+                track["sample_type"] = sample_type
+                if not track["ancho"] and width:
+                    track["ancho"], track["alto"] = width, height
+            elif box_type == b"stts":
+                track["fps_variable"] = _variable_frame_rate(data, payload_start)
+            elif box_type in CONTAINER_BOXES:
+                walk(payload_start, payload_end)
+
+    walk(start, end)
+    return track
+
+
+def parse_moov(data: bytes) -> Dict:
+    """
+    Interpreta el payload de una caja moov y retorna los metadatos del video
+    """
+    try:
+        return _parse_moov(data)
+    except (struct.error, IndexError) as e:
+        raise Mp4Error(f"Caja moov truncada o corrupta: {e}")
+
+
+def _parse_moov(data: bytes) -> Dict:
+    timescale = duration = 0
+    fragment_duration = 0
+    video_track = None
+    tiene_audio = False
+
+    for box_type, payload_start, payload_end in _iter_boxes(data, 0, len(data)):
+        if box_type == b"mvhd":
+            timescale, duration = _parse_mvhd(data, payload_start)
+        elif box_type == b"mvex":
+            for child_type, child_start, _ in _iter_boxes(data, payload_start, payload_end):
+                if child_type == b"mehd":
+                    fmt = ">Q" if data[child_start] == 1 else ">I"
+                    fragment_duration = struct.unpack_from(fmt, data, child_start + 4)[0]
+        elif box_type == b"trak":
+            track = _parse_trak(data, payload_start, payload_end)
+            if track["handler"] == b"vide" and video_track is None:
+                video_track = track
+            elif track["handler"] == b"soun":
+                tiene_audio = True
+
+    if not timescale:
+        raise Mp4Error("No se encontró la caja mvhd")
+    if video_track is None:
+        raise Mp4Error("El archivo no contiene una pista de video")
+
+    sample_type = video_track["sample_type"] or b""
+    return {
+        "duracion": (duration or fragment_duration) / timescale,
+        "ancho": video_track["ancho"],
+        "alto": video_track["alto"],
+        "resolucion": f"{video_track['ancho']}x{video_track['alto']}",
+        "codec": CODECS.get(sample_type, sample_type.decode("latin-1").strip() or None),
+        "perfil": video_track["extras"].get("perfil"),
+        "pix_fmt": video_track["extras"].get("pix_fmt"),
+        "sar": video_track["extras"].get("sar", "1:1"),
+        "fps_variable": video_track["fps_variable"],
+        "tiene_audio": tiene_audio,
+    }
+
+
+def probe_reader(read_at: Callable[[int, int], bytes], size: int) -> Dict:
+    """
+    Recorre las cajas de primer nivel usando lecturas por rango
+    (``read_at(offset, length)``), saltando ``mdat`` sin leerlo.
+    Sirve tanto para archivos locales como para objetos remotos.
+    """
+    offset = 0
+    brand = None
+    while offset < size:
+        header = read_at(offset, 16)
+        parsed = _read_box_header(header, 0, min(len(header), size - offset), size - offset)
+        if parsed is None:
+            break
+        box_type, header_size, box_size = parsed
+        if offset == 0 and box_type != b"ftyp":
+            raise Mp4Error("El archivo no inicia con una caja ftyp")
+
+        if box_type in (b"ftyp", b"moov"):
+            if box_size > MAX_METADATA_BOX_SIZE:
+                raise Mp4Error(f"Caja {box_type.decode()} demasiado grande")
+            payload = read_at(offset + header_size, box_size - header_size)
+            if box_type == b"ftyp":
+                brand = parse_ftyp(payload)
+            else:
+                info = parse_moov(payload)
+                info["brand"] = brand
+                return info
+        offset += box_size
+
+    raise Mp4Error("No se encontró la caja moov")
+
+
+def probe_file(file_path: str) -> Dict:
+    """Obtiene los metadatos de un MP4 en disco"""
+    size = os.path.getsize(file_path)
+    with open(file_path, "rb") as f:
+        def read_at(offset: int, length: int) -> bytes:
+            f.seek(offset)
+            return f.read(length)
+
+        return probe_reader(read_at, size)
+
+
+class Mp4StreamInspector:
+    """
+    Inspecciona los bloques de una subida a medida que llegan.
+
+    Valida ``ftyp`` con los primeros bytes y, cuando llega ``moov``, deja los
+    metadatos en ``info``. Solo guarda en memoria ftyp/moov; el contenido de
+    ``mdat`` se descuenta sin almacenarse.
+    """
+
+    def __init__(self):
+        self.info: Optional[Dict] = None
+        self.brand: Optional[str] = None
+        self._buffer = bytearray()
+        self._skip = 0
+        self._skip_rest = False
+        self._position = 0
+
+    def feed(self, chunk: bytes) -> Optional[Dict]:
+        if self.info is not None or self._skip_rest:
+            return self.info
+
+        data = memoryview(chunk)
+        while len(data):
+            if self._skip:
+                consumed = min(self._skip, len(data))
+                self._skip -= consumed
+                self._position += consumed
+                data = data[consumed:]
+                continue
+
+            self._buffer += data
+            data = data[len(data):]
+            self._consume_buffer()
+            if self.info is not None:
+                break
+
+        return self.info
+
+    def _consume_buffer(self):
+        while True:
+            parsed = _read_box_header(self._buffer, 0, len(self._buffer))
+            if parsed is None:
+                return
+            box_type, header_size, box_size = parsed
+
+            if self._position == 0 and box_type != b"ftyp":
+                raise Mp4Error("El archivo no inicia con una caja ftyp")
+
+            if box_type not in (b"ftyp", b"moov"):
+                if struct.unpack_from(">I", self._buffer, 0)[0] == 0:
+                    # Caja que llega hasta el final del archivo: no hay más cajas
+                    self._skip_rest = True
+                    self._buffer.clear()
+                    return
+                # Saltar la caja sin almacenarla
+                available = min(box_size, len(self._buffer))
+                self._skip = box_size - available
+                self._position += available
+                del self._buffer[:available]
+                if self._skip:
+                    return
+                continue
+
+            if box_size > MAX_METADATA_BOX_SIZE:
+                raise Mp4Error(f"Caja {box_type.decode()} demasiado grande")
+            if len(self._buffer) < box_size:
+                return
+
+            payload = bytes(self._buffer[header_size:box_size])
+            del self._buffer[:box_size]
+            self._position += box_size
+            if box_type == b"ftyp":
+                self.brand = parse_ftyp(payload)
+            else:
+                self.info = parse_moov(payload)
+                self.info["brand"] = self.brand
+                return
@@ -0,0 +1,34 @@
+"""
+Cursores opacos para paginación por keyset.
+
+El cursor es la clave de orden de la última fila entregada (p. ej.
+``(fecha_subida, id)``) en JSON codificado en base64 URL-safe; la página
+siguiente filtra "después de esa clave" y usa el índice en lugar de
+recorrer y descartar ``OFFSET`` filas. Como los endpoints públicos
+devuelven listas, el cursor siguiente viaja en la cabecera ``X-Next-Cursor``.
+"""
+import json
+import base64
+import binascii
+
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+
+
+class InvalidCursor(ValueError):
+    """El cursor no fue emitido por la API o no corresponde al listado"""
+
+
+def encode_cursor(*valores) -> str:
+    datos = json.dumps(list(valores), default=str, separators=(",", ":")).encode()
+    return base64.urlsafe_b64encode(datos).decode().rstrip("=")
+
+def decode_cursor(cursor: str, campos: int) -> list:
+    """Retorna los ``campos`` valores de la clave; InvalidCursor si no es válido"""
+    try:
+        datos = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        valores = json.loads(datos)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise InvalidCursor("Cursor inválido")
+    if not isinstance(valores, list) or len(valores) != campos:
+        raise InvalidCursor("Cursor inválido")
+    return valores
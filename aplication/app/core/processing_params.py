@@ -0,0 +1,36 @@
+"""
+Parámetros de procesamiento y su versión.
+
+La versión resume todo lo que determina la salida: los parámetros
+solicitados, la versión del pipeline y la del logo. Se calcula solo con
+settings (``PIPELINE_VERSION``, ``LOGO_VERSION``) para que el API y los
+workers obtengan la misma aunque no vean el mismo archivo de logo. Un
+procesamiento registrado con otra versión está desactualizado y puede
+reprocesarse.
+"""
+import json
+import hashlib
+
+from app.config.settings import settings
+
+# Parámetros solicitados que determinan la salida (el resto son resultados)
+OUTPUT_PARAMS = ("duracion_maxima", "resolucion_objetivo", "incluir_logo")
+
+
+def params_version(parametros: dict) -> str:
+    """Versión corta de los parámetros solicitados más pipeline y logo"""
+    material = {clave: (parametros or {}).get(clave) for clave in OUTPUT_PARAMS}
+    material["pipeline"] = settings.PIPELINE_VERSION
+    if material["incluir_logo"]:
+        material["logo"] = settings.LOGO_VERSION
+    return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()[:16]
+
+
+def current_processing_params() -> dict:
+    """Parámetros con los que se procesa hoy un video, incluida su versión"""
+    parametros = {
+        "duracion_maxima": settings.TARGET_DURATION,
+        "resolucion_objetivo": settings.TARGET_RESOLUTION,
+        "incluir_logo": True
+    }
+    return {**parametros, "version_parametros": params_version(parametros)}
@@ -1,14 +1,106 @@
 import os
 import uuid
+from typing import AsyncIterator, Optional
 from fastapi import UploadFile, HTTPException, status
+from starlette.concurrency import run_in_threadpool
 from app.config.settings import settings
+from app.core.mp4 import Mp4Error, Mp4StreamInspector
+from app.core.storage_backend import get_storage
 import logging
 
 logger = logging.getLogger(__name__)
 
+
+def _file_too_large_error(max_size: int) -> HTTPException:
+    return HTTPException(
+        status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+        detail=f"El archivo es demasiado grande. Tamaño máximo: {max_size // (1024*1024)}MB"
+    )
+
+
+async def iter_upload_file(file: UploadFile, chunk_size: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    Lee un UploadFile en bloques de tamaño fijo sin cargarlo completo en memoria
+    """
+    if chunk_size is None:
+        chunk_size = settings.UPLOAD_CHUNK_SIZE
+    while True:
+        chunk = await file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+async def write_stream_to_file(chunks: AsyncIterator[bytes], file_path: str,
+                               max_size: Optional[int] = None) -> int:
+    """
+    Escribe un flujo de bloques en disco validando el tamaño máximo mientras llega.
+
+    La escritura se hace en un hilo aparte para no bloquear el event loop y
+    sobre un archivo temporal ``.part`` que solo se renombra al terminar, de
+    modo que nunca queda visible un archivo a medias. Retorna los bytes escritos.
+    """
+    if max_size is None:
+        max_size = settings.MAX_FILE_SIZE
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    temp_path = f"{file_path}.part"
+
+    total = 0
+    buffer = await run_in_threadpool(open, temp_path, "wb")
+    try:
+        async for chunk in chunks:
+            total += len(chunk)
+            if total > max_size:
+                # Abortar apenas se supera el límite, sin leer el resto del cuerpo
+                raise _file_too_large_error(max_size)
+            await run_in_threadpool(buffer.write, chunk)
+        await run_in_threadpool(buffer.close)
+        await run_in_threadpool(os.replace, temp_path, file_path)
+    except BaseException:
+        buffer.close()
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+
+    return total
+
+async def inspect_mp4_stream(chunks: AsyncIterator[bytes], inspector: Mp4StreamInspector,
+                             max_duration: Optional[int] = None) -> AsyncIterator[bytes]:
+    """
+    Deja pasar los bloques de una subida validando el MP4 sobre la marcha:
+    rechaza archivos que no son MP4 con los primeros bytes y videos que superan
+    la duración máxima apenas llega la caja moov.
+    """
+    if max_duration is None:
+        max_duration = settings.MAX_VIDEO_DURATION
+    async for chunk in chunks:
+        try:
+            info = inspector.feed(chunk)
+        except Mp4Error as e:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"El archivo no es un MP4 válido: {e}"
+            )
+        if info and info["duracion"] > max_duration:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"El video supera la duración máxima permitida de {max_duration} segundos"
+            )
+        yield chunk
+
+
+async def hash_stream(chunks: AsyncIterator[bytes], hasher) -> AsyncIterator[bytes]:
+    """
+    Actualiza ``hasher`` (p. ej. hashlib.sha256()) con cada bloque mientras pasa
+    """
+    async for chunk in chunks:
+        hasher.update(chunk)
+        yield chunk
+
+
 async def save_uploaded_file(file: UploadFile, subdirectory: str = "") -> str:
     """
-    Guarda un archivo subido en el sistema de archivos
+    Guarda un archivo subido en el backend de almacenamiento y retorna su clave
     """
     try:
         # Validar tipo de archivo
@@ -26,29 +118,17 @@ async def save_uploaded_file(file: UploadFile, subdirectory: str = "") -> str:
                 detail=f"Formato de video no permitido. Formatos aceptados: {', '.join(settings.ALLOWED_EXTENSIONS)}"
             )
 
-        # Crear directorio si no existe
-        upload_dir = os.path.join("/storage", "uploads", subdirectory)
-        os.makedirs(upload_dir, exist_ok=True)
-
         # Generar nombre único para el archivo
         unique_filename = f"{uuid.uuid4()}{file_extension}"
-        file_path = os.path.join(upload_dir, unique_filename)
-
-        # Guardar archivo
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            
-            # Validar tamaño del archivo
-            if len(content) > settings.MAX_FILE_SIZE:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail=f"El archivo es demasiado grande. Tamaño máximo: {settings.MAX_FILE_SIZE // (1024*1024)}MB"
-                )
-            
-            buffer.write(content)
-
-        logger.info(f"Archivo guardado en: {file_path}")
-        return file_path
+        staging_path = os.path.join(settings.STORAGE_STAGING_DIR, unique_filename)
+        storage_key = "/".join(part for part in ("uploads", subdirectory.strip("/"), unique_filename) if part)
+
+        # Recibir por bloques validando el tamaño y guardar en el backend de almacenamiento
+        await write_stream_to_file(iter_upload_file(file), staging_path)
+        await run_in_threadpool(get_storage().put_file, storage_key, staging_path, True)
+
+        logger.info(f"Archivo guardado en: {storage_key}")
+        return storage_key
 
     except HTTPException:
         raise
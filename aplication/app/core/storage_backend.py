@@ -0,0 +1,400 @@
+"""
+Backends de almacenamiento para originales y videos procesados.
+
+Todo acceso a archivos de video pasa por ``get_storage()``, que según
+``settings.STORAGE_BACKEND`` retorna el backend de sistema de archivos local
+(volumen compartido servido por nginx) o uno compatible con la API de S3.
+Los archivos se identifican por una clave relativa, p. ej.
+``uploads/videos/originales/{video_id}.mp4``.
+"""
+import os
+import time
+import hmac
+import hashlib
+import shutil
+import logging
+import tempfile
+from abc import ABC, abstractmethod
+from urllib.parse import urlencode
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from functools import lru_cache
+from typing import Iterable, Iterator, Optional
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+
+def original_key(video_id: str, extension: str = "mp4") -> str:
+    return f"uploads/videos/originales/{video_id}.{extension}"
+
+
+def processed_key(video_id: str) -> str:
+    return f"processed/videos/{video_id}_final.mp4"
+
+
+def processed_asset_key(video_id: str, nombre: str) -> str:
+    """Archivos derivados (póster, sprite) junto al video procesado"""
+    return f"processed/videos/{video_id}_{nombre}"
+
+
+def hls_prefix(video_id: str) -> str:
+    return f"processed/hls/{video_id}"
+
+
+def hls_master_key(video_id: str) -> str:
+    return f"{hls_prefix(video_id)}/master.m3u8"
+
+
+def key_from_reference(reference: str) -> str:
+    """
+    Normaliza la referencia guardada en BD a una clave de almacenamiento.
+    Acepta claves y también rutas absolutas antiguas (``/storage/...``).
+    """
+    root = settings.STORAGE_ROOT.rstrip("/") + "/"
+    if reference.startswith(root):
+        return reference[len(root):]
+    if reference.startswith("s3://"):
+        return reference.split("/", 3)[3]
+    return reference.lstrip("/")
+
+
+class StorageBackend(ABC):
+    """Interfaz común de almacenamiento"""
+
+    # Si url_for sirve rutas relativas (playlists HLS que referencian segmentos)
+    serves_relative_urls = True
+
+    @abstractmethod
+    def put_stream(self, key: str, chunks: Iterable[bytes]) -> int:
+        """Guarda el contenido de ``chunks`` bajo ``key`` y retorna los bytes escritos"""
+
+    @abstractmethod
+    def get_stream(self, key: str, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        """Lee el objeto completo por bloques"""
+
+    @abstractmethod
+    def open_range(self, key: str, start: int, end: Optional[int] = None,
+                   chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        """Lee los bytes [start, end] (inclusivo) del objeto por bloques; ``end=None`` hasta el final"""
+
+    @abstractmethod
+    def delete(self, key: str) -> None:
+        """Elimina el objeto; no falla si no existe"""
+
+    @abstractmethod
+    def url_for(self, key: str, expires: Optional[int] = None) -> str:
+        """URL para que un cliente descargue el objeto"""
+
+    @abstractmethod
+    def delete_prefix(self, prefix: str) -> None:
+        """Elimina todos los objetos bajo ``prefix``"""
+
+    @abstractmethod
+    def presign_put(self, key: str, expires: int, content_type: str = "video/mp4") -> dict:
+        """
+        Destino firmado y de corta duración para que el cliente suba ``key``
+        directamente, sin pasar por el API. Retorna ``{url, method, headers}``.
+        """
+
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        """True si el objeto existe"""
+
+    @abstractmethod
+    def size(self, key: str) -> int:
+        """Tamaño del objeto en bytes"""
+
+    def put_file(self, key: str, path: str, remove_source: bool = False) -> int:
+        """Sube un archivo local. Con ``remove_source`` el archivo local se elimina (o mueve)"""
+        with open(path, "rb") as f:
+            total = self.put_stream(key, iter(lambda: f.read(settings.UPLOAD_CHUNK_SIZE), b""))
+        if remove_source:
+            os.remove(path)
+        return total
+
+    @contextmanager
+    def local_copy(self, key: str):
+        """
+        Entrega una ruta local con el contenido del objeto (para ffmpeg).
+        Los backends remotos descargan a un temporal que se borra al salir.
+        """
+        suffix = os.path.splitext(key)[1]
+        os.makedirs(settings.PROCESSING_WORK_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(suffix=suffix, dir=settings.PROCESSING_WORK_DIR)
+        try:
+            with os.fdopen(fd, "wb") as f:
+                for chunk in self.get_stream(key):
+                    f.write(chunk)
+            yield path
+        finally:
+            if os.path.exists(path):
+                os.remove(path)
+
+
+class LocalStorageBackend(StorageBackend):
+    """Almacenamiento en el volumen compartido (``/storage``) servido por nginx"""
+
+    def __init__(self, root: str, public_url: str):
+        self.root = root
+        self.public_url = public_url.rstrip("/")
+
+    def path_for(self, key: str) -> str:
+        path = os.path.normpath(os.path.join(self.root, key))
+        if not path.startswith(os.path.normpath(self.root) + os.sep):
+            raise ValueError(f"Clave de almacenamiento inválida: {key}")
+        return path
+
+    def put_stream(self, key: str, chunks: Iterable[bytes]) -> int:
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.part"
+        total = 0
+        try:
+            with open(temp_path, "wb") as f:
+                for chunk in chunks:
+                    f.write(chunk)
+                    total += len(chunk)
+            os.replace(temp_path, path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return total
+
+    def put_file(self, key: str, path: str, remove_source: bool = False) -> int:
+        destino = self.path_for(key)
+        os.makedirs(os.path.dirname(destino), exist_ok=True)
+        total = os.path.getsize(path)
+        if remove_source:
+            # En el mismo volumen es un rename atómico, sin copiar bytes
+            shutil.move(path, destino)
+        else:
+            shutil.copyfile(path, f"{destino}.part")
+            os.replace(f"{destino}.part", destino)
+        return total
+
+    def get_stream(self, key: str, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        return self.open_range(key, 0, None, chunk_size)
+
+    def open_range(self, key: str, start: int, end: Optional[int] = None,
+                   chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        chunk_size = chunk_size or settings.UPLOAD_CHUNK_SIZE
+        path = self.path_for(key)
+        remaining = None if end is None else end - start + 1
+        with open(path, "rb") as f:
+            f.seek(start)
+            while remaining is None or remaining > 0:
+                chunk = f.read(chunk_size if remaining is None else min(chunk_size, remaining))
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+
+    def delete(self, key: str) -> None:
+        path = self.path_for(key)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def delete_prefix(self, prefix: str) -> None:
+        shutil.rmtree(self.path_for(prefix), ignore_errors=True)
+
+    def url_for(self, key: str, expires: Optional[int] = None) -> str:
+        return f"{self.public_url}/{key}"
+
+    def presign_put(self, key: str, expires: int, content_type: str = "video/mp4") -> dict:
+        # Sustituto local de una URL prefirmada: PUT contra /api/storage firmado con HMAC
+        expires_at = int(time.time()) + expires
+        query = urlencode({"expires": expires_at, "signature": self.sign_put(key, expires_at)})
+        return {
+            "url": f"{settings.LOCAL_SIGNED_UPLOAD_URL.rstrip('/')}/{key}?{query}",
+            "method": "PUT",
+            "headers": {"Content-Type": content_type},
+        }
+
+    def sign_put(self, key: str, expires_at: int) -> str:
+        message = f"PUT\n{key}\n{expires_at}".encode()
+        return hmac.new(settings.SECRET_KEY.encode(), message, hashlib.sha256).hexdigest()
+
+    def verify_put_signature(self, key: str, expires_at: int, signature: str) -> bool:
+        if expires_at < time.time():
+            return False
+        return hmac.compare_digest(self.sign_put(key, expires_at), signature)
+
+    def exists(self, key: str) -> bool:
+        return os.path.exists(self.path_for(key))
+
+    def size(self, key: str) -> int:
+        return os.path.getsize(self.path_for(key))
+
+    @contextmanager
+    def local_copy(self, key: str):
+        path = self.path_for(key)
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"Archivo no encontrado en almacenamiento: {key}")
+        yield path
+
+
+class S3StorageBackend(StorageBackend):
+    """
+    Almacenamiento en un servicio compatible con S3 (AWS S3, MinIO...).
+
+    Las subidas grandes usan multipart con varias partes en paralelo y las
+    lecturas parciales usan peticiones con cabecera Range.
+    """
+
+    def __init__(self, bucket: str, endpoint_url: Optional[str] = None, region: Optional[str] = None,
+                 access_key_id: Optional[str] = None, secret_access_key: Optional[str] = None,
+                 public_url: Optional[str] = None, part_size: int = 8 * 1024 * 1024,
+                 max_concurrency: int = 4, url_expiration: int = 3600):
+        try:
+            import boto3
+            from botocore.config import Config
+        except ImportError:
+            raise RuntimeError("STORAGE_BACKEND=s3 requiere el paquete boto3")
+
+        self.bucket = bucket
+        self.public_url = public_url.rstrip("/") if public_url else None
+        self.part_size = max(part_size, 5 * 1024 * 1024)  # Mínimo de S3 por parte
+        self.max_concurrency = max_concurrency
+        self.url_expiration = url_expiration
+        self.client = boto3.client(
+            "s3",
+            endpoint_url=endpoint_url,
+            region_name=region,
+            aws_access_key_id=access_key_id,
+            aws_secret_access_key=secret_access_key,
+            config=Config(max_pool_connections=max(10, max_concurrency * 2)),
+        )
+
+    def put_stream(self, key: str, chunks: Iterable[bytes]) -> int:
+        buffer = bytearray()
+        total = 0
+        upload_id = None
+        part_number = 0
+        in_flight = set()
+        futures = []
+
+        executor = ThreadPoolExecutor(max_workers=self.max_concurrency)
+        try:
+            for chunk in chunks:
+                buffer += chunk
+                total += len(chunk)
+                while len(buffer) >= self.part_size:
+                    if upload_id is None:
+                        upload_id = self.client.create_multipart_upload(Bucket=self.bucket, Key=key)["UploadId"]
+                    # Limitar las partes en vuelo para acotar la memoria usada
+                    if len(in_flight) >= self.max_concurrency:
+                        done, in_flight = wait(in_flight, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            future.result()
+                    part_number += 1
+                    body = bytes(buffer[:self.part_size])
+                    del buffer[:self.part_size]
+                    future = executor.submit(self._upload_part, key, upload_id, part_number, body)
+                    in_flight.add(future)
+                    futures.append(future)
+
+            if upload_id is None:
+                self.client.put_object(Bucket=self.bucket, Key=key, Body=bytes(buffer))
+                return total
+
+            if buffer:
+                part_number += 1
+                futures.append(executor.submit(self._upload_part, key, upload_id, part_number, bytes(buffer)))
+
+            parts = sorted((future.result() for future in futures), key=lambda part: part["PartNumber"])
+            self.client.complete_multipart_upload(
+                Bucket=self.bucket, Key=key, UploadId=upload_id, MultipartUpload={"Parts": parts}
+            )
+            return total
+        except BaseException:
+            if upload_id is not None:
+                try:
+                    self.client.abort_multipart_upload(Bucket=self.bucket, Key=key, UploadId=upload_id)
+                except Exception as e:
+                    logger.warning(f"No se pudo abortar la subida multipart de {key}: {e}")
+            raise
+        finally:
+            executor.shutdown(wait=True)
+
+    def _upload_part(self, key: str, upload_id: str, part_number: int, body: bytes) -> dict:
+        response = self.client.upload_part(
+            Bucket=self.bucket, Key=key, UploadId=upload_id, PartNumber=part_number, Body=body
+        )
+        return {"ETag": response["ETag"], "PartNumber": part_number}
+
+    def get_stream(self, key: str, chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        response = self.client.get_object(Bucket=self.bucket, Key=key)
+        return response["Body"].iter_chunks(chunk_size or settings.UPLOAD_CHUNK_SIZE)
+
+    def open_range(self, key: str, start: int, end: Optional[int] = None,
+                   chunk_size: Optional[int] = None) -> Iterator[bytes]:
+        byte_range = f"bytes={start}-{'' if end is None else end}"
+        response = self.client.get_object(Bucket=self.bucket, Key=key, Range=byte_range)
+        return response["Body"].iter_chunks(chunk_size or settings.UPLOAD_CHUNK_SIZE)
+
+    def delete(self, key: str) -> None:
+        self.client.delete_object(Bucket=self.bucket, Key=key)
+
+    def delete_prefix(self, prefix: str) -> None:
+        paginator = self.client.get_paginator("list_objects_v2")
+        for page in paginator.paginate(Bucket=self.bucket, Prefix=prefix.rstrip("/") + "/"):
+            objects = [{"Key": item["Key"]} for item in page.get("Contents", [])]
+            if objects:
+                self.client.delete_objects(Bucket=self.bucket, Delete={"Objects": objects})
+
+    @property
+    def serves_relative_urls(self) -> bool:
+        # Una URL prefirmada no autoriza los segmentos que referencia la playlist
+        return bool(self.public_url)
+
+    def url_for(self, key: str, expires: Optional[int] = None) -> str:
+        if self.public_url:
+            return f"{self.public_url}/{key}"
+        return self.client.generate_presigned_url(
+            "get_object",
+            Params={"Bucket": self.bucket, "Key": key},
+            ExpiresIn=expires or self.url_expiration,
+        )
+
+    def presign_put(self, key: str, expires: int, content_type: str = "video/mp4") -> dict:
+        url = self.client.generate_presigned_url(
+            "put_object",
+            Params={"Bucket": self.bucket, "Key": key, "ContentType": content_type},
+            ExpiresIn=expires,
+        )
+        return {"url": url, "method": "PUT", "headers": {"Content-Type": content_type}}
+
+    def exists(self, key: str) -> bool:
+        from botocore.exceptions import ClientError
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return True
+        except ClientError as e:
+            if e.response.get("Error", {}).get("Code") in ("404", "NoSuchKey", "NotFound"):
+                return False
+            raise
+
+    def size(self, key: str) -> int:
+        return self.client.head_object(Bucket=self.bucket, Key=key)["ContentLength"]
+
+
+@lru_cache()
+def get_storage() -> StorageBackend:
+    """Backend configurado en ``settings.STORAGE_BACKEND`` (instancia única por proceso)"""
+    if settings.STORAGE_BACKEND == "s3":
+        return S3StorageBackend(
+            bucket=settings.S3_BUCKET,
+            endpoint_url=settings.S3_ENDPOINT_URL,
+            region=settings.S3_REGION,
+            access_key_id=settings.S3_ACCESS_KEY_ID,
+            secret_access_key=settings.S3_SECRET_ACCESS_KEY,
+            public_url=settings.S3_PUBLIC_URL,
+            part_size=settings.S3_PART_SIZE,
+            max_concurrency=settings.S3_MAX_CONCURRENCY,
+            url_expiration=settings.S3_URL_EXPIRATION,
+        )
+    return LocalStorageBackend(root=settings.STORAGE_ROOT, public_url=settings.STORAGE_PUBLIC_URL)
@@ -0,0 +1,112 @@
+"""
+Entrega de videos con soporte de HTTP Range.
+
+Detrás de nginx con el backend local se delega el envío con
+``X-Accel-Redirect`` (sendfile sin copias en el proceso de Python); con S3 se
+redirige a una URL prefirmada de corta duración. Sin ninguno de los dos, el
+API sirve los rangos leyendo del backend por bloques.
+"""
+import os
+from typing import Optional, Tuple
+from fastapi import HTTPException, status
+from fastapi.responses import Response, RedirectResponse, StreamingResponse
+
+from app.config.settings import settings
+from app.core.storage_backend import StorageBackend, LocalStorageBackend, S3StorageBackend
+
+MEDIA_TYPES = {
+    ".mp4": "video/mp4",
+    ".m3u8": "application/vnd.apple.mpegurl",
+    ".ts": "video/mp2t",
+    ".vtt": "text/vtt",
+    ".jpg": "image/jpeg",
+    ".jpeg": "image/jpeg",
+    ".png": "image/png",
+    ".webp": "image/webp",
+}
+
+
+# Las claves de salida se reescriben al reprocesar: el cliente debe revalidar
+CACHE_CONTROL = "private, no-cache"
+
+
+def media_type_for(key: str) -> str:
+    return MEDIA_TYPES.get(os.path.splitext(key)[1].lower(), "application/octet-stream")
+
+
+def parse_range(range_header: Optional[str], size: int) -> Optional[Tuple[int, int]]:
+    """
+    Interpreta un header ``Range: bytes=...`` y retorna (inicio, fin) inclusivo,
+    o None si no se pidió un rango. Solo se atiende el primer rango.
+    """
+    if not range_header:
+        return None
+
+    unidad, _, rangos = range_header.partition("=")
+    if unidad.strip().lower() != "bytes" or not rangos:
+        return None
+
+    inicio, _, fin = rangos.split(",")[0].strip().partition("-")
+    try:
+        if inicio:
+            start = int(inicio)
+            end = min(int(fin), size - 1) if fin else size - 1
+        else:
+            # Sufijo: los últimos N bytes
+            start = max(size - int(fin), 0)
+            end = size - 1
+    except ValueError:
+        return None
+
+    if start >= size or start > end:
+        raise HTTPException(
+            status_code=status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE,
+            detail="Rango solicitado no válido",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+
+def stream_response(storage: StorageBackend, key: str, range_header: Optional[str] = None,
+                    media_type: str = "video/mp4") -> Response:
+    """Construye la respuesta que entrega ``key`` respetando el rango pedido"""
+    if isinstance(storage, LocalStorageBackend) and settings.STREAM_ACCEL_REDIRECT:
+        # nginx atiende Range y usa sendfile sobre su ubicación interna
+        return Response(
+            media_type=media_type,
+            headers={"X-Accel-Redirect": f"{settings.STREAM_ACCEL_REDIRECT.rstrip('/')}/{key}"}
+        )
+
+    if isinstance(storage, S3StorageBackend):
+        return RedirectResponse(
+            storage.url_for(key, settings.STREAM_URL_EXPIRATION),
+            status_code=status.HTTP_307_TEMPORARY_REDIRECT
+        )
+
+    try:
+        size = storage.size(key)
+    except FileNotFoundError:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Archivo no encontrado"
+        )
+    rango = parse_range(range_header, size)
+    if rango is None:
+        return StreamingResponse(
+            storage.get_stream(key),
+            media_type=media_type,
+            headers={"Accept-Ranges": "bytes", "Content-Length": str(size), "Cache-Control": CACHE_CONTROL}
+        )
+
+    start, end = rango
+    return StreamingResponse(
+        storage.open_range(key, start, end),
+        status_code=status.HTTP_206_PARTIAL_CONTENT,
+        media_type=media_type,
+        headers={
+            "Accept-Ranges": "bytes",
+            "Content-Range": f"bytes {start}-{end}/{size}",
+            "Content-Length": str(end - start + 1),
+            "Cache-Control": CACHE_CONTROL
+        }
+    )
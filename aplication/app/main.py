@@ -2,9 +2,12 @@ from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 import logging
 from app.config.settings import settings
+from app.core.pagination import NEXT_CURSOR_HEADER
 from app.api.routes.auth import router as auth_router
 from app.api.routes.videos import router as videos_router
 from app.api.routes.public import router as public_router
+from app.api.routes.storage import router as storage_router
+from app.api.routes.admin import router as admin_router
 
 # Configurar logging
 logging.basicConfig(
@@ -27,12 +30,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER],
 )
 
 # Routers
 app.include_router(auth_router, prefix="/api/auth", tags=["Authentication"])
 app.include_router(videos_router, prefix="/api/videos", tags=["Videos"])
 app.include_router(public_router, prefix="/api/public", tags=["Public"])
+app.include_router(storage_router, prefix="/api/storage", tags=["Storage"])
+app.include_router(admin_router, prefix="/api/admin", tags=["Admin"])
 
 @app.get("/")
 async def root():
@@ -0,0 +1,24 @@
+from pydantic import BaseModel
+from typing import Optional
+from datetime import datetime
+
+class ReprocessJobResponse(BaseModel):
+    job_id: str
+    estado: str
+    version_parametros: str
+    total: int
+    encolados: int
+    pendientes: int
+    fecha_inicio: datetime
+    fecha_fin: Optional[datetime] = None
+
+class QueueMetricsResponse(BaseModel):
+    clase: str
+    cola: str
+    pendientes: int
+    espera_muestras: int
+    espera_p50: Optional[float] = None
+    espera_p95: Optional[float] = None
+    procesado_muestras: int
+    procesado_p50: Optional[float] = None
+    procesado_p95: Optional[float] = None
@@ -1,5 +1,5 @@
 from pydantic import BaseModel, validator
-from typing import Optional
+from typing import Optional, List, Dict
 from datetime import datetime
 from enum import Enum
 
@@ -34,13 +34,17 @@ class VideoResponse(VideoBase):
     contador_vistas: int
     fecha_subida: datetime
     fecha_procesamiento: Optional[datetime] = None
+    url_poster: Optional[str] = None
+    url_sprite: Optional[str] = None
+    url_vtt: Optional[str] = None
 
     class Config:
         from_attributes = True
 
 class VideoDetailResponse(VideoResponse):    
     url_original: Optional[str] = None
-    url_procesado: Optional[str] = None
+    url_procesado: Optional[str] = None  # Playlist HLS si existe, si no el MP4
+    url_mp4: Optional[str] = None
     puede_eliminar: bool
 
     class Config:
@@ -52,4 +56,41 @@ class VideoUploadResponse(BaseModel):
 
 class VideoDeleteResponse(BaseModel):
     message: str
-    video_id: str
\ No newline at end of file
+    video_id: str
+
+class UploadSessionCreate(VideoBase):
+    filename: str
+    total_size: int
+    content_type: str = "video/mp4"
+
+    @validator('total_size')
+    def validate_total_size(cls, v):
+        if v <= 0:
+            raise ValueError('El tamaño del archivo debe ser mayor a 0')
+        return v
+
+class UploadSessionResponse(BaseModel):
+    upload_id: str
+    chunk_size: int
+    total_size: int
+    total_chunks: int
+    expires_at: datetime
+
+class UploadProgressResponse(BaseModel):
+    upload_id: str
+    total_size: int
+    total_chunks: int
+    received_bytes: int
+    received_chunks: List[int]
+    missing_chunks: List[int]
+    completed: bool
+
+class DirectUploadCreate(UploadSessionCreate):
+    pass
+
+class DirectUploadResponse(BaseModel):
+    video_id: str
+    upload_url: str
+    method: str = "PUT"
+    headers: Dict[str, str] = {}
+    expires_at: datetime
@@ -6,6 +6,8 @@ from .video import Video
 from .procesamiento_video import ProcesamientoVideo
 from .voto import Voto
 from .ranking import Ranking
+from .ranking_activo import RankingActivo
+from .tarea_pendiente import TareaPendiente
 
 __all__ = [
     "Base", 
@@ -17,5 +19,7 @@ __all__ = [
     "Video", 
     "ProcesamientoVideo", 
     "Voto", 
-    "Ranking"
+    "Ranking",
+    "RankingActivo",
+    "TareaPendiente"
 ]
\ No newline at end of file
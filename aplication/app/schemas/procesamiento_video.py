@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey
+from sqlalchemy import Column, String, Integer, DateTime, Text, ForeignKey, Index
 from sqlalchemy.dialects.mysql import ENUM as MySQLEnum, JSON
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -18,9 +18,17 @@ class ProcesamientoVideo(Base):
     fecha_inicio = Column(DateTime, nullable=True)
     fecha_fin = Column(DateTime, nullable=True)
     parametros = Column(JSON, nullable=False, default=dict, comment="Parámetros de procesamiento")
+    version_parametros = Column(String(16), nullable=True, index=True,
+                                comment="Versión de parámetros con la que se produjo la salida")
+    etapas = Column(JSON, nullable=True, default=dict, comment="Checkpoints por etapa del pipeline")
     
     # Relaciones
     video = relationship("Video", back_populates="procesamiento")
+
+    __table_args__ = (
+        # Reaper: procesamientos en curso iniciados hace más de un umbral
+        Index("idx_procesamiento_estado_inicio", "estado", "fecha_inicio"),
+    )
     
     def __repr__(self):
         return f"<ProcesamientoVideo(id={self.id}, video_id={self.video_id}, estado={self.estado})>"
\ No newline at end of file
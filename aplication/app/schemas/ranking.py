@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, DateTime, ForeignKey
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, ForeignKey, Index
 from sqlalchemy.orm import relationship
 from datetime import datetime
 from app.config.database import Base
@@ -13,12 +13,22 @@ class Ranking(Base):
                       nullable=False, index=True)
     puntuacion_total = Column(Integer, default=0, nullable=False)
     posicion = Column(Integer, default=0, nullable=False)
+    posicion_ciudad = Column(Integer, default=0, nullable=False, comment="Posición dentro de su ciudad")
     fecha_actualizacion = Column(DateTime, default=datetime.utcnow, nullable=False)
     temporada = Column(String(10), nullable=False, comment="Ej: 2024-Q1, 2024-Q2", index=True)
+    version = Column(BigInteger, default=0, nullable=False, comment="Snapshot; RankingActivo indica el publicado")
     
     # Relaciones
     jugador = relationship("Jugador", back_populates="rankings")
     ciudad = relationship("Ciudad", back_populates="rankings")
+
+    __table_args__ = (
+        # Lectura de un snapshot en orden (votos, jugador), la clave del cursor
+        Index("idx_ranking_puntuacion_jugador", "temporada", "version", "puntuacion_total", "jugador_id"),
+        # Tabla de una ciudad: rango por ciudad_id en el mismo orden
+        Index("idx_ranking_ciudad_puntuacion_jugador", "temporada", "version", "ciudad_id",
+              "puntuacion_total", "jugador_id"),
+    )
     
     def __repr__(self):
         return f"<Ranking(id={self.id}, jugador_id={self.jugador_id}, posicion={self.posicion})>"
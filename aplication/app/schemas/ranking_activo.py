@@ -0,0 +1,14 @@
+from sqlalchemy import Column, String, BigInteger, DateTime
+from datetime import datetime
+from app.config.database import Base
+
+class RankingActivo(Base):
+    """Puntero a la versión (snapshot) publicada del ranking de cada temporada"""
+    __tablename__ = "RankingActivo"
+    
+    temporada = Column(String(10), primary_key=True, comment="Ej: 2024-Q1, 2024-Q2")
+    version = Column(BigInteger, nullable=False, comment="Ranking.version que leen las consultas")
+    fecha_publicacion = Column(DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f"<RankingActivo(temporada={self.temporada}, version={self.version})>"
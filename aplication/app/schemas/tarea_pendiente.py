@@ -0,0 +1,27 @@
+from sqlalchemy import Column, String, Integer, DateTime, Text, Index
+from sqlalchemy.dialects.mysql import JSON
+from datetime import datetime
+from app.config.database import Base
+
+class TareaPendiente(Base):
+    """Bandeja de salida (outbox): tareas Celery registradas en la misma transacción que sus datos"""
+    __tablename__ = "TareaPendiente"
+    
+    id = Column(String(36), primary_key=True, comment="También es el id de la tarea en Celery")
+    tarea = Column(String(255), nullable=False, comment="Nombre de la tarea Celery")
+    cola = Column(String(100), nullable=False)
+    argumentos = Column(JSON, nullable=False, default=list)
+    opciones = Column(JSON, nullable=False, default=dict, comment="kwargs de la tarea")
+    video_id = Column(String(36), nullable=True, index=True)
+    fecha_creacion = Column(DateTime, default=datetime.utcnow, nullable=False)
+    fecha_envio = Column(DateTime, nullable=True)
+    intentos = Column(Integer, default=0, nullable=False)
+    error_message = Column(Text, nullable=True)
+
+    __table_args__ = (
+        # El despachador busca lo no enviado en orden de creación
+        Index("idx_tarea_pendiente_envio", "fecha_envio", "fecha_creacion"),
+    )
+    
+    def __repr__(self):
+        return f"<TareaPendiente(id={self.id}, tarea={self.tarea}, enviada={self.fecha_envio is not None})>"
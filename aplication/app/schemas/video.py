@@ -1,4 +1,4 @@
-from sqlalchemy import Column, String, Integer, BigInteger, DateTime, Boolean, ForeignKey, Text
+from sqlalchemy import Column, String, Integer, BigInteger, DateTime, Boolean, ForeignKey, Text, Index
 from sqlalchemy.dialects.mysql import ENUM as MySQLEnum
 from sqlalchemy.orm import relationship
 from datetime import datetime
@@ -13,14 +13,21 @@ class Video(Base):
     titulo = Column(String(255), nullable=False, index=True)
     archivo_original = Column(String(500), nullable=False, comment="Ruta en almacenamiento")
     archivo_procesado = Column(String(500), nullable=True, comment="Ruta del video procesado")
+    archivo_hls = Column(String(500), nullable=True, comment="Playlist maestra HLS")
+    archivo_poster = Column(String(500), nullable=True, comment="Imagen de portada")
+    archivo_sprite = Column(String(500), nullable=True, comment="Sprite de miniaturas")
+    archivo_vtt = Column(String(500), nullable=True, comment="Índice WebVTT del sprite")
     duracion_original = Column(Integer, nullable=False, comment="Duración en segundos")
     duracion_procesada = Column(Integer, nullable=True, comment="Duración procesada en segundos")
     estado = Column(MySQLEnum('subido', 'procesando', 'procesado', 'error', name='video_estado'), 
                    nullable=False, default='subido', index=True)
+    visibilidad = Column(MySQLEnum('publico', 'privado', name='video_visibilidad'),
+                         nullable=False, default='publico')
     formato_original = Column(String(10), nullable=False, comment="mp4, avi, etc.")
     tamaño_archivo = Column(BigInteger, nullable=False, comment="Tamaño en bytes")
     resolucion_original = Column(String(20), nullable=False, comment="1920x1080, 1280x720, etc.")
     resolucion_procesada = Column(String(20), nullable=True, comment="Resolución después de procesar")
+    hash_contenido = Column(String(64), nullable=True, index=True, comment="SHA-256 del archivo original")
     fecha_subida = Column(DateTime, default=datetime.utcnow, nullable=False, index=True)
     fecha_procesamiento = Column(DateTime, nullable=True)
     contador_vistas = Column(Integer, default=0, nullable=False)
@@ -30,6 +37,11 @@ class Video(Base):
     procesamiento = relationship("ProcesamientoVideo", back_populates="video", 
                                 uselist=False, cascade="all, delete-orphan")
     votos = relationship("Voto", back_populates="video", cascade="all, delete-orphan")
+
+    __table_args__ = (
+        # Reaper: videos en un estado desde hace más de un umbral
+        Index("idx_video_estado_fecha_subida", "estado", "fecha_subida"),
+    )
     
     def __repr__(self):
         return f"<Video(id={self.id}, titulo={self.titulo}, estado={self.estado})>"
\ No newline at end of file
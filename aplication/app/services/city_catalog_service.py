@@ -0,0 +1,62 @@
+import json
+import logging
+import unicodedata
+import redis
+from typing import Optional
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+
+from app.config.settings import settings
+from app.schemas.ciudad import Ciudad
+
+logger = logging.getLogger(__name__)
+
+CATALOG_KEY = "catalogo:ciudades"
+
+
+def city_slug(nombre: str) -> str:
+    """'Santa Marta' -> 'santa-marta', 'Bogotá' -> 'bogota'"""
+    sin_tildes = unicodedata.normalize("NFKD", nombre).encode("ascii", "ignore").decode()
+    return "-".join(sin_tildes.lower().split())
+
+
+class CityCatalogService:
+    """
+    Catálogo de ciudades (id, nombre, slug) cacheado en Redis. Resuelve el
+    filtro de ciudad de los rankings a un ``ciudad_id`` para que las
+    consultas usen el índice en lugar de ``nombre LIKE '%x%'``.
+    """
+
+    def __init__(self, db: AsyncSession, redis_client=None):
+        self.db = db
+        self.redis_client = redis_client or redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+    async def get_catalog(self) -> dict:
+        """{ciudad_id: {"nombre", "slug"}}"""
+        try:
+            cached = self.redis_client.get(CATALOG_KEY)
+            if cached:
+                return json.loads(cached)
+        except Exception as e:
+            logger.warning(f"Error leyendo catálogo de ciudades: {str(e)}")
+
+        result = await self.db.execute(select(Ciudad.id, Ciudad.nombre))
+        catalogo = {ciudad_id: {"nombre": nombre, "slug": city_slug(nombre)} for ciudad_id, nombre in result.all()}
+
+        try:
+            self.redis_client.setex(CATALOG_KEY, settings.CITY_CATALOG_TTL, json.dumps(catalogo))
+        except Exception as e:
+            logger.warning(f"Error guardando catálogo de ciudades: {str(e)}")
+        return catalogo
+
+    async def resolve(self, ciudad: str) -> Optional[str]:
+        """Id de la ciudad dada por id o por slug exacto (el nombre también sirve); None si no existe"""
+        catalogo = await self.get_catalog()
+        if ciudad in catalogo:
+            return ciudad
+
+        slug = city_slug(ciudad)
+        for ciudad_id, datos in catalogo.items():
+            if datos["slug"] == slug:
+                return ciudad_id
+        return None
@@ -0,0 +1,206 @@
+import os
+import uuid
+import logging
+import redis
+from datetime import datetime, timedelta
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.config.settings import settings
+from app.core.mp4 import Mp4Error, probe_reader
+from app.core.storage import write_stream_to_file
+from app.core.storage_backend import get_storage, original_key
+from app.models.video import VideoCreate, DirectUploadCreate, DirectUploadResponse
+from app.services.video_service import VideoService
+
+logger = logging.getLogger(__name__)
+
+# Estado del destino firmado del backend local: cada firma admite una sola escritura
+PUT_WRITING = "escribiendo"
+PUT_DONE = "subido"
+
+
+class DirectUploadService:
+    """
+    Subidas directas al almacenamiento con destinos firmados.
+
+    El cliente sube los bytes directamente al backend (S3 prefirmado o el
+    receptor firmado del backend local) y luego confirma la subida; solo en ese
+    momento se verifica el objeto y se crean los registros del video. La
+    confirmación reclama la subida pendiente antes de leer el objeto, y el
+    receptor local rechaza escrituras sin subida pendiente o ya realizadas,
+    de modo que el archivo verificado es el que procesa el worker.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.storage = get_storage()
+        self.video_service = VideoService(db)
+        self.redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+    async def create_upload(self, user_id: str, data: DirectUploadCreate):
+
+        jugador = await self.video_service._get_jugador_by_usuario_id(user_id)
+        if not jugador:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Se requiere autenticación"
+            )
+
+        if data.content_type != 'video/mp4':
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Solo se permiten archivos MP4"
+            )
+
+        if data.total_size > settings.MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"El archivo es demasiado grande. Tamaño máximo: {settings.MAX_FILE_SIZE // (1024*1024)}MB"
+            )
+
+        video_id = str(uuid.uuid4())
+        storage_key = original_key(video_id)
+        expires = settings.DIRECT_UPLOAD_EXPIRATION
+        target = self.storage.presign_put(storage_key, expires, data.content_type)
+
+        # La subida pendiente vive más que la firma para permitir confirmarla al terminar
+        self.redis_client.hset(self._pending_key(video_id), mapping={
+            "user_id": user_id,
+            "jugador_id": jugador.id,
+            "titulo": data.titulo,
+            "filename": data.filename,
+            "total_size": data.total_size,
+            "storage_key": storage_key
+        })
+        self.redis_client.expire(self._pending_key(video_id), expires * 4)
+
+        logger.info(f"Subida directa {video_id} autorizada para usuario {user_id}")
+
+        return DirectUploadResponse(
+            video_id=video_id,
+            upload_url=target["url"],
+            method=target["method"],
+            headers=target["headers"],
+            expires_at=datetime.utcnow() + timedelta(seconds=expires)
+        )
+
+    async def receive_signed_upload(self, storage_key: str, chunks):
+        """
+        Receptor de un destino firmado del backend local (la firma ya fue
+        verificada). Solo acepta una escritura y solo mientras la subida siga
+        pendiente de confirmar.
+        """
+        video_id = os.path.splitext(os.path.basename(storage_key))[0]
+        if storage_key != original_key(video_id) or not self.redis_client.exists(self._pending_key(video_id)):
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Subida no encontrada o ya confirmada"
+            )
+
+        # La marca se toma antes de escribir: otro PUT con la misma firma falla aquí
+        put_key = self._put_key(video_id)
+        if not self.redis_client.set(put_key, PUT_WRITING, nx=True, ex=settings.DIRECT_UPLOAD_EXPIRATION * 4):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="El archivo de esta subida ya fue enviado"
+            )
+
+        staging_path = os.path.join(settings.STORAGE_STAGING_DIR, f"{uuid.uuid4()}.direct")
+        try:
+            if await run_in_threadpool(self.storage.exists, storage_key):
+                raise HTTPException(
+                    status_code=status.HTTP_409_CONFLICT,
+                    detail="El archivo de esta subida ya fue enviado"
+                )
+            await write_stream_to_file(chunks, staging_path, max_size=settings.MAX_FILE_SIZE)
+            await run_in_threadpool(self.storage.put_file, storage_key, staging_path, True)
+        except BaseException:
+            # Un envío fallido puede reintentarse mientras la firma siga vigente
+            self.redis_client.delete(put_key)
+            raise
+        self.redis_client.set(put_key, PUT_DONE, keepttl=True)
+
+    async def complete_upload(self, user_id: str, video_id: str):
+
+        pending = self.redis_client.hgetall(self._pending_key(video_id))
+        if not pending:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Subida no encontrada o expirada"
+            )
+
+        if pending["user_id"] != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tiene permisos para confirmar esta subida"
+            )
+
+        # Reclamar la subida antes de leer el objeto: desde aquí el receptor rechaza escrituras
+        # y solo una confirmación crea el video aunque el cliente reintente
+        try:
+            self.redis_client.rename(self._pending_key(video_id), self._claimed_key(video_id))
+        except redis.ResponseError:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="La subida ya fue confirmada"
+            )
+
+        storage_key = pending["storage_key"]
+        escritura = self.redis_client.get(self._put_key(video_id))
+        if escritura == PUT_WRITING or not await run_in_threadpool(self.storage.exists, storage_key):
+            self.redis_client.rename(self._claimed_key(video_id), self._pending_key(video_id))
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="El archivo aún no ha sido subido"
+            )
+
+        # Verificar tamaño y cabecera MP4 leyendo solo las cajas de metadatos por rango
+        tamaño = await run_in_threadpool(self.storage.size, storage_key)
+        try:
+            if tamaño > settings.MAX_FILE_SIZE or tamaño != int(pending["total_size"]):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="El tamaño del archivo subido no coincide con el declarado o supera el máximo"
+                )
+
+            try:
+                mp4_info = await run_in_threadpool(probe_reader, self._range_reader(storage_key), tamaño)
+            except Mp4Error as e:
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"El archivo no es un MP4 válido: {e}"
+                )
+            metadata = await self.video_service._get_video_metadata(storage_key, mp4_info)
+        except HTTPException:
+            await run_in_threadpool(self.storage.delete, storage_key)
+            self.redis_client.delete(self._claimed_key(video_id))
+            raise
+
+        self.redis_client.delete(self._claimed_key(video_id))
+        return await self.video_service.register_stored_video(
+            jugador_id=pending["jugador_id"],
+            video_id=video_id,
+            video_data=VideoCreate(titulo=pending["titulo"]),
+            storage_key=storage_key,
+            metadata=metadata,
+            original_filename=pending["filename"],
+            tamaño_archivo=tamaño
+        )
+
+    def _range_reader(self, storage_key: str):
+
+        def read_at(offset: int, length: int) -> bytes:
+            return b"".join(self.storage.open_range(storage_key, offset, offset + length - 1))
+
+        return read_at
+
+    def _pending_key(self, video_id: str) -> str:
+        return f"upload:direct:{video_id}"
+
+    def _claimed_key(self, video_id: str) -> str:
+        return f"upload:direct:{video_id}:confirmando"
+
+    def _put_key(self, video_id: str) -> str:
+        return f"upload:direct:{video_id}:put"
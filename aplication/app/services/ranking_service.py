@@ -1,30 +1,41 @@
 # app/services/ranking_service.py
 import uuid
+import time
 import logging
-from datetime import datetime
+import redis
+from datetime import datetime, timedelta
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, desc, delete
+from sqlalchemy import select, func, desc, delete, insert, literal, exists, and_, String, BigInteger, DateTime
+from sqlalchemy.dialects.mysql import insert as mysql_insert
 
 from app.schemas.ranking import Ranking
+from app.schemas.ranking_activo import RankingActivo
 from app.schemas.jugador import Jugador
 from app.schemas.video import Video
 from app.schemas.voto import Voto
 from app.schemas.ciudad import Ciudad
 from app.schemas.user import User 
+from app.config.settings import settings
+from app.core.leaderboard import Leaderboard, player_profile, competition_rank
 
 logger = logging.getLogger(__name__)
 
 class RankingService:
     
     
-    def __init__(self, db: AsyncSession):
+    def __init__(self, db: AsyncSession, redis_client=None):
         self.db = db
+        self.redis_client = redis_client or redis.Redis.from_url(settings.REDIS_URL)
 
-    async def update_rankings(self):
+    async def update_rankings(self, modo: str = None):
         
         try:
             temporada = self._get_current_season()
-            logger.info(f"Actualizando rankings para temporada: {temporada}")
+            marca = self._vote_watermark()
+            logger.info(f"Actualizando rankings para temporada: {temporada} (votos hasta {marca})")
+
+            if (modo or settings.RANKING_REBUILD_MODE) == "sql":
+                return await self._update_rankings_set_based(temporada, marca)
             
             #Obtener votos agrupados por jugador y ciudad (ASÍNCRONO)
             stmt = (
@@ -43,10 +54,11 @@ class RankingService:
                 .join(Voto, Voto.video_id == Video.id)
                 .where(
                     Video.estado == 'procesado',
-                    Video.visibilidad == 'publico'
+                    Video.visibilidad == 'publico',
+                    Voto.fecha_voto <= marca
                 )
                 .group_by(Jugador.id, Jugador.ciudad_id, User.nombre, User.apellido, Ciudad.nombre)
-                .order_by(desc("puntuacion_total"))
+                .order_by(desc("puntuacion_total"), Jugador.id.desc())
             )
             
             result = await self.db.execute(stmt)
@@ -54,35 +66,39 @@ class RankingService:
             
             logger.info(f"Encontrados {len(rankings_data)} jugadores con votos")
             
-            if not rankings_data:
-                logger.warning("⚠️ No se encontraron jugadores con votos para ranking")
-                return {"message": "No hay datos para generar rankings"}
-            
-            #Limpiar rankings existentes para esta temporada (ASÍNCRONO)
-            await self.db.execute(
-                delete(Ranking).where(Ranking.temporada == temporada)
-            )
-            logger.info("Rankings antiguos eliminados")
-            
-            #Insertar nuevos rankings
+            #Insertar nuevos rankings en un snapshot nuevo; las lecturas siguen en el publicado
+            version = self._new_version()
             rankings_insertados = 0
-            for position, (jugador_id, ciudad_id, nombre, apellido, ciudad_nombre, puntuacion_total) in enumerate(rankings_data, start=1):
+            # Misma regla que RANK() en el modo sql: los empates comparten posición
+            posiciones = {}
+            for jugador_id, ciudad_id, nombre, apellido, ciudad_nombre, puntuacion_total in rankings_data:
+                position = competition_rank(posiciones, None, puntuacion_total)
+                posicion_ciudad = competition_rank(posiciones, ("ciudad", ciudad_id), puntuacion_total)
                 ranking = Ranking(
                     id=str(uuid.uuid4()),
                     jugador_id=jugador_id,
                     ciudad_id=ciudad_id,
                     puntuacion_total=puntuacion_total,
                     posicion=position,
+                    posicion_ciudad=posicion_ciudad,
                     temporada=temporada,
+                    version=version,
                     fecha_actualizacion=datetime.utcnow()
                 )
                 self.db.add(ranking)
                 rankings_insertados += 1
                 logger.info(f"Posición {position}: {nombre} {apellido} - {ciudad_nombre} - Votos: {puntuacion_total}")
             
-            #Commit asíncrono
+            #Publicar el snapshot en la misma transacción (ASÍNCRONO)
+            await self._publish_snapshot(temporada, version)
             await self.db.commit()
             logger.info(f"Rankings actualizados para temporada {temporada}. {rankings_insertados} registros insertados.")
+
+            self._reconcile_leaderboard(temporada, rankings_data, marca)
+
+            if not rankings_data:
+                logger.warning("⚠️ No se encontraron jugadores con votos para ranking")
+                return {"message": "No hay datos para generar rankings"}
             
             return {
                 "temporada": temporada,
@@ -97,6 +113,147 @@ class RankingService:
             logger.exception("Detalles del error:")
             raise
 
+    async def _update_rankings_set_based(self, temporada: str, marca: datetime):
+        """
+        Reconstruye la temporada con un único INSERT ... SELECT: el conteo de
+        votos, las posiciones global y por ciudad (RANK(), los empates comparten
+        posición) y los ids (UUID()) se calculan en MySQL, sin traer filas ni crear objetos ORM.
+        """
+        version = self._new_version()
+        votos = (
+            select(Video.jugador_id, func.count(Voto.id).label("puntuacion_total"))
+            .select_from(Video)
+            .join(Voto, Voto.video_id == Video.id)
+            .where(
+                Video.estado == 'procesado',
+                Video.visibilidad == 'publico',
+                Voto.fecha_voto <= marca
+            )
+            .group_by(Video.jugador_id)
+            .subquery()
+        )
+        origen = (
+            select(
+                func.uuid(),
+                Jugador.id,
+                Jugador.ciudad_id,
+                votos.c.puntuacion_total,
+                func.rank().over(order_by=votos.c.puntuacion_total.desc()),
+                func.rank().over(partition_by=Jugador.ciudad_id, order_by=votos.c.puntuacion_total.desc()),
+                literal(temporada, String),
+                literal(version, BigInteger),
+                literal(datetime.utcnow(), DateTime)
+            )
+            .select_from(votos)
+            .join(Jugador, Jugador.id == votos.c.jugador_id)
+        )
+
+        result = await self.db.execute(
+            insert(Ranking).from_select(
+                ["id", "jugador_id", "ciudad_id", "puntuacion_total", "posicion", "posicion_ciudad", "temporada",
+                 "version", "fecha_actualizacion"],
+                origen
+            )
+        )
+        rankings_insertados = result.rowcount
+
+        # Sin votos también se publica (vacío): el snapshot anterior ya no es válido
+        await self._publish_snapshot(temporada, version)
+        await self.db.commit()
+        logger.info(f"Rankings actualizados para temporada {temporada}. {rankings_insertados} registros insertados.")
+
+        if not rankings_insertados:
+            self._reconcile_leaderboard(temporada, [], marca)
+            logger.warning("⚠️ No se encontraron jugadores con votos para ranking")
+            return {"message": "No hay datos para generar rankings"}
+
+        # Solo la reconciliación de Redis necesita los perfiles
+        result = await self.db.execute(
+            select(
+                Ranking.jugador_id,
+                Ranking.ciudad_id,
+                User.nombre,
+                User.apellido,
+                Ciudad.nombre,
+                Ranking.puntuacion_total
+            )
+            .join(Jugador, Jugador.id == Ranking.jugador_id)
+            .join(User, User.id == Jugador.usuario_id)
+            .join(Ciudad, Ciudad.id == Ranking.ciudad_id)
+            .where(Ranking.temporada == temporada, Ranking.version == version)
+            .order_by(Ranking.posicion.asc())
+        )
+        rankings_data = result.all()
+        self._reconcile_leaderboard(temporada, rankings_data, marca)
+
+        return {
+            "temporada": temporada,
+            "registros_insertados": rankings_insertados,
+            "jugador_top": f"{rankings_data[0][2]} {rankings_data[0][3]}" if rankings_data else None,
+            "votos_top": rankings_data[0][5] if rankings_data else 0
+        }
+
+    async def prune_snapshots(self, batch_size: int = 5000) -> int:
+        """
+        Elimina, por lotes, las filas de snapshots reemplazados hace más de
+        RANKING_SNAPSHOT_RETENTION; el margen cubre lecturas que empezaron
+        antes de la publicación. Retorna las filas eliminadas.
+        """
+        limite = datetime.utcnow() - timedelta(seconds=settings.RANKING_SNAPSHOT_RETENTION)
+        reemplazada = exists().where(and_(
+            RankingActivo.temporada == Ranking.temporada,
+            RankingActivo.version > Ranking.version,
+            RankingActivo.fecha_publicacion < limite
+        ))
+
+        eliminadas = 0
+        while True:
+            result = await self.db.execute(select(Ranking.id).where(reemplazada).limit(batch_size))
+            ids = result.scalars().all()
+            if not ids:
+                return eliminadas
+            await self.db.execute(delete(Ranking).where(Ranking.id.in_(ids)))
+            await self.db.commit()
+            eliminadas += len(ids)
+
+    async def _publish_snapshot(self, temporada: str, version: int):
+        """Apunta la temporada al snapshot nuevo; se confirma junto con sus filas"""
+        stmt = mysql_insert(RankingActivo).values(
+            temporada=temporada,
+            version=version,
+            fecha_publicacion=datetime.utcnow()
+        )
+        await self.db.execute(stmt.on_duplicate_key_update(
+            version=stmt.inserted.version,
+            fecha_publicacion=stmt.inserted.fecha_publicacion
+        ))
+
+    def _new_version(self) -> int:
+        # Milisegundos: crecen con cada reconstrucción de la cola de rankings
+        return int(time.time() * 1000)
+
+    def _vote_watermark(self) -> datetime:
+        """
+        Fecha hasta la que cuenta la reconstrucción, en segundos enteros como
+        ``Voto.fecha_voto``; el retraso cubre los votos aún sin confirmar.
+        """
+        return datetime.utcnow().replace(microsecond=0) - timedelta(seconds=settings.RANKING_WATERMARK_LAG)
+
+    def _reconcile_leaderboard(self, temporada: str, rankings_data, marca: datetime):
+        """
+        Reemplaza la tabla en Redis con los conteos hasta ``marca`` más los
+        votos posteriores ya incrementados, corrigiendo desvíos (también sin votos)
+        """
+        try:
+            Leaderboard(self.redis_client, temporada).rebuild([
+                (jugador_id, ciudad_id, puntuacion_total, player_profile(nombre, apellido, ciudad_nombre))
+                for jugador_id, ciudad_id, nombre, apellido, ciudad_nombre, puntuacion_total in rankings_data
+            ], marca)
+            logger.info(f"Tabla de posiciones en Redis reconciliada ({len(rankings_data)} jugadores)")
+        except Exception as e:
+            # La tabla SQL ya quedó actualizada; las lecturas pueden usarla
+            logger.warning(f"Error reconciliando tabla de posiciones en Redis: {str(e)}")
+
     def _get_current_season(self):        
         now = datetime.now()
         year = now.year
@@ -0,0 +1,92 @@
+import uuid
+import logging
+import redis
+from datetime import datetime
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select, func
+
+from app.config.settings import settings
+from app.core.processing_params import current_processing_params
+from app.models.admin import ReprocessJobResponse
+from app.schemas.video import Video
+from app.schemas.procesamiento_video import ProcesamientoVideo
+from app.workers.reprocess_tasks import reprocess_outdated_task, reprocess_job_key, outdated_conditions, JOB_TTL
+
+logger = logging.getLogger(__name__)
+
+
+class ReprocessService:
+    """
+    Reprocesamiento de los videos cuya salida se produjo con otra versión de
+    parámetros (resolución, duración, logo o pipeline). El trabajo avanza por
+    lotes en segundo plano y su progreso se guarda en Redis.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+    async def start_job(self) -> ReprocessJobResponse:
+
+        version = current_processing_params()["version_parametros"]
+        job_id = str(uuid.uuid4())
+        clave = reprocess_job_key(job_id)
+        self.redis_client.hset(clave, mapping={
+            "estado": "en_curso",
+            "version": version,
+            "total": await self._count_outdated(version),
+            "encolados": 0,
+            "cursor": "",
+            "fecha_inicio": datetime.utcnow().isoformat()
+        })
+        self.redis_client.expire(clave, JOB_TTL)
+
+        reprocess_outdated_task.delay(job_id)
+        logger.info(f"Reprocesamiento {job_id} iniciado hacia la versión {version}")
+        return await self.get_job(job_id)
+
+    async def get_job(self, job_id: str) -> ReprocessJobResponse:
+
+        trabajo = self._get_trabajo(job_id)
+        return ReprocessJobResponse(
+            job_id=job_id,
+            estado=trabajo["estado"],
+            version_parametros=trabajo["version"],
+            total=int(trabajo.get("total", 0)),
+            encolados=int(trabajo.get("encolados", 0)),
+            pendientes=await self._count_outdated(trabajo["version"]),
+            fecha_inicio=trabajo["fecha_inicio"],
+            fecha_fin=trabajo.get("fecha_fin")
+        )
+
+    async def cancel_job(self, job_id: str) -> ReprocessJobResponse:
+
+        trabajo = self._get_trabajo(job_id)
+        if trabajo["estado"] != "completado":
+            # El siguiente lote lee el estado y se detiene; lo ya encolado termina
+            self.redis_client.hset(reprocess_job_key(job_id), mapping={
+                "estado": "cancelado",
+                "fecha_fin": datetime.utcnow().isoformat()
+            })
+        return await self.get_job(job_id)
+
+    def _get_trabajo(self, job_id: str) -> dict:
+
+        trabajo = self.redis_client.hgetall(reprocess_job_key(job_id))
+        if not trabajo:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Reprocesamiento no encontrado"
+            )
+        return trabajo
+
+    async def _count_outdated(self, version: str) -> int:
+
+        result = await self.db.execute(
+            select(func.count())
+            .select_from(ProcesamientoVideo)
+            .join(Video, Video.id == ProcesamientoVideo.video_id)
+            .where(*outdated_conditions(version))
+        )
+        return result.scalar_one()
@@ -0,0 +1,256 @@
+import os
+import uuid
+import hashlib
+import logging
+import redis
+from datetime import datetime, timedelta
+from typing import AsyncIterator
+from fastapi import HTTPException, status
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from app.config.settings import settings
+from app.core.storage import write_stream_to_file, inspect_mp4_stream
+from app.core.mp4 import Mp4StreamInspector
+from app.core.storage_backend import get_storage
+from app.models.video import (
+    VideoCreate, VideoUploadResponse, UploadSessionCreate, UploadSessionResponse, UploadProgressResponse
+)
+from app.services.video_service import VideoService
+
+logger = logging.getLogger(__name__)
+
+SESSIONS_PREFIX = "uploads/sesiones"
+
+
+def session_key(upload_id: str) -> str:
+    return f"upload:session:{upload_id}"
+
+
+class UploadSessionService:
+    """
+    Subidas reanudables por chunks.
+
+    El estado de cada sesión vive en Redis y los chunks en el backend de
+    almacenamiento, de modo que cualquier réplica del API puede recibir el
+    siguiente chunk.
+    """
+
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.storage = get_storage()
+        self.video_service = VideoService(db)
+        self.redis_client = redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+        self.session_ttl = settings.RESUMABLE_SESSION_TTL
+
+    async def create_session(self, user_id: str, data: UploadSessionCreate):
+
+        jugador = await self.video_service._get_jugador_by_usuario_id(user_id)
+        if not jugador:
+            raise HTTPException(
+                status_code=status.HTTP_401_UNAUTHORIZED,
+                detail="Se requiere autenticación"
+            )
+
+        if data.content_type != 'video/mp4':
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Solo se permiten archivos MP4"
+            )
+
+        if data.total_size > settings.MAX_FILE_SIZE:
+            raise HTTPException(
+                status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                detail=f"El archivo es demasiado grande. Tamaño máximo: {settings.MAX_FILE_SIZE // (1024*1024)}MB"
+            )
+
+        upload_id = str(uuid.uuid4())
+        chunk_size = settings.RESUMABLE_CHUNK_SIZE
+        total_chunks = -(-data.total_size // chunk_size)
+        expires_at = datetime.utcnow() + timedelta(seconds=self.session_ttl)
+
+        self.redis_client.hset(self._session_key(upload_id), mapping={
+            "user_id": user_id,
+            "jugador_id": jugador.id,
+            "titulo": data.titulo,
+            "filename": data.filename,
+            "total_size": data.total_size,
+            "chunk_size": chunk_size,
+            "total_chunks": total_chunks,
+            "expires_at": expires_at.isoformat()
+        })
+        self.redis_client.expire(self._session_key(upload_id), self.session_ttl)
+
+        logger.info(f"Sesión de subida {upload_id} creada para usuario {user_id} ({total_chunks} chunks)")
+
+        return UploadSessionResponse(
+            upload_id=upload_id,
+            chunk_size=chunk_size,
+            total_size=data.total_size,
+            total_chunks=total_chunks,
+            expires_at=expires_at
+        )
+
+    async def upload_chunk(self, user_id: str, upload_id: str, index: int, offset: int,
+                           body: AsyncIterator[bytes]):
+
+        session = self._get_session(user_id, upload_id)
+        if session.get("task_id"):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="La sesión de subida ya fue finalizada"
+            )
+
+        total_chunks = int(session["total_chunks"])
+        if index < 0 or index >= total_chunks:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Índice de chunk inválido. Debe estar entre 0 y {total_chunks - 1}"
+            )
+
+        expected_size = self._expected_chunk_size(session, index)
+        if offset != index * int(session["chunk_size"]):
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="El offset no corresponde al índice del chunk"
+            )
+
+        # El primer chunk permite rechazar archivos que no son MP4 sin esperar al resto
+        if index == 0:
+            body = inspect_mp4_stream(body, Mp4StreamInspector())
+
+        staging_path = os.path.join(settings.STORAGE_STAGING_DIR, f"{upload_id}_{index:06d}.chunk")
+        written = await write_stream_to_file(body, staging_path, max_size=expected_size)
+        if written != expected_size:
+            os.remove(staging_path)
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"Tamaño de chunk inválido: se esperaban {expected_size} bytes y se recibieron {written}"
+            )
+        await run_in_threadpool(self.storage.put_file, self._chunk_key(upload_id, index), staging_path, True)
+
+        # Registrar el chunk y renovar la expiración de la sesión
+        chunks_key = self._chunks_key(upload_id)
+        pipe = self.redis_client.pipeline()
+        pipe.hset(chunks_key, index, written)
+        pipe.expire(chunks_key, self.session_ttl)
+        pipe.expire(self._session_key(upload_id), self.session_ttl)
+        pipe.execute()
+
+        return self._build_progress(upload_id, session)
+
+    async def get_progress(self, user_id: str, upload_id: str):
+
+        session = self._get_session(user_id, upload_id)
+        return self._build_progress(upload_id, session)
+
+    async def complete_session(self, user_id: str, upload_id: str):
+
+        session = self._get_session(user_id, upload_id)
+        # Una sesión finalizada responde con el mismo video aunque el cliente reintente
+        if session.get("task_id"):
+            return VideoUploadResponse(task_id=session["task_id"])
+
+        progress = self._build_progress(upload_id, session)
+        if not progress.completed:
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail=f"Faltan chunks por subir: {progress.missing_chunks[:20]}"
+            )
+
+        # Evitar que dos réplicas ensamblen la misma sesión en paralelo
+        if not self.redis_client.set(f"{self._session_key(upload_id)}:lock", user_id, nx=True, ex=300):
+            raise HTTPException(
+                status_code=status.HTTP_409_CONFLICT,
+                detail="La sesión de subida ya se está finalizando"
+            )
+
+        try:
+            # Releer bajo el lock: otra réplica pudo finalizarla entre la lectura y el lock
+            session = self._get_session(user_id, upload_id)
+            if session.get("task_id"):
+                return VideoUploadResponse(task_id=session["task_id"])
+
+            video_id = str(uuid.uuid4())
+            file_path = os.path.join(settings.STORAGE_STAGING_DIR, f"{video_id}.mp4")
+            content_hash = await run_in_threadpool(self._assemble_chunks, upload_id, progress.total_chunks, file_path)
+            logger.info(f"Sesión {upload_id} ensamblada en {file_path}")
+
+            response = await self.video_service.register_uploaded_video(
+                jugador_id=session["jugador_id"],
+                video_id=video_id,
+                video_data=VideoCreate(titulo=session["titulo"]),
+                file_path=file_path,
+                original_filename=session["filename"],
+                content_hash=content_hash
+            )
+
+            # Marcar la sesión como finalizada antes de soltar el lock; expira con su TTL
+            self.redis_client.hset(self._session_key(upload_id), "task_id", response.task_id)
+        finally:
+            self.redis_client.delete(f"{self._session_key(upload_id)}:lock")
+
+        await run_in_threadpool(self.storage.delete_prefix, f"{SESSIONS_PREFIX}/{upload_id}")
+
+        return response
+
+    def _get_session(self, user_id: str, upload_id: str) -> dict:
+
+        session = self.redis_client.hgetall(self._session_key(upload_id))
+        if not session:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Sesión de subida no encontrada o expirada"
+            )
+
+        if session["user_id"] != user_id:
+            raise HTTPException(
+                status_code=status.HTTP_403_FORBIDDEN,
+                detail="No tiene permisos para acceder a esta sesión de subida"
+            )
+
+        return session
+
+    def _build_progress(self, upload_id: str, session: dict) -> UploadProgressResponse:
+
+        total_chunks = int(session["total_chunks"])
+        received = {int(index): int(size) for index, size in self.redis_client.hgetall(self._chunks_key(upload_id)).items()}
+        missing = [index for index in range(total_chunks) if index not in received]
+
+        return UploadProgressResponse(
+            upload_id=upload_id,
+            total_size=int(session["total_size"]),
+            total_chunks=total_chunks,
+            received_bytes=sum(received.values()),
+            received_chunks=sorted(received),
+            missing_chunks=missing,
+            completed=not missing
+        )
+
+    def _assemble_chunks(self, upload_id: str, total_chunks: int, file_path: str) -> str:
+        """Concatena los chunks en el archivo final y retorna su SHA-256"""
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        temp_path = f"{file_path}.part"
+        hasher = hashlib.sha256()
+        with open(temp_path, "wb") as destino:
+            for index in range(total_chunks):
+                for block in self.storage.get_stream(self._chunk_key(upload_id, index)):
+                    hasher.update(block)
+                    destino.write(block)
+        os.replace(temp_path, file_path)
+        return hasher.hexdigest()
+
+    def _expected_chunk_size(self, session: dict, index: int) -> int:
+
+        chunk_size = int(session["chunk_size"])
+        total_size = int(session["total_size"])
+        return min(chunk_size, total_size - index * chunk_size)
+
+    def _chunk_key(self, upload_id: str, index: int) -> str:
+        return f"{SESSIONS_PREFIX}/{upload_id}/{index:06d}.part"
+
+    def _session_key(self, upload_id: str) -> str:
+        return session_key(upload_id)
+
+    def _chunks_key(self, upload_id: str) -> str:
+        return f"upload:session:{upload_id}:chunks"
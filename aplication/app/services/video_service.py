@@ -1,20 +1,28 @@
 import uuid
 import os
+import time
 from datetime import datetime
+from typing import Optional
 from fastapi import UploadFile, HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, func, or_, and_
+import hashlib
 import logging
-import subprocess
-import json
+from starlette.concurrency import run_in_threadpool
 
 from app.schemas.video import Video
 from app.schemas.jugador import Jugador
 from app.schemas.procesamiento_video import ProcesamientoVideo
 from app.models.video import VideoCreate, VideoResponse, VideoUploadResponse, VideoDetailResponse, VideoDeleteResponse
-from app.core.storage import validate_video_file
+from app.core.storage import validate_video_file, iter_upload_file, write_stream_to_file, inspect_mp4_stream, hash_stream
+from app.core.mp4 import Mp4Error, Mp4StreamInspector, probe_file
+from app.core.storage_backend import get_storage, original_key, key_from_reference
+from app.core.processing_params import OUTPUT_PARAMS, current_processing_params
+from app.core.pagination import encode_cursor, decode_cursor, InvalidCursor
 from app.config.settings import settings
 from app.workers.video_tasks import process_video_task
+from app.workers.queue_routing import classify_job
+from app.workers.outbox import outbox_entry, publish_entry
 
 logger = logging.getLogger(__name__)
 
@@ -23,6 +31,7 @@ class VideoService:
     
     def __init__(self, db: AsyncSession):
         self.db = db
+        self.storage = get_storage()
 
     async def upload_video(self, user_id: str, video_data: VideoCreate, file: UploadFile):
         
@@ -44,58 +53,29 @@ class VideoService:
                     detail="Solo se permiten archivos MP4"
                 )
     
-            #Validar tamaño máximo - 100MB
-            MAX_FILE_SIZE = 100 * 1024 * 1024  # 100MB
-            content = await file.read()
-            if len(content) > MAX_FILE_SIZE:
-                raise HTTPException(
-                    status_code=status.HTTP_400_BAD_REQUEST,
-                    detail="El archivo es demasiado grande. Tamaño máximo: 100MB"
-                )
-    
             #GENERAR VIDEO_ID PRIMERO
             video_id = str(uuid.uuid4())
             logger.info(f"Video ID generado: {video_id}")
             
-            #Guardar archivo manualmente USANDO EL VIDEO_ID
-            file_path = f"/storage/uploads/videos/originales/{video_id}.mp4"
-            os.makedirs(os.path.dirname(file_path), exist_ok=True)
-            
-            #Guardar archivo
-            with open(file_path, "wb") as buffer:
-                buffer.write(content)
+            #Recibir archivo por bloques en staging USANDO EL VIDEO_ID (valida MAX_FILE_SIZE en streaming -> 413)
+            #El MP4 se inspecciona mientras llega: se rechaza antes de recibir todo el cuerpo
+            file_path = os.path.join(settings.STORAGE_STAGING_DIR, f"{video_id}.mp4")
+            inspector = Mp4StreamInspector()
+            hasher = hashlib.sha256()
+            tamaño = await write_stream_to_file(
+                hash_stream(inspect_mp4_stream(iter_upload_file(file), inspector), hasher), file_path
+            )
     
-            logger.info(f"Archivo guardado en: {file_path}")
+            logger.info(f"Archivo recibido en: {file_path} ({tamaño} bytes)")
             
-            #Obtener metadatos del video (duración real)
-            video_metadata = await self._get_video_metadata(file_path)
-    
-            #Crear registro en base de datos
-            video = await self._create_video_record(
-                video_id=video_id,
+            return await self.register_uploaded_video(
                 jugador_id=jugador.id,
+                video_id=video_id,
                 video_data=video_data,
                 file_path=file_path,
-                metadata=video_metadata,
-                original_filename=file.filename
-            )
-    
-            # Crear registro de procesamiento
-            procesamiento = await self._create_processing_record(video.id)
-    
-            #INICIAR PROCESAMIENTO ASÍNCRONO CON CELERY
-            task = process_video_task.delay(str(video.id))
-            
-            #Actualizar el registro con el ID de la tarea Celery
-            procesamiento.tarea_id = task.id
-            await self.db.commit()
-    
-            logger.info(f"Video {video.id} creado y tarea Celery {task.id} iniciada")
-    
-            #Preparar respuesta según especificación
-            return VideoUploadResponse(
-                message="Video subido correctamente. Procesamiento en curso.",
-                task_id=task.id
+                original_filename=file.filename,
+                mp4_info=inspector.info,
+                content_hash=hasher.hexdigest()
             )
     
         except HTTPException:
@@ -107,6 +87,181 @@ class VideoService:
                 detail=f"Error interno del servidor: {str(e)}"
             )
     
+    async def register_uploaded_video(self, jugador_id: str, video_id: str, video_data: VideoCreate,
+                                      file_path: str, original_filename: str, mp4_info: dict = None,
+                                      content_hash: str = None):
+        """
+        Guarda en el backend de almacenamiento el original recibido en ``file_path``
+        (archivo local de staging), registra el video y encola su procesamiento.
+        Compartido por todos los flujos de subida.
+
+        Si ya existe un video con el mismo contenido y una salida procesada con
+        los mismos parámetros, se reutiliza esa salida sin volver a transcodificar.
+        """
+        #Obtener metadatos del video (duración real); si no es un MP4 válido se descarta el archivo
+        try:
+            video_metadata = await self._get_video_metadata(file_path, mp4_info)
+        except HTTPException:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+            raise
+
+        if content_hash is None:
+            content_hash = await run_in_threadpool(self._hash_file, file_path)
+        video_metadata["hash_contenido"] = content_hash
+
+        #Reutilizar la salida de un original idéntico ya procesado con los mismos parámetros
+        duplicado = await self._find_processed_duplicate(content_hash, self._processing_params())
+        if duplicado:
+            return await self._register_duplicate_video(
+                duplicado, video_id, jugador_id, video_data, file_path, video_metadata, original_filename
+            )
+
+        #Guardar el original en el backend de almacenamiento (local: rename, S3: multipart)
+        storage_key = original_key(video_id)
+        tamaño = await run_in_threadpool(self.storage.put_file, storage_key, file_path, True)
+
+        return await self.register_stored_video(
+            jugador_id=jugador_id,
+            video_id=video_id,
+            video_data=video_data,
+            storage_key=storage_key,
+            metadata=video_metadata,
+            original_filename=original_filename,
+            tamaño_archivo=tamaño
+        )
+
+    async def register_stored_video(self, jugador_id: str, video_id: str, video_data: VideoCreate,
+                                    storage_key: str, metadata: dict, original_filename: str,
+                                    tamaño_archivo: int):
+        """
+        Crea los registros de un video cuyo original ya está en el backend de
+        almacenamiento y encola su procesamiento.
+        """
+        #Crear registro en base de datos
+        video = await self._create_video_record(
+            video_id=video_id,
+            jugador_id=jugador_id,
+            video_data=video_data,
+            file_path=storage_key,
+            metadata=metadata,
+            original_filename=original_filename,
+            tamaño_archivo=tamaño_archivo
+        )
+
+        # Crear registro de procesamiento
+        procesamiento = await self._create_processing_record(video.id)
+
+        #ENCOLAR EL PROCESAMIENTO EN LA MISMA TRANSACCIÓN (outbox; clips cortos a la cola express)
+        clase, cola = classify_job(metadata["duracion"], metadata["resolucion"])
+        entrada = outbox_entry(
+            process_video_task.name, cola, [str(video.id)],
+            {"clase": clase, "encolado_en": time.time()},
+            video_id=video.id
+        )
+        procesamiento.tarea_id = entrada.id
+        self.db.add(entrada)
+        await self.db.commit()
+
+        #Publicar de inmediato; si el broker no responde, lo envía el despachador de la outbox
+        await self._publish_outbox_entry(entrada)
+
+        logger.info(f"Video {video.id} creado y tarea Celery {entrada.id} encolada en {cola}")
+
+        #Preparar respuesta según especificación
+        return VideoUploadResponse(
+            message="Video subido correctamente. Procesamiento en curso.",
+            task_id=entrada.id
+        )
+
+    async def _publish_outbox_entry(self, entrada):
+
+        try:
+            await run_in_threadpool(publish_entry, entrada)
+        except Exception as e:
+            logger.warning(f"No se pudo publicar la tarea {entrada.id}, queda en la outbox: {e}")
+            return
+        entrada.fecha_envio = datetime.utcnow()
+        await self.db.commit()
+
+    async def _register_duplicate_video(self, duplicado: Video, video_id: str, jugador_id: str,
+                                        video_data: VideoCreate, file_path: str, metadata: dict,
+                                        original_filename: str):
+        """
+        Crea el video enlazado a los archivos del duplicado ya procesado.
+        El original recién subido se descarta porque es idéntico al existente.
+        """
+        video = await self._create_video_record(
+            video_id=video_id,
+            jugador_id=jugador_id,
+            video_data=video_data,
+            file_path=duplicado.archivo_original,
+            metadata=metadata,
+            original_filename=original_filename,
+            tamaño_archivo=duplicado.tamaño_archivo
+        )
+        video.estado = "procesado"
+        video.archivo_procesado = duplicado.archivo_procesado
+        video.archivo_hls = duplicado.archivo_hls
+        video.archivo_poster = duplicado.archivo_poster
+        video.archivo_sprite = duplicado.archivo_sprite
+        video.archivo_vtt = duplicado.archivo_vtt
+        video.duracion_procesada = duplicado.duracion_procesada
+        video.resolucion_procesada = duplicado.resolucion_procesada
+        video.fecha_procesamiento = datetime.utcnow()
+
+        procesamiento = await self._create_processing_record(video.id)
+        procesamiento.estado = "completado"
+        procesamiento.fecha_inicio = procesamiento.fecha_fin = datetime.utcnow()
+        procesamiento.parametros = {**procesamiento.parametros, "deduplicado_de": duplicado.id}
+        procesamiento.version_parametros = procesamiento.parametros["version_parametros"]
+        await self.db.commit()
+
+        if os.path.exists(file_path):
+            os.remove(file_path)
+
+        logger.info(f"Video {video_id} es duplicado de {duplicado.id}; se reutiliza su salida procesada")
+
+        return VideoUploadResponse(
+            message="Video subido correctamente. Ya existía un video idéntico procesado.",
+            task_id=procesamiento.tarea_id
+        )
+
+    async def _find_processed_duplicate(self, content_hash: str, parametros: dict):
+        
+        #Buscar por el índice de hash originales idénticos con salida procesada
+        result = await self.db.execute(
+            select(Video, ProcesamientoVideo)
+            .join(ProcesamientoVideo, ProcesamientoVideo.video_id == Video.id)
+            .where(
+                Video.hash_contenido == content_hash,
+                Video.estado == "procesado",
+                Video.archivo_procesado.isnot(None),
+                ProcesamientoVideo.estado == "completado",
+                # Solo salidas producidas con la versión vigente de los parámetros
+                ProcesamientoVideo.version_parametros == parametros["version_parametros"]
+            )
+            .order_by(Video.fecha_procesamiento.desc())
+        )
+
+        for video, procesamiento in result.all():
+            previos = procesamiento.parametros or {}
+            if not all(previos.get(clave) == parametros[clave] for clave in OUTPUT_PARAMS):
+                continue
+            # La salida debe tener el logo si se pidió (registros antiguos solo tienen incluir_logo)
+            if parametros["incluir_logo"] and not previos.get("logo_aplicado", previos.get("incluir_logo")):
+                continue
+            return video
+        return None
+
+    def _hash_file(self, file_path: str) -> str:
+        
+        hasher = hashlib.sha256()
+        with open(file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(settings.UPLOAD_CHUNK_SIZE), b""):
+                hasher.update(chunk)
+        return hasher.hexdigest()
+
     async def get_video_detail(self, user_id: str, video_id: str):
         
         try:
@@ -138,8 +293,12 @@ class VideoService:
                 )
 
             #Construir URLs para el video (si está procesado)
-            url_original = f"/storage/uploads/videos/originales/{video.id}.mp4" if video.archivo_original else None
-            url_procesado = f"/storage/processed/videos/{video.id}_final.mp4" if video.archivo_procesado else None
+            #Ningún archivo es público: todos pasan por endpoints con control de acceso
+            url_original = f"/api/videos/{video.id}/stream?variante=original" if video.archivo_original else None
+            url_mp4 = f"/api/videos/{video.id}/stream" if video.archivo_procesado else None
+            url_procesado = url_mp4
+            if video.archivo_hls and self.storage.serves_relative_urls:
+                url_procesado = self._asset_url(video.id, video.archivo_hls, carpeta="hls/")
 
             #Determinar si se puede eliminar
             puede_eliminar = self._puede_eliminar_video(video)
@@ -155,8 +314,10 @@ class VideoService:
                 contador_vistas=video.contador_vistas,
                 fecha_subida=video.fecha_subida,
                 fecha_procesamiento=video.fecha_procesamiento,
+                **self._thumbnail_urls(video),
                 url_original=url_original,
                 url_procesado=url_procesado,
+                url_mp4=url_mp4,
                 puede_eliminar=puede_eliminar
             )
 
@@ -171,6 +332,71 @@ class VideoService:
     
 
     
+    async def get_stream_key(self, user_id: Optional[str], video_id: str, variante: str = "procesado") -> str:
+        
+        video = await self._get_accessible_video(user_id, video_id, variante)
+        archivo = video.archivo_original if variante == "original" else video.archivo_procesado
+        if not archivo:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="El video aún no ha sido procesado"
+            )
+
+        return key_from_reference(archivo)
+
+    async def get_asset_key(self, user_id: Optional[str], video_id: str, nombre: str) -> str:
+        """Clave de un archivo derivado (póster, sprite, VTT o HLS) con el acceso del video procesado"""
+        video = await self._get_accessible_video(user_id, video_id, "procesado")
+
+        claves = {}
+        for archivo in (video.archivo_poster, video.archivo_sprite, video.archivo_vtt):
+            if archivo:
+                claves[os.path.basename(key_from_reference(archivo))] = key_from_reference(archivo)
+        if video.archivo_hls:
+            # Playlists y segmentos comparten carpeta; las playlists los referencian de forma relativa
+            carpeta = os.path.dirname(key_from_reference(video.archivo_hls))
+            segmento = nombre[len("hls/"):]
+            if nombre.startswith("hls/") and segmento and "/" not in segmento and segmento not in (".", ".."):
+                claves[nombre] = f"{carpeta}/{segmento}"
+
+        if nombre not in claves:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Archivo no encontrado"
+            )
+        return claves[nombre]
+
+    def _asset_url(self, video_id: str, archivo: str, carpeta: str = "") -> str:
+        
+        #Ruta de get_asset_key: los archivos HLS van bajo hls/ para conservar sus referencias relativas
+        return f"/api/videos/{video_id}/assets/{carpeta}{os.path.basename(key_from_reference(archivo))}"
+
+    async def _get_accessible_video(self, user_id: Optional[str], video_id: str, variante: str):
+        
+        #Los procesados públicos son para todos; originales y videos privados solo para su dueño
+        video = await self.db.get(Video, video_id)
+        if not video:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Video no encontrado"
+            )
+
+        publico = variante == "procesado" and video.estado == "procesado" and video.visibilidad == "publico"
+        if not publico:
+            if not user_id:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="Se requiere autenticación"
+                )
+            jugador = await self._get_jugador_by_usuario_id(user_id)
+            if not jugador or video.jugador_id != jugador.id:
+                raise HTTPException(
+                    status_code=status.HTTP_403_FORBIDDEN,
+                    detail="No tiene permisos para acceder a este video"
+                )
+
+        return video
+
     async def delete_video(self, user_id: str, video_id: str):
         
         try:
@@ -208,15 +434,20 @@ class VideoService:
                     detail="El video no puede ser eliminado porque no cumple las condiciones"
                 )
             
-            #Eliminar archivos físicos
+            #Eliminar archivos físicos (solo si ningún otro video los referencia)
             try:
-                if video.archivo_original and os.path.exists(video.archivo_original):
-                    os.remove(video.archivo_original)
-                    logger.info(f"Archivo original eliminado: {video.archivo_original}")
-            
-                if video.archivo_procesado and os.path.exists(video.archivo_procesado):
-                    os.remove(video.archivo_procesado)
-                    logger.info(f"Archivo procesado eliminado: {video.archivo_procesado}")
+                for archivo in (video.archivo_original, video.archivo_procesado, video.archivo_poster,
+                                video.archivo_sprite, video.archivo_vtt):
+                    if not archivo:
+                        continue
+                    if await self._count_file_references(archivo, exclude_video_id=video.id):
+                        logger.info(f"Archivo compartido con otros videos, se conserva: {archivo}")
+                        continue
+                    await run_in_threadpool(self.storage.delete, key_from_reference(archivo))
+                    logger.info(f"Archivo eliminado: {archivo}")
+                if video.archivo_hls and not await self._count_file_references(video.archivo_hls, exclude_video_id=video.id):
+                    await run_in_threadpool(self.storage.delete_prefix, os.path.dirname(key_from_reference(video.archivo_hls)))
+                    logger.info(f"Escalera HLS eliminada: {video.archivo_hls}")
             except Exception as file_error:
                 logger.warning(f"Error eliminando archivos físicos: {file_error}")
     
@@ -273,11 +504,24 @@ class VideoService:
                 duracion_procesada=video.duracion_procesada,
                 contador_vistas=video.contador_vistas,
                 fecha_subida=video.fecha_subida,
-                fecha_procesamiento=video.fecha_procesamiento
+                fecha_procesamiento=video.fecha_procesamiento,
+                **self._thumbnail_urls(video)
             )
             for video in videos
         ]
 
+    def _thumbnail_urls(self, video) -> dict:
+        
+        #URLs de póster, sprite e índice VTT generados al procesar
+        return {
+            f"url_{nombre}": self._asset_url(video.id, archivo) if archivo else None
+            for nombre, archivo in (
+                ("poster", video.archivo_poster),
+                ("sprite", video.archivo_sprite),
+                ("vtt", video.archivo_vtt),
+            )
+        }
+
     async def _get_jugador_by_usuario_id(self, usuario_id: str):
         
         result = await self.db.execute(
@@ -285,45 +529,49 @@ class VideoService:
         )
         return result.scalar_one_or_none()
 
-    async def _get_video_metadata(self, file_path: str):
+    async def _count_file_references(self, path: str, exclude_video_id: str = None) -> int:
         
-        try:
-            # Comando para obtener metadatos con FFprobe
-            cmd = [
-                'ffprobe', 
-                '-v', 'quiet',
-                '-print_format', 'json',
-                '-show_format',
-                '-show_streams',
-                file_path
-            ]
-            
-            result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-            metadata = json.loads(result.stdout)
-            
-            # Obtener duración en segundos
-            duration = float(metadata['format']['duration'])
-            
-            # Obtener resolución
-            video_stream = next((stream for stream in metadata['streams'] if stream['codec_type'] == 'video'), None)
-            resolution = f"{video_stream['width']}x{video_stream['height']}" if video_stream else "1920x1080"
-            
-            return {
-                "duracion": int(duration),  # Duración en segundos
-                "resolucion": resolution,
-                "formato": os.path.splitext(file_path)[1].lower().replace('.', '')
-            }
-            
-        except Exception as e:
-            logger.warning(f"No se pudieron obtener metadatos del video: {e}")
-            return {
-                "duracion": 0,
-                "resolucion": "1920x1080",
-                "formato": os.path.splitext(file_path)[1].lower().replace('.', '')
-            }
+        #Conteo de referencias: un mismo archivo puede estar enlazado por videos deduplicados
+        stmt = select(func.count(Video.id)).where(
+            or_(
+                Video.archivo_original == path, Video.archivo_procesado == path, Video.archivo_hls == path,
+                Video.archivo_poster == path, Video.archivo_sprite == path, Video.archivo_vtt == path
+            )
+        )
+        if exclude_video_id:
+            stmt = stmt.where(Video.id != exclude_video_id)
+        result = await self.db.execute(stmt)
+        return result.scalar_one()
+
+    async def _get_video_metadata(self, file_path: str, mp4_info: dict = None):
+        
+        #Leer las cajas del MP4 en un hilo aparte (sin ffprobe ni bloquear el event loop)
+        if mp4_info is None:
+            try:
+                mp4_info = await run_in_threadpool(probe_file, file_path)
+            except Mp4Error as e:
+                logger.warning(f"Archivo MP4 inválido {file_path}: {e}")
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail=f"El archivo no es un MP4 válido: {e}"
+                )
+
+        if mp4_info["duracion"] > settings.MAX_VIDEO_DURATION:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=f"El video supera la duración máxima permitida de {settings.MAX_VIDEO_DURATION} segundos"
+            )
+
+        return {
+            "duracion": int(mp4_info["duracion"]),  # Duración en segundos
+            "resolucion": mp4_info["resolucion"],
+            "codec": mp4_info["codec"],
+            "formato": os.path.splitext(file_path)[1].lower().replace('.', '')
+        }
 
     async def _create_video_record(self, video_id: str, jugador_id: str, video_data: VideoCreate, 
-                                 file_path: str, metadata: dict, original_filename: str):
+                                 file_path: str, metadata: dict, original_filename: str,
+                                 tamaño_archivo: int):
         
         
         video = Video(
@@ -334,15 +582,16 @@ class VideoService:
             duracion_original=metadata["duracion"],  # Duración real en segundos
             estado="subido",
             formato_original=metadata["formato"],
-            tamaño_archivo=os.path.getsize(file_path) if os.path.exists(file_path) else 0,
+            tamaño_archivo=tamaño_archivo,
             resolucion_original=metadata["resolucion"],
+            hash_contenido=metadata.get("hash_contenido"),
             fecha_subida=datetime.utcnow(),
             contador_vistas=0
         )
 
+        # Se confirma junto con el procesamiento y su tarea
         self.db.add(video)
-        await self.db.commit()
-        await self.db.refresh(video)
+        await self.db.flush()
         
         return video
 
@@ -357,19 +606,18 @@ class VideoService:
             fecha_inicio=None,
             fecha_fin=None,
             error_message=None,
-            parametros={
-                "duracion_maxima": settings.TARGET_DURATION,
-                "resolucion_objetivo": settings.TARGET_RESOLUTION,
-                "incluir_logo": True
-            }
+            parametros=self._processing_params()
         )
 
         self.db.add(procesamiento)
-        await self.db.commit()
-        await self.db.refresh(procesamiento)
+        await self.db.flush()
         
         return procesamiento
 
+    def _processing_params(self) -> dict:
+        
+        return current_processing_params()
+
     def _puede_eliminar_video(self, video) -> bool:
         
         # No se puede eliminar si está siendo procesado
@@ -383,39 +631,67 @@ class VideoService:
         return True
     
     
-    async def get_videos_for_voting(self, skip: int = 0, limit: int = 50):
-        
-        try:
-            from sqlalchemy import select
-            from app.schemas.video import Video
+    async def get_videos_for_voting(self, skip: int = 0, limit: int = 50, cursor: str = None):
+        """
+        Retorna (videos, cursor siguiente). Con ``cursor`` se pagina por
+        keyset sobre (fecha_subida, id) e ignora ``skip``; el cursor siguiente
+        es None en la última página.
+        """
+        despues_de = None
+        if cursor:
+            try:
+                fecha, video_id = decode_cursor(cursor, 2)
+                despues_de = (datetime.fromisoformat(fecha), video_id)
+            except (InvalidCursor, TypeError, ValueError):
+                raise HTTPException(
+                    status_code=status.HTTP_400_BAD_REQUEST,
+                    detail="Cursor inválido"
+                )
 
-            result = await self.db.execute(
+        try:
+            stmt = (
                 select(Video)
                 .where(
                     Video.estado == 'procesado',
                     Video.visibilidad == 'publico'
                 )
-                .order_by(Video.fecha_subida.desc())
-                .offset(skip)
-                .limit(limit)
+                # idx_video_estado_fecha_subida (InnoDB agrega el id al índice)
+                .order_by(Video.fecha_subida.desc(), Video.id.desc())
             )
+            if despues_de:
+                fecha, video_id = despues_de
+                stmt = stmt.where(or_(
+                    Video.fecha_subida < fecha,
+                    and_(Video.fecha_subida == fecha, Video.id < video_id)
+                ))
+            else:
+                stmt = stmt.offset(skip)
 
+            # Una fila extra indica si hay página siguiente
+            result = await self.db.execute(stmt.limit(limit + 1))
             videos = result.scalars().all()
 
+            siguiente = None
+            if len(videos) > limit:
+                videos = videos[:limit]
+                siguiente = encode_cursor(videos[-1].fecha_subida.isoformat(), videos[-1].id)
+
             return [
                 VideoResponse(
                     id=video.id,
                     jugador_id=video.jugador_id,
+                    titulo=video.titulo,
                     estado=video.estado,
                     duracion_original=video.duracion_original,
                     duracion_procesada=video.duracion_procesada,
                     contador_vistas=video.contador_vistas,
                     fecha_subida=video.fecha_subida,
-                    fecha_procesamiento=video.fecha_procesamiento
+                    fecha_procesamiento=video.fecha_procesamiento,
+                    **self._thumbnail_urls(video)
                 )
                 for video in videos
-            ]
+            ], siguiente
 
         except Exception as e:
             logger.error(f"Error obteniendo videos para votación: {str(e)}")
-            return []
\ No newline at end of file
+            return [], None
\ No newline at end of file
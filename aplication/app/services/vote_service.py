@@ -6,7 +6,7 @@ from datetime import datetime, timedelta
 from typing import List, Optional
 from fastapi import HTTPException, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, and_, func, desc
+from sqlalchemy import select, and_, or_, func, desc
 
 from app.config.settings import settings
 from app.schemas.video import Video
@@ -15,6 +15,10 @@ from app.schemas.user import User
 from app.schemas.jugador import Jugador
 from app.schemas.ciudad import Ciudad
 from app.schemas.ranking import Ranking
+from app.schemas.ranking_activo import RankingActivo
+from app.core.leaderboard import Leaderboard, player_profile
+from app.services.city_catalog_service import CityCatalogService
+from app.core.pagination import encode_cursor, decode_cursor, InvalidCursor
 
 logger = logging.getLogger(__name__)
 
@@ -29,12 +33,13 @@ class VoteService:
        
         try:
             #Verificar que el video existe y es votable
-            video = await self._get_votable_video(video_id)
-            if not video:
+            votable = await self._get_votable_video(video_id)
+            if not votable:
                 raise HTTPException(
                     status_code=status.HTTP_404_NOT_FOUND,
                     detail="Video no encontrado o no disponible para votación"
                 )
+            video, ciudad_id, nombre, apellido, ciudad_nombre = votable
 
             #Verificar que el usuario no haya votado antes por este video
             existing_vote = await self._get_existing_vote(user_id, video_id)
@@ -50,7 +55,8 @@ class VoteService:
                 video_id=video_id,
                 usuario_id=user_id,
                 ip_address="127.0.0.1",
-                fecha_voto=datetime.utcnow(),
+                # Segundos enteros, como los guarda la columna: la tabla de posiciones compara con esta fecha
+                fecha_voto=datetime.utcnow().replace(microsecond=0),
                 valor=1
             )
 
@@ -59,12 +65,12 @@ class VoteService:
             #Incrementar contador de vistas (opcional)
             video.contador_vistas += 1
             
-            #Invalidar cache de rankings y programar actualización
-            await self.invalidate_rankings_on_vote()
-            
             await self.db.commit()
             logger.info(f"Voto registrado: usuario {user_id} -> video {video_id}")
 
+            #Sumar el voto a la tabla de posiciones solo cuando ya está confirmado
+            self._update_leaderboard(voto, video.jugador_id, ciudad_id, player_profile(nombre, apellido, ciudad_nombre))
+
         except HTTPException:
             await self.db.rollback()
             raise
@@ -76,11 +82,35 @@ class VoteService:
                 detail=f"Error interno del servidor: {str(e)}"
             )
 
-    async def get_rankings(self, ciudad: str = None, skip: int = 0, limit: int = 50):
-        
+    async def get_rankings(self, ciudad: str = None, skip: int = 0, limit: int = 50, cursor: str = None):
+        """
+        Retorna (rankings, cursor siguiente). Todas las fuentes ordenan por
+        (votos desc, jugador_id desc); con ``cursor`` se pagina por keyset
+        sobre esa clave e ignora ``skip``. Se pide una fila extra para saber
+        si hay página siguiente.
+        """
+        despues_de = self._decode_cursor(cursor) if cursor else None
+
+        # La ciudad (id o slug) se resuelve con el catálogo cacheado a su id
+        ciudad_id = None
+        if ciudad:
+            ciudad_id = await CityCatalogService(self.db, self.redis_client).resolve(ciudad)
+            if not ciudad_id:
+                return [], None
+
+        rankings = await self._get_rankings_page(ciudad_id, skip, limit + 1, cursor, despues_de)
+        return self._split_page(rankings, limit)
+
+    async def _get_rankings_page(self, ciudad_id: str, skip: int, limit: int, cursor: str, despues_de: tuple):
+
+        # Tabla de posiciones en Redis, actualizada en cada voto
+        rankings = await self._get_rankings_from_leaderboard(ciudad_id, skip, limit, despues_de)
+        if rankings is not None:
+            return rankings
+
         try:
             # Generar clave única para el cache basada en los parámetros
-            cache_key = self._generate_cache_key(ciudad, skip, limit)
+            cache_key = self._generate_cache_key(ciudad_id, skip, limit, cursor)
             
             # Intentar obtener del cache primero
             cached_result = self._get_from_cache(cache_key)
@@ -90,7 +120,7 @@ class VoteService:
             
             # Si no está en cache, calcular desde la base de datos
             logger.info("Calculando ranking desde base de datos")
-            rankings = await self._calculate_rankings(ciudad, skip, limit)
+            rankings = await self._calculate_rankings(ciudad_id, skip, limit, despues_de)
             
             # Guardar en cache
             self._set_to_cache(cache_key, rankings)
@@ -100,19 +130,57 @@ class VoteService:
         except Exception as e:
             logger.error(f"Error obteniendo rankings: {str(e)}")
             # En caso de error, intentar calcular sin cache
-            return await self._calculate_rankings(ciudad, skip, limit)
+            return await self._calculate_rankings(ciudad_id, skip, limit, despues_de)
+
+    async def _get_rankings_from_leaderboard(self, ciudad_id: str = None, skip: int = 0, limit: int = 50,
+                                             despues_de: tuple = None):
+        
+        try:
+            return Leaderboard(self.redis_client).top(skip, limit, ciudad_id, despues_de)
+        except Exception as e:
+            logger.warning(f"Error leyendo tabla de posiciones: {str(e)}")
+            return None
+
+    def _update_leaderboard(self, voto: Voto, jugador_id: str, ciudad_id: str, perfil: str):
+        
+        try:
+            if not Leaderboard(self.redis_client).increment(voto.id, voto.fecha_voto, jugador_id, ciudad_id, perfil):
+                logger.info("Tabla de posiciones aún sin construir; la creará la próxima reconciliación")
+        except Exception as e:
+            # El voto ya está confirmado; la reconciliación periódica corrige el puntaje
+            logger.warning(f"Error actualizando tabla de posiciones: {str(e)}")
 
-    async def _calculate_rankings(self, ciudad: str = None, skip: int = 0, limit: int = 50):
+    def _split_page(self, rankings: list, limit: int) -> tuple:
+        """(página, cursor siguiente); el cursor es None si no sobró la fila extra"""
+        if len(rankings) <= limit:
+            return rankings, None
+        rankings = rankings[:limit]
+        return rankings, encode_cursor(rankings[-1]["votes"], rankings[-1]["player_id"])
+
+    def _decode_cursor(self, cursor: str) -> tuple:
+        
+        try:
+            votos, jugador_id = decode_cursor(cursor, 2)
+            if not isinstance(votos, int) or isinstance(votos, bool) or votos < 0 or not isinstance(jugador_id, str):
+                raise InvalidCursor("Cursor inválido")
+            return votos, jugador_id
+        except InvalidCursor:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail="Cursor inválido"
+            )
+
+    async def _calculate_rankings(self, ciudad_id: str = None, skip: int = 0, limit: int = 50, despues_de: tuple = None):
       
         try:
             # Primero intentar desde la tabla Ranking
-            rankings = await self._calculate_rankings_from_table(ciudad, skip, limit)
-            if rankings:
+            rankings = await self._calculate_rankings_from_table(ciudad_id, skip, limit, despues_de)
+            if rankings is not None:
                 return rankings
             
-            # Si la tabla Ranking está vacía, usar fallback
-            logger.info("Tabla Ranking vacía, usando cálculo desde votos")
-            return await self._calculate_rankings_fallback(ciudad, skip, limit)
+            # Si la temporada aún no tiene snapshot publicado, usar fallback
+            logger.info("Ranking sin snapshot publicado, usando cálculo desde votos")
+            return await self._calculate_rankings_fallback(ciudad_id, skip, limit, despues_de)
             
         except Exception as e:
             logger.error(f"Error calculando rankings: {str(e)}")
@@ -121,13 +189,23 @@ class VoteService:
                 detail="Error calculando el ranking"
             )
 
-    async def _calculate_rankings_from_table(self, ciudad: str = None, skip: int = 0, limit: int = 50):
+    async def _calculate_rankings_from_table(self, ciudad_id: str = None, skip: int = 0, limit: int = 50,
+                                             despues_de: tuple = None):
         
         try:
-            # Consulta optimizada usando la tabla Ranking
+            # Snapshot publicado de la temporada (las reconstrucciones escriben uno nuevo)
+            result = await self.db.execute(
+                select(RankingActivo.version).where(RankingActivo.temporada == self._get_current_season())
+            )
+            version = result.scalar_one_or_none()
+            if version is None:
+                return None
+
+            # Con ciudad se lee su posición propia, si no la global
+            posicion = Ranking.posicion_ciudad if ciudad_id else Ranking.posicion
             stmt = (
                 select(
-                    Ranking.posicion,
+                    posicion,
                     User.nombre,
                     User.apellido,
                     Ciudad.nombre.label("ciudad_nombre"),
@@ -138,24 +216,32 @@ class VoteService:
                 .join(Jugador, Jugador.id == Ranking.jugador_id)
                 .join(User, User.id == Jugador.usuario_id)
                 .join(Ciudad, Ciudad.id == Ranking.ciudad_id)
-                .where(Ranking.temporada == self._get_current_season())  # Filtro por temporada actual
-                .order_by(Ranking.posicion.asc())
+                .where(
+                    Ranking.temporada == self._get_current_season(),  # Filtro por temporada actual
+                    Ranking.version == version
+                )
+                # idx_ranking_puntuacion_jugador / idx_ranking_ciudad_puntuacion_jugador
+                .order_by(Ranking.puntuacion_total.desc(), Ranking.jugador_id.desc())
             )
             
             # Aplicar filtro por ciudad si se proporciona
-            if ciudad:
-                stmt = stmt.where(Ciudad.nombre.ilike(f"%{ciudad}%"))
+            if ciudad_id:
+                stmt = stmt.where(Ranking.ciudad_id == ciudad_id)
             
-            # Aplicar paginación
-            stmt = stmt.offset(skip).limit(limit)
+            # Aplicar paginación: por keyset (votos, jugador) si hay cursor
+            if despues_de:
+                votos, jugador_id = despues_de
+                stmt = stmt.where(or_(
+                    Ranking.puntuacion_total < votos,
+                    and_(Ranking.puntuacion_total == votos, Ranking.jugador_id < jugador_id)
+                ))
+            else:
+                stmt = stmt.offset(skip)
+            stmt = stmt.limit(limit)
             
             result = await self.db.execute(stmt)
             rankings_data = result.all()
             
-            # Si no hay datos en la tabla Ranking, retornar None para usar fallback
-            if not rankings_data:
-                return None
-            
             # Formatear respuesta
             rankings = []
             for (posicion, nombre, apellido, ciudad_nombre, total_votos, player_id) in rankings_data:
@@ -173,16 +259,20 @@ class VoteService:
             logger.error(f"Error calculando rankings desde tabla Ranking: {str(e)}")
             return None
 
-    async def _calculate_rankings_fallback(self, ciudad: str = None, skip: int = 0, limit: int = 50):
+    async def _calculate_rankings_fallback(self, ciudad_id: str = None, skip: int = 0, limit: int = 50,
+                                           despues_de: tuple = None):
         
         try:
-            stmt = (
+            # La posición se calcula con RANK() sobre todos los jugadores (del filtro) antes de paginar
+            total_votos = func.count(Voto.id)
+            ranking = (
                 select(
-                    Jugador.id,
+                    Jugador.id.label("jugador_id"),
                     User.nombre,
                     User.apellido,
                     Ciudad.nombre.label("ciudad_nombre"),
-                    func.count(Voto.id).label("total_votos")
+                    total_votos.label("total_votos"),
+                    func.rank().over(order_by=total_votos.desc()).label("posicion")
                 )
                 .select_from(Jugador)
                 .join(User, User.id == Jugador.usuario_id)
@@ -194,19 +284,29 @@ class VoteService:
                     Video.visibilidad == 'publico'
                 )
                 .group_by(Jugador.id, User.nombre, User.apellido, Ciudad.nombre)
-                .order_by(desc("total_votos"))
             )
             
-            if ciudad:
-                stmt = stmt.where(Ciudad.nombre.ilike(f"%{ciudad}%"))
-            
-            stmt = stmt.offset(skip).limit(limit)
+            if ciudad_id:
+                ranking = ranking.where(Jugador.ciudad_id == ciudad_id)
+            ranking = ranking.subquery()
+
+            # El keyset se aplica fuera del agregado para no alterar las posiciones
+            stmt = select(ranking).order_by(ranking.c.total_votos.desc(), ranking.c.jugador_id.desc())
+            if despues_de:
+                votos, jugador_id = despues_de
+                stmt = stmt.where(or_(
+                    ranking.c.total_votos < votos,
+                    and_(ranking.c.total_votos == votos, ranking.c.jugador_id < jugador_id)
+                ))
+            else:
+                stmt = stmt.offset(skip)
+            stmt = stmt.limit(limit)
             
             result = await self.db.execute(stmt)
             rankings_data = result.all()
             
             rankings = []
-            for position, (jugador_id, nombre, apellido, ciudad_nombre, total_votos) in enumerate(rankings_data, start=skip + 1):
+            for jugador_id, nombre, apellido, ciudad_nombre, total_votos, position in rankings_data:
                 rankings.append({
                     "position": position,
                     "username": f"{nombre} {apellido}",
@@ -223,8 +323,13 @@ class VoteService:
 
     async def _get_votable_video(self, video_id: str):
         
+        # Incluye los datos del jugador que necesita la tabla de posiciones
         result = await self.db.execute(
-            select(Video).where(
+            select(Video, Jugador.ciudad_id, User.nombre, User.apellido, Ciudad.nombre)
+            .join(Jugador, Jugador.id == Video.jugador_id)
+            .join(User, User.id == Jugador.usuario_id)
+            .join(Ciudad, Ciudad.id == Jugador.ciudad_id)
+            .where(
                 and_(
                     Video.id == video_id,
                     Video.estado == 'procesado',
@@ -232,7 +337,7 @@ class VoteService:
                 )
             )
         )
-        return result.scalar_one_or_none()
+        return result.one_or_none()
 
     async def _get_existing_vote(self, user_id: str, video_id: str):
         
@@ -265,12 +370,13 @@ class VoteService:
         except Exception as e:
             logger.warning(f"Error invalidando cache: {str(e)}")
 
-    def _generate_cache_key(self, ciudad: str, skip: int, limit: int) -> str:
+    def _generate_cache_key(self, ciudad_id: str, skip: int, limit: int, cursor: str = None) -> str:
         
         base_key = "rankings"
-        if ciudad:
-            base_key += f":ciudad:{ciudad.lower().replace(' ', '_')}"
-        base_key += f":skip:{skip}:limit:{limit}"
+        if ciudad_id:
+            base_key += f":ciudad:{ciudad_id}"
+        base_key += f":cursor:{cursor}" if cursor else f":skip:{skip}"
+        base_key += f":limit:{limit}"
         return base_key
 
     def _get_from_cache(self, cache_key: str):
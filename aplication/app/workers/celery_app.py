@@ -10,6 +10,9 @@ celery_app = Celery(
     include=[
         "app.workers.video_tasks",  # Tareas de video
         "app.workers.ranking_tasks",  # ✅ NUEVA: Tareas de rankings
+        "app.workers.reprocess_tasks",  # Reprocesamiento masivo
+        "app.workers.outbox",  # Despacho de la outbox de tareas
+        "app.workers.reaper_tasks",  # Videos atascados
         # "app.workers.email_tasks"  # Comenta si no existe
     ]
 )
@@ -36,15 +39,40 @@ celery_app.conf.beat_schedule = {
         'schedule': 300.0,  # Cada 5 minutos (300 segundos)
         'options': {'queue': 'rankings'}
     },
+    'prune-ranking-snapshots-every-10-minutes': {
+        'task': 'app.workers.ranking_tasks.prune_ranking_snapshots_task',
+        'schedule': 600.0,
+        'options': {'queue': 'rankings'}
+    },
+    'dispatch-outbox-every-30-seconds': {
+        'task': 'app.workers.outbox.dispatch_outbox_task',
+        'schedule': 30.0,
+        'options': {'queue': 'maintenance'}
+    },
+    'reap-stuck-videos-every-5-minutes': {
+        'task': 'app.workers.reaper_tasks.reap_stuck_videos_task',
+        'schedule': 300.0,
+        'options': {'queue': 'maintenance'}
+    },
+    'cleanup-storage-every-10-minutes': {
+        'task': 'app.workers.video_tasks.cleanup_old_videos',
+        'schedule': 600.0,  # Cada ejecución revisa un lote y continúa desde su cursor
+        'options': {'queue': 'maintenance'}
+    },
     # Puedes agregar más tareas programadas aquí
 }
 
 # Configuración específica de rutas para colas
 celery_app.conf.task_routes = {
-    'app.workers.video_tasks.process_video_task': {'queue': 'video_processing'},
+    # Cola por defecto (bulk); VideoService elige video_express para clips cortos
+    'app.workers.video_tasks.process_video_task': {'queue': settings.VIDEO_BULK_QUEUE},
     'app.workers.video_tasks.cleanup_old_videos': {'queue': 'maintenance'},
     'app.workers.ranking_tasks.update_rankings_task': {'queue': 'rankings'},  
+    'app.workers.ranking_tasks.prune_ranking_snapshots_task': {'queue': 'rankings'},
+    'app.workers.reprocess_tasks.reprocess_outdated_task': {'queue': 'maintenance'},
+    'app.workers.outbox.dispatch_outbox_task': {'queue': 'maintenance'},
+    'app.workers.reaper_tasks.reap_stuck_videos_task': {'queue': 'maintenance'},
 }
 
 # Importar tareas después de configurar la app
-from app.workers import video_tasks, ranking_tasks  
\ No newline at end of file
+from app.workers import video_tasks, ranking_tasks, reprocess_tasks, outbox, reaper_tasks  
\ No newline at end of file
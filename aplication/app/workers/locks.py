@@ -0,0 +1,93 @@
+"""
+Concesiones (leases) en Redis para procesar cada video una sola vez.
+
+Con ``task_acks_late`` una tarea puede reentregarse mientras el primer
+intento sigue codificando. La concesión se toma con ``SET NX`` y un TTL
+corto que un hilo de latido renueva mientras el trabajo avanza; si el worker
+muere, la concesión expira sola. Renovar y liberar son scripts Lua que solo
+actúan si el valor sigue siendo el token del dueño.
+"""
+import uuid
+import logging
+import threading
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+
+RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+def lease_key(video_id: str) -> str:
+    return f"lease:video:{video_id}"
+
+
+class LeaseLost(Exception):
+    """La concesión expiró o la tomó otro worker"""
+
+
+class VideoLease:
+
+    def __init__(self, redis_client, video_id: str, ttl: int = None, token: str = None):
+        self.redis_client = redis_client
+        self.key = lease_key(video_id)
+        self.ttl = ttl or settings.PROCESSING_LEASE_TTL
+        self.token = token or str(uuid.uuid4())
+        self.perdida = threading.Event()
+        self._detener = threading.Event()
+        self._latido = None
+        self._renew = redis_client.register_script(RENEW_SCRIPT)
+        self._release = redis_client.register_script(RELEASE_SCRIPT)
+
+    def acquire(self) -> bool:
+        """Toma la concesión si está libre e inicia el latido"""
+        if not self.redis_client.set(self.key, self.token, nx=True, ex=self.ttl):
+            return False
+        self._latido = threading.Thread(target=self._heartbeat, name=f"latido-{self.key}", daemon=True)
+        self._latido.start()
+        return True
+
+    def holder(self):
+        return self.redis_client.get(self.key)
+
+    def renew(self) -> bool:
+        return bool(self._renew(keys=[self.key], args=[self.token, self.ttl * 1000]))
+
+    def ensure(self):
+        """Confirma que la concesión sigue siendo propia antes de un paso con efectos"""
+        if self.perdida.is_set() or not self.renew():
+            self.perdida.set()
+            raise LeaseLost(f"Se perdió la concesión {self.key}")
+
+    def release(self):
+        self._detener.set()
+        if self._latido:
+            self._latido.join(timeout=1)
+        try:
+            self._release(keys=[self.key], args=[self.token])
+        except Exception as e:
+            # Si no se puede liberar, expira sola con el TTL
+            logger.warning(f"No se pudo liberar la concesión {self.key}: {e}")
+
+    def _heartbeat(self):
+        while not self._detener.wait(self.ttl / 3):
+            try:
+                if not self.renew():
+                    logger.error(f"Concesión {self.key} perdida")
+                    self.perdida.set()
+                    return
+            except Exception as e:
+                # Un fallo puntual de Redis no invalida la concesión mientras no expire
+                logger.warning(f"No se pudo renovar la concesión {self.key}: {e}")
@@ -0,0 +1,89 @@
+"""
+Bandeja de salida (outbox) de tareas Celery.
+
+Encolar una tarea se registra como una fila ``TareaPendiente`` en la misma
+transacción que los datos que la originan; si el broker no responde o el
+proceso muere antes de publicarla, el despachador periódico la envía después.
+El id de la fila es el id de la tarea, así que un reenvío llega como la misma
+tarea y el procesamiento lo descarta por su concesión o su estado.
+"""
+import uuid
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, delete
+
+from app.workers.celery_app import celery_app
+from app.workers.video_tasks import SyncSessionLocal
+from app.config.settings import settings
+from app.schemas.tarea_pendiente import TareaPendiente
+
+logger = logging.getLogger(__name__)
+
+
+def outbox_entry(tarea: str, cola: str, argumentos: list, opciones: dict = None,
+                 video_id: str = None) -> TareaPendiente:
+    """Fila a agregar en la transacción del llamador"""
+    return TareaPendiente(
+        id=str(uuid.uuid4()),
+        tarea=tarea,
+        cola=cola,
+        argumentos=argumentos,
+        opciones=opciones or {},
+        video_id=video_id,
+        fecha_creacion=datetime.utcnow(),
+        intentos=0
+    )
+
+def publish_entry(entrada: TareaPendiente):
+    celery_app.send_task(
+        entrada.tarea,
+        args=entrada.argumentos,
+        kwargs=entrada.opciones,
+        queue=entrada.cola,
+        task_id=entrada.id
+    )
+
+def dispatch_pending_sync(limit: int = None) -> dict:
+    """Publica las tareas no enviadas más antiguas - SÍNCRONO"""
+    enviadas = fallidas = 0
+    with SyncSessionLocal() as session:
+        # SKIP LOCKED: varios despachadores no toman las mismas filas
+        entradas = session.execute(
+            select(TareaPendiente)
+            .where(TareaPendiente.fecha_envio.is_(None))
+            .order_by(TareaPendiente.fecha_creacion)
+            .limit(limit or settings.OUTBOX_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        ).scalars().all()
+
+        for entrada in entradas:
+            try:
+                publish_entry(entrada)
+                entrada.fecha_envio = datetime.utcnow()
+                enviadas += 1
+            except Exception as e:
+                entrada.intentos += 1
+                entrada.error_message = str(e)
+                fallidas += 1
+        session.commit()
+
+    if enviadas or fallidas:
+        logger.info(f"📤 Outbox: {enviadas} tareas enviadas, {fallidas} fallidas")
+    return {"enviadas": enviadas, "fallidas": fallidas}
+
+def prune_sent_sync() -> int:
+    """Elimina las filas ya enviadas tras el período de retención - SÍNCRONO"""
+    limite = datetime.utcnow() - timedelta(days=settings.OUTBOX_RETENTION_DAYS)
+    with SyncSessionLocal() as session:
+        result = session.execute(delete(TareaPendiente).where(TareaPendiente.fecha_envio < limite))
+        session.commit()
+        return result.rowcount
+
+@celery_app.task
+def dispatch_outbox_task():
+    """Tarea periódica: envía las tareas que no se publicaron al crearse"""
+    try:
+        return {**dispatch_pending_sync(), "eliminadas": prune_sent_sync(), "status": "completed"}
+    except Exception as e:
+        logger.error(f"Error despachando outbox: {str(e)}")
+        return {"error": str(e), "status": "failed"}
@@ -0,0 +1,116 @@
+"""
+Caché local de salidas procesadas.
+
+Cada entrada es un directorio con los artefactos de un procesamiento (MP4,
+miniaturas, HLS) y un ``meta.json``. La clave combina el hash del original
+con la versión de los parámetros (que incluye pipeline y logo), de modo que
+un reintento o un reprocesamiento sin cambios no vuelve a ejecutar ffmpeg.
+Los archivos se enlazan (hardlink) cuando el caché y el directorio de trabajo
+están en el mismo volumen; si no, se copian. Se expulsan las entradas usadas
+hace más tiempo cuando se supera el presupuesto de disco.
+"""
+import os
+import json
+import shutil
+import hashlib
+import logging
+import tempfile
+from typing import Optional
+
+from app.config.settings import settings
+from app.core.processing_params import params_version
+
+logger = logging.getLogger(__name__)
+
+META_FILE = "meta.json"
+
+
+def _link_or_copy(origen: str, destino: str):
+    os.makedirs(os.path.dirname(destino), exist_ok=True)
+    try:
+        os.link(origen, destino)
+    except OSError:
+        shutil.copy2(origen, destino)
+
+
+def _link_tree(origen_dir: str, destino_dir: str) -> int:
+    """Replica los archivos de ``origen_dir`` en ``destino_dir``; retorna los bytes"""
+    total = 0
+    for raiz, _, archivos in os.walk(origen_dir):
+        for nombre in archivos:
+            if raiz == origen_dir and nombre == META_FILE:
+                continue
+            origen = os.path.join(raiz, nombre)
+            _link_or_copy(origen, os.path.join(destino_dir, os.path.relpath(origen, origen_dir)))
+            total += os.path.getsize(origen)
+    return total
+
+
+class OutputCache:
+
+    def __init__(self, root: str = None, max_bytes: int = None):
+        self.root = root or settings.OUTPUT_CACHE_DIR
+        self.max_bytes = settings.OUTPUT_CACHE_MAX_BYTES if max_bytes is None else max_bytes
+
+    @staticmethod
+    def key(content_hash: str, parametros: dict) -> str:
+        material = {
+            "hash": content_hash,
+            "version": params_version(parametros),
+            "hls": settings.HLS_ENABLED,
+        }
+        return hashlib.sha256(json.dumps(material, sort_keys=True).encode()).hexdigest()
+
+    def _entry_dir(self, key: str) -> str:
+        return os.path.join(self.root, key)
+
+    def lookup(self, key: str, destino_dir: str) -> Optional[dict]:
+        """Si hay entrada, replica sus artefactos en ``destino_dir`` y retorna su meta"""
+        entrada = self._entry_dir(key)
+        try:
+            with open(os.path.join(entrada, META_FILE)) as f:
+                meta = json.load(f)
+            _link_tree(entrada, destino_dir)
+        except (OSError, ValueError):
+            return None
+
+        # La fecha de modificación de la entrada marca su último uso (LRU)
+        os.utime(entrada)
+        return meta
+
+    def store(self, key: str, origen_dir: str, meta: dict):
+        """Guarda los artefactos de ``origen_dir``; si ya existe la entrada se conserva la previa"""
+        os.makedirs(self.root, exist_ok=True)
+        temporal = tempfile.mkdtemp(prefix=".tmp_", dir=self.root)
+        try:
+            meta = {**meta, "bytes": _link_tree(origen_dir, temporal)}
+            with open(os.path.join(temporal, META_FILE), "w") as f:
+                json.dump(meta, f)
+            os.rename(temporal, self._entry_dir(key))
+        except OSError as e:
+            logger.warning(f"No se pudo guardar la salida en caché: {e}")
+            shutil.rmtree(temporal, ignore_errors=True)
+            return
+        self.evict()
+
+    def evict(self):
+        """Elimina las entradas menos usadas hasta quedar dentro del presupuesto"""
+        entradas = []
+        with os.scandir(self.root) as it:
+            for entrada in it:
+                if not entrada.is_dir() or entrada.name.startswith("."):
+                    continue
+                try:
+                    with open(os.path.join(entrada.path, META_FILE)) as f:
+                        tamaño = json.load(f).get("bytes", 0)
+                    entradas.append((entrada.stat().st_mtime, tamaño, entrada.path))
+                except (OSError, ValueError):
+                    continue
+
+        total = sum(tamaño for _, tamaño, _ in entradas)
+        for _, tamaño, ruta in sorted(entradas):
+            if total <= self.max_bytes:
+                break
+            shutil.rmtree(ruta, ignore_errors=True)
+            total -= tamaño
+            logger.info(f"Entrada de caché expulsada: {os.path.basename(ruta)} ({tamaño} bytes)")
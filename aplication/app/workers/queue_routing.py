@@ -0,0 +1,87 @@
+"""
+Clasificación de trabajos de procesamiento y métricas de espera en cola.
+
+Los videos se clasifican por costo estimado (duración efectiva × píxeles del
+original): los clips cortos van a la cola express y el resto a la cola bulk.
+Un worker dedicado a express la vacía primero, mientras los workers generales
+consumen ambas colas por turnos, de modo que bulk no queda sin atender.
+
+Por clase se guardan en Redis las muestras recientes de espera en cola y de
+tiempo hasta procesado para calcular percentiles.
+"""
+import math
+import time
+import logging
+from typing import Optional
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+EXPRESS = "express"
+BULK = "bulk"
+REPROCESS = "reproceso"
+
+METRICS = ("espera", "procesado")
+
+
+def job_cost(duracion: float, resolucion: str) -> int:
+    """Segundos que realmente se procesan por píxeles por cuadro"""
+    try:
+        ancho, alto = (int(valor) for valor in resolucion.lower().split("x"))
+    except (AttributeError, ValueError):
+        ancho, alto = (int(valor) for valor in settings.TARGET_RESOLUTION.split("x"))
+    return int(min(duracion or settings.TARGET_DURATION, settings.TARGET_DURATION) * ancho * alto)
+
+def classify_job(duracion: float, resolucion: str) -> tuple:
+    """Retorna (clase, cola) para un video según su costo estimado"""
+    if job_cost(duracion, resolucion) <= settings.EXPRESS_MAX_COST:
+        return EXPRESS, settings.VIDEO_EXPRESS_QUEUE
+    return BULK, settings.VIDEO_BULK_QUEUE
+
+def queue_for_class(clase: str) -> str:
+    return {
+        EXPRESS: settings.VIDEO_EXPRESS_QUEUE,
+        BULK: settings.VIDEO_BULK_QUEUE,
+        REPROCESS: settings.REPROCESS_QUEUE,
+    }[clase]
+
+def metric_key(clase: str, metrica: str) -> str:
+    return f"metricas:cola:{clase}:{metrica}"
+
+def record_queue_metric(redis_client, clase: Optional[str], metrica: str, segundos: float):
+    """Guarda una muestra conservando solo las más recientes. Un fallo no afecta la tarea"""
+    if not clase:
+        return
+    try:
+        clave = metric_key(clase, metrica)
+        pipe = redis_client.pipeline()
+        pipe.lpush(clave, round(max(segundos, 0.0), 3))
+        pipe.ltrim(clave, 0, settings.QUEUE_METRICS_SAMPLES - 1)
+        pipe.execute()
+    except Exception as e:
+        logger.warning(f"No se pudo registrar la métrica {metrica} de la clase {clase}: {e}")
+
+def elapsed_since(encolado_en: Optional[float]) -> Optional[float]:
+    return time.time() - encolado_en if encolado_en else None
+
+def percentile(valores: list, p: float) -> Optional[float]:
+    """Percentil por rango más cercano"""
+    if not valores:
+        return None
+    ordenados = sorted(valores)
+    return ordenados[max(math.ceil(p / 100 * len(ordenados)) - 1, 0)]
+
+def queue_metrics_summary(redis_client) -> list:
+    """Pendientes y percentiles de espera y de tiempo hasta procesado por clase"""
+    resumen = []
+    for clase in (EXPRESS, BULK, REPROCESS):
+        fila = {"clase": clase, "cola": queue_for_class(clase),
+                "pendientes": redis_client.llen(queue_for_class(clase))}
+        for metrica in METRICS:
+            valores = [float(v) for v in redis_client.lrange(metric_key(clase, metrica), 0, -1)]
+            fila[f"{metrica}_muestras"] = len(valores)
+            fila[f"{metrica}_p50"] = percentile(valores, 50)
+            fila[f"{metrica}_p95"] = percentile(valores, 95)
+        resumen.append(fila)
+    return resumen
@@ -67,4 +67,33 @@ async def _update_rankings_async():
         # ✅ AHORA SÍ PODEMOS USAR AWAIT
         await ranking_service.update_rankings()
     
-    return {"message": "Rankings actualizados asíncronamente"}
\ No newline at end of file
+    return {"message": "Rankings actualizados asíncronamente"}
+
+@celery_app.task
+def prune_ranking_snapshots_task():
+    """Tarea periódica: elimina los snapshots de ranking ya reemplazados"""
+    try:
+        eliminadas = asyncio.run(_prune_ranking_snapshots_async())
+        if eliminadas:
+            logger.info(f"🧹 {eliminadas} filas de snapshots de ranking eliminadas")
+        return {"deleted_rows": eliminadas, "status": "completed"}
+    except Exception as e:
+        logger.error(f"Error eliminando snapshots de ranking: {str(e)}")
+        return {"error": str(e), "status": "failed"}
+
+async def _prune_ranking_snapshots_async():
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from sqlalchemy.ext.asyncio import AsyncSession
+    from sqlalchemy.orm import sessionmaker
+    from app.config.settings import settings
+    from app.services.ranking_service import RankingService
+
+    async_engine = create_async_engine(settings.DATABASE_URL)
+    AsyncSessionLocal = sessionmaker(
+        async_engine, class_=AsyncSession, expire_on_commit=False
+    )
+    try:
+        async with AsyncSessionLocal() as session:
+            return await RankingService(session).prune_snapshots()
+    finally:
+        await async_engine.dispose()
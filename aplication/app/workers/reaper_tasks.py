@@ -0,0 +1,172 @@
+"""
+Recuperación de videos atascados.
+
+Un video queda en "subido" si su tarea se perdió antes de que un worker la
+tomara, y en "procesando" si el worker murió (p. ej. SIGKILL al superar
+``task_time_limit``). La tarea periódica busca ambos casos con índices
+(estado, fecha) y los reencola por la outbox, o los marca como error cuando
+ya se reencolaron demasiadas veces.
+
+Un video "subido" también puede estar simplemente esperando en una cola
+larga: solo se da por perdido cuando su última tarea enviada ya no está en
+la cola ni entregada sin confirmar, y el backend de resultados no la registra
+en curso. Con la cola por encima de ``STUCK_MAX_BACKLOG`` no se revisa.
+"""
+import time
+import logging
+from datetime import datetime, timedelta
+from sqlalchemy import select, exists, and_, or_
+from sqlalchemy.orm import aliased
+
+from app.workers.celery_app import celery_app
+from app.workers.video_tasks import SyncSessionLocal, worker_redis, process_video_task
+from app.workers.outbox import outbox_entry, dispatch_pending_sync
+from app.workers.locks import lease_key
+from app.workers.queue_routing import classify_job, REPROCESS
+from app.config.settings import settings
+from app.schemas.video import Video
+from app.schemas.procesamiento_video import ProcesamientoVideo
+from app.schemas.tarea_pendiente import TareaPendiente
+
+logger = logging.getLogger(__name__)
+
+# Estados del backend de resultados de una tarea que un worker ya tomó
+ACTIVE_STATES = ("RECEIVED", "STARTED", "RETRY")
+UNACKED_KEY = "unacked"  # Hash del transporte Redis con los mensajes entregados sin confirmar
+
+
+def _requeue_or_fail(session, video: Video, procesamiento: ProcesamientoVideo) -> str:
+    """Reencola el video por la outbox o lo da por fallido. Retorna la acción tomada"""
+    reprocesamiento = video.estado == "procesado"
+    reencolados = (procesamiento.parametros or {}).get("reencolados", 0)
+
+    if reencolados >= settings.STUCK_MAX_REQUEUES:
+        procesamiento.estado = "fallado"
+        procesamiento.fecha_fin = datetime.utcnow()
+        procesamiento.error_message = f"Procesamiento abandonado tras {reencolados} reencolados"
+        if not reprocesamiento:
+            video.estado = "error"
+        return "fallado"
+
+    if reprocesamiento:
+        clase, cola = REPROCESS, settings.REPROCESS_QUEUE
+    else:
+        clase, cola = classify_job(video.duracion_original, video.resolucion_original)
+        # Vuelve a "subido" para que, si se pierde otra vez, lo encuentre la regla de subidos
+        video.estado = "subido"
+
+    entrada = outbox_entry(
+        process_video_task.name, cola, [video.id],
+        {"reprocesamiento": reprocesamiento, "clase": clase, "encolado_en": time.time()},
+        video_id=video.id
+    )
+    session.add(entrada)
+    procesamiento.tarea_id = entrada.id
+    procesamiento.estado = "pendiente"
+    procesamiento.parametros = {**(procesamiento.parametros or {}), "reencolados": reencolados + 1}
+    return "reencolado"
+
+def _task_state(task_id: str) -> str:
+    return celery_app.AsyncResult(task_id).state
+
+def queued_messages(redis_client, cola: str) -> list:
+    """Mensajes en la cola y entregados sin confirmar (acks_late)"""
+    return redis_client.lrange(cola, 0, -1) + redis_client.hvals(UNACKED_KEY)
+
+def task_in_queue(mensajes: list, task_id: str) -> bool:
+    marca = task_id.encode()
+    return any(marca in (m if isinstance(m, bytes) else m.encode()) for m in mensajes)
+
+def _lost_upload(redis_client, video: Video, procesamiento: ProcesamientoVideo, tarea, colas: dict) -> bool:
+    """
+    Si la tarea de un video "subido" se perdió. ``tarea`` es su fila de la
+    outbox (None si ya se depuró); ``colas`` cachea los mensajes de cada cola
+    durante la ejecución.
+    """
+    cola = tarea.cola if tarea else classify_job(video.duracion_original, video.resolucion_original)[1]
+    if cola not in colas:
+        pendientes = redis_client.llen(cola)
+        # Con la cola saturada la espera larga es normal; reencolar solo la alarga
+        colas[cola] = None if pendientes > settings.STUCK_MAX_BACKLOG else queued_messages(redis_client, cola)
+    if colas[cola] is None:
+        return False
+
+    if not procesamiento.tarea_id:
+        return True
+    if _task_state(procesamiento.tarea_id) in ACTIVE_STATES:
+        return False
+    return not task_in_queue(colas[cola], procesamiento.tarea_id)
+
+def reap_stuck_videos_sync() -> dict:
+    """Revisa un lote de cada caso - SÍNCRONO"""
+    ahora = datetime.utcnow()
+    acciones = {"reencolado": 0, "fallado": 0, "en_cola": 0}
+
+    with SyncSessionLocal() as session:
+        # Subidos cuya última tarea se envió hace tiempo (usa idx_video_estado_fecha_subida).
+        # tarea_id debe ser la última tarea del video: otra fila sin enviar o reciente lo excluye
+        limite_subido = ahora - timedelta(seconds=settings.STUCK_UPLOADED_AFTER)
+        otra = aliased(TareaPendiente)
+        otro_encolado = exists().where(and_(
+            otra.video_id == Video.id,
+            otra.id != ProcesamientoVideo.tarea_id,
+            or_(otra.fecha_envio.is_(None), otra.fecha_creacion > limite_subido)
+        ))
+        subidos = session.execute(
+            select(Video, ProcesamientoVideo, TareaPendiente)
+            .join(ProcesamientoVideo, ProcesamientoVideo.video_id == Video.id)
+            .outerjoin(TareaPendiente, TareaPendiente.id == ProcesamientoVideo.tarea_id)
+            .where(
+                Video.estado == "subido",
+                Video.fecha_subida < limite_subido,
+                or_(TareaPendiente.id.is_(None), TareaPendiente.fecha_envio < limite_subido),
+                ~otro_encolado
+            )
+            .order_by(Video.fecha_subida)
+            .limit(settings.STUCK_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        ).all()
+
+        # En curso desde hace demasiado (usa idx_procesamiento_estado_inicio)
+        limite_procesando = ahora - timedelta(seconds=settings.STUCK_PROCESSING_AFTER)
+        procesando = session.execute(
+            select(Video, ProcesamientoVideo)
+            .select_from(ProcesamientoVideo)
+            .join(Video, Video.id == ProcesamientoVideo.video_id)
+            .where(ProcesamientoVideo.estado == "procesando", ProcesamientoVideo.fecha_inicio < limite_procesando)
+            .order_by(ProcesamientoVideo.fecha_inicio)
+            .limit(settings.STUCK_BATCH_SIZE)
+            .with_for_update(skip_locked=True)
+        ).all()
+
+        colas = {}
+        for video, procesamiento, tarea in subidos:
+            # Enviada hace tiempo pero aún esperando en la cola: no está atascado
+            if not _lost_upload(worker_redis, video, procesamiento, tarea, colas):
+                acciones["en_cola"] += 1
+                continue
+            acciones[_requeue_or_fail(session, video, procesamiento)] += 1
+
+        for video, procesamiento in procesando:
+            # Con concesión activa un worker sigue trabajando en él
+            if worker_redis.exists(lease_key(video.id)):
+                continue
+            acciones[_requeue_or_fail(session, video, procesamiento)] += 1
+
+        session.commit()
+
+    if acciones["reencolado"]:
+        dispatch_pending_sync()
+    return acciones
+
+@celery_app.task
+def reap_stuck_videos_task():
+    """Tarea periódica: reencola o da por fallidos los videos atascados"""
+    try:
+        acciones = reap_stuck_videos_sync()
+        if acciones["reencolado"] or acciones["fallado"]:
+            logger.warning(f"🧹 Videos atascados: {acciones['reencolado']} reencolados, {acciones['fallado']} fallidos")
+        return {**acciones, "status": "completed"}
+    except Exception as e:
+        logger.error(f"Error revisando videos atascados: {str(e)}")
+        return {"error": str(e), "status": "failed"}
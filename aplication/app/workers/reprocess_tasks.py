@@ -0,0 +1,131 @@
+import uuid
+import time
+import logging
+import redis
+from datetime import datetime
+from sqlalchemy import select, or_, and_
+
+from app.workers.celery_app import celery_app
+from app.workers.video_tasks import SyncSessionLocal, process_video_task
+from app.config.settings import settings
+from app.core.processing_params import current_processing_params
+from app.workers.queue_routing import REPROCESS
+from app.schemas.video import Video
+from app.schemas.procesamiento_video import ProcesamientoVideo
+
+logger = logging.getLogger(__name__)
+
+# Colas de los procesamientos nuevos; el reprocesamiento cede si tienen trabajo acumulado
+PRIMARY_QUEUES = (settings.VIDEO_EXPRESS_QUEUE, settings.VIDEO_BULK_QUEUE)
+
+JOB_TTL = 7 * 24 * 3600
+
+
+def reprocess_job_key(job_id: str) -> str:
+    return f"reprocesamiento:{job_id}"
+
+def outdated_conditions(version: str) -> list:
+    """Condiciones de un video publicado cuya salida es de otra versión de parámetros"""
+    return [
+        Video.estado == "procesado",
+        ProcesamientoVideo.estado.in_(["completado", "fallado"]),
+        or_(
+            ProcesamientoVideo.version_parametros.is_(None),
+            ProcesamientoVideo.version_parametros != version
+        )
+    ]
+
+def find_outdated_videos_sync(version: str, cursor: str, limit: int) -> list:
+    """Siguiente lote de videos desactualizados, paginando por id (keyset) - SÍNCRONO"""
+    with SyncSessionLocal() as session:
+        rows = session.execute(
+            select(ProcesamientoVideo.video_id)
+            .join(Video, Video.id == ProcesamientoVideo.video_id)
+            .where(and_(*outdated_conditions(version), ProcesamientoVideo.video_id > cursor))
+            .order_by(ProcesamientoVideo.video_id)
+            .limit(limit)
+        ).scalars().all()
+        return list(rows)
+
+def reset_procesamiento_sync(video_id: str, tarea_id: str, parametros: dict):
+    """Deja el procesamiento listo para empezar de cero con los parámetros vigentes - SÍNCRONO"""
+    with SyncSessionLocal() as session:
+        procesamiento = session.execute(
+            select(ProcesamientoVideo).where(ProcesamientoVideo.video_id == video_id)
+        ).scalar_one_or_none()
+        if procesamiento is None:
+            return False
+        previos = {clave: valor for clave, valor in (procesamiento.parametros or {}).items()
+                   if clave != "deduplicado_de"}
+        procesamiento.parametros = {**previos, **parametros}
+        procesamiento.tarea_id = tarea_id
+        procesamiento.estado = "pendiente"
+        procesamiento.intentos = 0
+        procesamiento.error_message = None
+        procesamiento.fecha_inicio = None
+        procesamiento.fecha_fin = None
+        # Los checkpoints de la salida anterior no sirven para la nueva
+        procesamiento.etapas = {}
+        session.commit()
+        return True
+
+def _redis():
+    return redis.Redis.from_url(settings.REDIS_URL, decode_responses=True)
+
+def _schedule_next(job_id: str, cursor: str):
+    reprocess_outdated_task.apply_async(args=[job_id, cursor], countdown=settings.REPROCESS_BATCH_INTERVAL)
+
+@celery_app.task(bind=True)
+def reprocess_outdated_task(self, job_id: str, cursor: str = ""):
+    """
+    Encola un lote de videos con salida desactualizada en la cola de
+    reprocesamiento y se reprograma para el siguiente. Si hay subidas nuevas
+    acumuladas o el lote anterior no se ha consumido, el lote espera.
+    """
+    redis_client = _redis()
+    clave = reprocess_job_key(job_id)
+    trabajo = redis_client.hgetall(clave)
+    if not trabajo or trabajo.get("estado") == "cancelado":
+        logger.info(f"Reprocesamiento {job_id} cancelado o expirado")
+        return {"job_id": job_id, "status": "stopped"}
+
+    pendientes_nuevos = sum(redis_client.llen(cola) for cola in PRIMARY_QUEUES)
+    pendientes_reproceso = redis_client.llen(settings.REPROCESS_QUEUE)
+    if pendientes_nuevos > settings.REPROCESS_MAX_BACKLOG or pendientes_reproceso >= settings.REPROCESS_BATCH_SIZE:
+        redis_client.hset(clave, "estado", "en_espera")
+        _schedule_next(job_id, cursor)
+        return {"job_id": job_id, "status": "waiting"}
+
+    parametros = current_processing_params()
+    if trabajo.get("version") != parametros["version_parametros"]:
+        # Los parámetros cambiaron de nuevo: se recorre todo otra vez hacia la versión más reciente
+        redis_client.hset(clave, "version", parametros["version_parametros"])
+        cursor = ""
+
+    videos = find_outdated_videos_sync(parametros["version_parametros"], cursor, settings.REPROCESS_BATCH_SIZE)
+    if not videos:
+        redis_client.hset(clave, mapping={"estado": "completado", "fecha_fin": datetime.utcnow().isoformat()})
+        logger.info(f"✅ Reprocesamiento {job_id} completado")
+        return {"job_id": job_id, "status": "completed"}
+
+    encolados = 0
+    for video_id in videos:
+        tarea_id = str(uuid.uuid4())
+        if not reset_procesamiento_sync(video_id, tarea_id, parametros):
+            continue
+        process_video_task.apply_async(
+            args=[video_id],
+            kwargs={"reprocesamiento": True, "clase": REPROCESS, "encolado_en": time.time()},
+            queue=settings.REPROCESS_QUEUE, task_id=tarea_id
+        )
+        encolados += 1
+
+    pipe = redis_client.pipeline()
+    pipe.hincrby(clave, "encolados", encolados)
+    pipe.hset(clave, mapping={"estado": "en_curso", "cursor": videos[-1]})
+    pipe.expire(clave, JOB_TTL)
+    pipe.execute()
+
+    logger.info(f"🔁 Reprocesamiento {job_id}: {encolados} videos encolados")
+    _schedule_next(job_id, videos[-1])
+    return {"job_id": job_id, "status": "running", "enqueued": encolados}
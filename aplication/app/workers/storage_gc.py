@@ -0,0 +1,219 @@
+"""
+Recolector de archivos huérfanos del almacenamiento local.
+
+Recorre los directorios de originales, procesados, HLS, sesiones de subida,
+trabajo de ffmpeg y staging con ``os.scandir``, de a un lote por ejecución:
+el cursor (directorio y posición) se guarda en Redis y la siguiente
+ejecución continúa donde quedó la anterior. Saltar hasta la posición solo lee
+entradas de directorio; el ``stat`` y las consultas a BD se hacen únicamente
+para el lote. Las referencias se resuelven con consultas ``IN`` por id de
+video y, para las que quedan sin referencia, por ruta (los videos
+deduplicados comparten archivos).
+
+Un huérfano solo se elimina si no se modificó durante el período de gracia,
+lo que cubre archivos publicados cuya fila aún no se ha confirmado.
+"""
+import os
+import time
+import shutil
+import logging
+from itertools import islice
+from sqlalchemy import select, or_
+
+from app.config.settings import settings
+from app.core.storage_backend import hls_master_key, key_from_reference
+from app.services.upload_service import SESSIONS_PREFIX, session_key
+from app.workers.locks import lease_key
+
+logger = logging.getLogger(__name__)
+
+# Clases de entradas según cómo se decide si siguen vivas
+REFERENCIA = "referencia"  # Archivo referenciado por una columna de Video
+HLS = "hls"                # Directorio cuya playlist maestra referencia Video.archivo_hls
+SESION = "sesion"          # Directorio de una sesión de subida reanudable en Redis
+TRABAJO = "trabajo"        # Directorio de trabajo de un video con concesión activa
+TEMPORAL = "temporal"      # Archivos de staging: solo cuenta la antigüedad
+
+GC_STATE_KEY = "gc:almacenamiento"
+
+
+def gc_targets() -> list:
+    """(nombre, directorio, clase) en el orden en que se recorren"""
+    root = settings.STORAGE_ROOT
+    return [
+        ("originales", os.path.join(root, "uploads/videos/originales"), REFERENCIA),
+        ("procesados", os.path.join(root, "processed/videos"), REFERENCIA),
+        ("hls", os.path.join(root, "processed/hls"), HLS),
+        ("sesiones", os.path.join(root, SESSIONS_PREFIX), SESION),
+        ("trabajo", settings.PROCESSING_WORK_DIR, TRABAJO),
+        ("staging", settings.STORAGE_STAGING_DIR, TEMPORAL),
+    ]
+
+def entry_id(nombre: str) -> str:
+    """Id de video o sesión al inicio del nombre (``{id}.mp4``, ``{id}_final.mp4``, ``{id}/``)"""
+    return nombre.split(".", 1)[0].split("_", 1)[0]
+
+def _tree_size(path: str) -> int:
+    total = 0
+    for raiz, _, archivos in os.walk(path):
+        for archivo in archivos:
+            try:
+                total += os.path.getsize(os.path.join(raiz, archivo))
+            except OSError:
+                continue
+    return total
+
+
+class StorageGarbageCollector:
+    """
+    ``referenced_keys(ids, claves)`` retorna las claves referenciadas en BD,
+    ``active_session(id)`` y ``active_lease(id)`` consultan Redis.
+    """
+
+    def __init__(self, targets: list, root: str, referenced_keys, active_session, active_lease,
+                 grace: int = None, batch_size: int = None, dry_run: bool = None):
+        self.targets = targets
+        self.root = root
+        self.referenced_keys = referenced_keys
+        self.active_session = active_session
+        self.active_lease = active_lease
+        self.grace = settings.GC_GRACE_PERIOD if grace is None else grace
+        self.batch_size = batch_size or settings.GC_BATCH_SIZE
+        self.dry_run = settings.GC_DRY_RUN if dry_run is None else dry_run
+
+    def scan(self, destino: int, posicion: int) -> tuple:
+        """
+        Lee hasta ``batch_size`` entradas desde el cursor.
+        Retorna ([(destino, clase, entrada)], destino, posicion) con el cursor siguiente; al
+        terminar el último directorio vuelve a (0, 0) para la próxima pasada.
+        """
+        entradas = []
+        while destino < len(self.targets) and len(entradas) < self.batch_size:
+            nombre, directorio, clase = self.targets[destino]
+            faltan = self.batch_size - len(entradas)
+            try:
+                with os.scandir(directorio) as it:
+                    lote = list(islice(it, posicion, posicion + faltan))
+            except FileNotFoundError:
+                lote = []
+
+            entradas.extend((destino, clase, entrada) for entrada in lote)
+            if len(lote) < faltan:
+                destino, posicion = destino + 1, 0
+            else:
+                posicion += len(lote)
+
+        if destino >= len(self.targets):
+            destino = 0
+        return entradas, destino, posicion
+
+    def _key(self, path: str) -> str:
+        return os.path.relpath(path, self.root)
+
+    def find_orphans(self, entradas: list) -> list:
+        limite = time.time() - self.grace
+        antiguas = []
+        for destino, clase, entrada in entradas:
+            try:
+                if entrada.stat(follow_symlinks=False).st_mtime < limite:
+                    antiguas.append((destino, clase, entrada))
+            except FileNotFoundError:
+                continue
+
+        # Claves que un video podría referenciar, resueltas en una sola pasada por BD
+        candidatas = {}
+        for _, clase, entrada in antiguas:
+            if clase == REFERENCIA and entrada.is_file(follow_symlinks=False):
+                candidatas[entrada.path] = self._key(entrada.path)
+            elif clase == HLS and entrada.is_dir(follow_symlinks=False):
+                candidatas[entrada.path] = hls_master_key(entrada.name)
+        ids = {entry_id(os.path.basename(path)) for path in candidatas}
+        vivas = self.referenced_keys(ids, set(candidatas.values())) if candidatas else set()
+
+        huerfanas = []
+        for destino, clase, entrada in antiguas:
+            if clase in (REFERENCIA, HLS):
+                huerfana = entrada.path in candidatas and candidatas[entrada.path] not in vivas
+            elif clase == SESION:
+                huerfana = not self.active_session(entrada.name)
+            elif clase == TRABAJO:
+                huerfana = not self.active_lease(entrada.name)
+            else:
+                huerfana = True
+            if huerfana:
+                huerfanas.append((destino, entrada))
+        return huerfanas
+
+    def remove(self, entrada) -> int:
+        """Elimina la entrada y retorna los bytes liberados"""
+        if entrada.is_dir(follow_symlinks=False):
+            tamaño = _tree_size(entrada.path)
+            if not self.dry_run:
+                shutil.rmtree(entrada.path, ignore_errors=True)
+        else:
+            tamaño = entrada.stat(follow_symlinks=False).st_size
+            if not self.dry_run:
+                os.remove(entrada.path)
+        return tamaño
+
+    def run(self, destino: int = 0, posicion: int = 0) -> dict:
+        entradas, siguiente_destino, siguiente_posicion = self.scan(destino, posicion)
+        eliminados = liberados = desplazados = 0
+        for destino_entrada, entrada in self.find_orphans(entradas):
+            try:
+                liberados += self.remove(entrada)
+                eliminados += 1
+                if destino_entrada == siguiente_destino:
+                    desplazados += 1
+                logger.info(f"🗑️ Huérfano {'detectado' if self.dry_run else 'eliminado'}: {entrada.path}")
+            except OSError as e:
+                logger.warning(f"No se pudo eliminar {entrada.path}: {e}")
+
+        # Las entradas eliminadas del directorio en curso ya no ocupan posición
+        if siguiente_posicion and not self.dry_run:
+            siguiente_posicion = max(siguiente_posicion - desplazados, 0)
+
+        return {
+            "scanned": len(entradas),
+            "cleaned_files": eliminados,
+            "bytes_reclaimed": liberados,
+            "destino": siguiente_destino,
+            "posicion": siguiente_posicion,
+            "dry_run": self.dry_run
+        }
+
+
+def referenced_keys_sync(session_factory, ids: set, claves: set) -> set:
+    """
+    Claves del lote referenciadas en BD - SÍNCRONO. Primero por id de video
+    (clave primaria); las que quedan sin referencia se buscan por ruta, porque
+    un video deduplicado puede apuntar a archivos de otro ya eliminado.
+    """
+    from app.schemas.video import Video
+    columnas = (Video.archivo_original, Video.archivo_procesado, Video.archivo_hls,
+                Video.archivo_poster, Video.archivo_sprite, Video.archivo_vtt)
+
+    vivas = set()
+    with session_factory() as session:
+        for row in session.execute(select(*columnas).where(Video.id.in_(list(ids)))).all():
+            vivas.update(key_from_reference(valor) for valor in row if valor)
+
+        sospechosas = claves - vivas
+        if sospechosas:
+            # Las filas antiguas guardan rutas absolutas
+            referencias = list(sospechosas) + [os.path.join(settings.STORAGE_ROOT, clave) for clave in sospechosas]
+            rows = session.execute(
+                select(*columnas).where(or_(*(columna.in_(referencias) for columna in columnas)))
+            ).all()
+            for row in rows:
+                vivas.update(key_from_reference(valor) for valor in row if valor)
+    return vivas & claves
+
+def build_collector(session_factory, redis_client) -> StorageGarbageCollector:
+    return StorageGarbageCollector(
+        targets=gc_targets(),
+        root=settings.STORAGE_ROOT,
+        referenced_keys=lambda ids, claves: referenced_keys_sync(session_factory, ids, claves),
+        active_session=lambda upload_id: bool(redis_client.exists(session_key(upload_id))),
+        active_lease=lambda video_id: bool(redis_client.exists(lease_key(video_id)))
+    )
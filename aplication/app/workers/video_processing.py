@@ -1,9 +1,22 @@
 import os
+import math
+import shutil
+import tempfile
 import subprocess
 import logging
+import time
 import uuid
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from app.config.settings import settings
+from app.core.mp4 import Mp4Error, probe_reader
+from app.workers.output_cache import OutputCache
+from app.core.storage_backend import (
+    get_storage, original_key, processed_key, processed_asset_key, key_from_reference, hls_prefix, hls_master_key
+)
+
 logger = logging.getLogger(__name__)
 
 def get_video_duration(file_path: str) -> int:
@@ -21,114 +34,706 @@ def get_video_duration(file_path: str) -> int:
         logger.error(f"Error obteniendo duración: {e}")
         return 30
 
-def add_logo_simple(input_path: str, output_path: str, logo_path: str) -> bool:
+def parse_progress(estado: dict) -> tuple:
     """
-    Añadir logo de forma SIMPLE - sin filtros complejos
+    Interpreta un bloque de ``-progress`` de ffmpeg.
+    Retorna (segundos_codificados, velocidad_x_tiempo_real o None).
     """
+    # out_time_ms está en microsegundos pese a su nombre; out_time_us en versiones nuevas
+    microsegundos = estado.get('out_time_us') or estado.get('out_time_ms') or '0'
     try:
-        # Logo estático durante todo el video
-        cmd = [
+        segundos = max(int(microsegundos), 0) / 1_000_000
+    except ValueError:
+        segundos = 0.0
+
+    velocidad = estado.get('speed', '').rstrip('x').strip()
+    try:
+        velocidad = float(velocidad)
+    except ValueError:
+        velocidad = None
+    return segundos, velocidad
+
+def run_ffmpeg(cmd: list, progress=None):
+    """
+    Ejecuta ffmpeg. Con ``progress`` se agrega ``-progress pipe:1`` y se llama
+    ``progress(segundos, velocidad)`` por cada bloque reportado.
+    Lanza CalledProcessError con el stderr si ffmpeg falla.
+    """
+    if progress is None:
+        return subprocess.run(cmd, capture_output=True, text=True, check=True)
+
+    cmd = [cmd[0], '-progress', 'pipe:1', '-nostats'] + cmd[1:]
+    # stderr a archivo para que no se llene el pipe mientras se lee stdout
+    with tempfile.TemporaryFile(mode='w+') as stderr:
+        proceso = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=stderr, text=True)
+        estado = {}
+        try:
+            for linea in proceso.stdout:
+                clave, _, valor = linea.strip().partition('=')
+                estado[clave] = valor
+                if clave == 'progress':
+                    try:
+                        progress(*parse_progress(estado))
+                    except Exception as e:
+                        # Un fallo al reportar progreso (p. ej. Redis) no aborta la codificación
+                        logger.warning(f"No se pudo reportar el progreso de ffmpeg: {e}")
+                    estado = {}
+        except BaseException:
+            # SoftTimeLimitExceeded u otra interrupción: no dejar ffmpeg huérfano
+            proceso.kill()
+            proceso.wait()
+            raise
+        codigo = proceso.wait()
+        if codigo:
+            stderr.seek(0)
+            raise subprocess.CalledProcessError(codigo, cmd, stderr=stderr.read())
+
+class ProgressReporter:
+    """
+    Traduce el progreso de ffmpeg a estados de la tarea Celery, con a lo sumo
+    una actualización por ``intervalo`` segundos. Conserva la última velocidad
+    como métrica de throughput del worker.
+    """
+
+    def __init__(self, task_callback, duracion: float, inicio: int = 30, fin: int = 80,
+                 intervalo: float = 1.0):
+        self.task_callback = task_callback
+        self.duracion = max(duracion or settings.TARGET_DURATION, 0.001)
+        self.inicio = inicio
+        self.fin = fin
+        self.intervalo = intervalo
+        self.velocidad = None
+        self._ultimo = 0.0
+        self._lock = threading.Lock()
+
+    def __call__(self, segundos: float, velocidad: float = None):
+        with self._lock:
+            if velocidad:
+                self.velocidad = velocidad
+            ahora = time.monotonic()
+            if ahora - self._ultimo < self.intervalo:
+                return
+            self._ultimo = ahora
+
+        fraccion = min(segundos / self.duracion, 1.0)
+        eta = (self.duracion - segundos) / self.velocidad if self.velocidad else None
+        self.task_callback(state='PROGRESS', meta={
+            'current': int(self.inicio + (self.fin - self.inicio) * fraccion),
+            'total': 100,
+            'status': 'Codificando video',
+            'speed': self.velocidad,
+            'eta': round(max(eta, 0), 1) if eta is not None else None
+        })
+
+def _target_size():
+    ancho, alto = settings.TARGET_RESOLUTION.lower().split('x')
+    return int(ancho), int(alto)
+
+def sprite_grid() -> tuple:
+    """Columnas y filas del sprite para cubrir TARGET_DURATION"""
+    miniaturas = math.ceil(settings.TARGET_DURATION / settings.SPRITE_INTERVAL)
+    columnas = min(settings.SPRITE_COLUMNS, miniaturas)
+    return columnas, math.ceil(miniaturas / columnas)
+
+def thumbnail_paths(thumbnails_dir: str) -> dict:
+    formato = settings.THUMBNAIL_FORMAT
+    return {
+        'poster': os.path.join(thumbnails_dir, f"poster.{formato}"),
+        'sprite': os.path.join(thumbnails_dir, f"sprite.{formato}"),
+        'vtt': os.path.join(thumbnails_dir, "sprite.vtt"),
+    }
+
+def _with_thumbnails(cadena: str, thumbnails_dir: str = None, principal: bool = True) -> tuple:
+    """
+    Completa el grafo principal (``cadena``, sin etiqueta de salida) con una
+    rama de póster y sprite alimentada por los mismos cuadros decodificados.
+    Con ``principal=False`` solo se generan las imágenes.
+    Retorna (grafo, argumentos de las salidas de imagen).
+    """
+    if not thumbnails_dir:
+        return f"{cadena}[out]", []
+
+    columnas, filas = sprite_grid()
+    ancho, alto = (int(v) for v in settings.SPRITE_THUMBNAIL_SIZE.split('x'))
+    rutas = thumbnail_paths(thumbnails_dir)
+    grafo = (
+        f"{cadena},{'split=3[out][p][s]' if principal else 'split=2[p][s]'};"
+        f"[p]thumbnail=50[poster];"
+        f"[s]fps=1/{settings.SPRITE_INTERVAL},scale={ancho}:{alto},tile={columnas}x{filas}[sprite]"
+    )
+    salidas = [
+        '-map', '[poster]', '-frames:v', '1', '-y', rutas['poster'],
+        '-map', '[sprite]', '-frames:v', '1', '-y', rutas['sprite'],
+    ]
+    return grafo, salidas
+
+def build_sprite_vtt(duracion: float, sprite_url: str) -> str:
+    """Índice WebVTT que asigna a cada intervalo su recorte del sprite (``#xywh``)"""
+    columnas, filas = sprite_grid()
+    ancho, alto = (int(v) for v in settings.SPRITE_THUMBNAIL_SIZE.split('x'))
+    intervalo = settings.SPRITE_INTERVAL
+
+    def marca(segundos: float) -> str:
+        horas, resto = divmod(segundos, 3600)
+        minutos, segundos = divmod(resto, 60)
+        return f"{int(horas):02d}:{int(minutos):02d}:{segundos:06.3f}"
+
+    lineas = ["WEBVTT", ""]
+    total = min(math.ceil(max(duracion, intervalo) / intervalo), columnas * filas)
+    for i in range(total):
+        inicio, fin = i * intervalo, min((i + 1) * intervalo, max(duracion, intervalo))
+        x, y = (i % columnas) * ancho, (i // columnas) * alto
+        lineas += [f"{marca(inicio)} --> {marca(fin)}", f"{sprite_url}#xywh={x},{y},{ancho},{alto}", ""]
+    return "\n".join(lineas)
+
+def build_thumbnails_command(input_path: str, thumbnails_dir: str) -> list:
+    """Póster y sprite desde un video ya procesado (caminos sin decodificación propia)"""
+    grafo, salidas = _with_thumbnails("[0:v]null", thumbnails_dir, principal=False)
+    return ['ffmpeg', '-t', str(settings.TARGET_DURATION), '-i', input_path, '-filter_complex', grafo] + salidas
+
+def build_transcode_command(input_path: str, output_path: str, logo_path: str = None,
+                            threads: int = None, thumbnails_dir: str = None) -> list:
+    """
+    Comando ffmpeg de una sola pasada: recorte, escalado con relleno
+    (conservando la relación de aspecto) y logo, con una única codificación.
+    Con ``thumbnails_dir`` también escribe póster y sprite desde los mismos cuadros.
+    """
+    ancho, alto = _target_size()
+    escala = (
+        f"scale={ancho}:{alto}:force_original_aspect_ratio=decrease,"
+        f"pad={ancho}:{alto}:(ow-iw)/2:(oh-ih)/2,setsar=1"
+    )
+
+    # El recorte se aplica a la entrada para que todas las salidas compartan los 30 segundos
+    cmd = ['ffmpeg', '-t', str(settings.TARGET_DURATION), '-i', input_path]
+    salidas_imagen = []
+    if logo_path:
+        cadena = f"[0:v]{escala}[base];[base][1:v]overlay=10:10"  # Logo estático en esquina
+        grafo, salidas_imagen = _with_thumbnails(cadena, thumbnails_dir)
+        cmd += ['-i', logo_path, '-filter_complex', grafo, '-map', '[out]']
+    elif thumbnails_dir:
+        grafo, salidas_imagen = _with_thumbnails(f"[0:v]{escala}", thumbnails_dir)
+        cmd += ['-filter_complex', grafo, '-map', '[out]']
+    else:
+        cmd += ['-vf', escala]
+
+    cmd += [
+        '-an',                   # Quitar audio
+        '-c:v', 'libx264',
+        '-preset', 'medium',
+        '-crf', '23',
+        '-pix_fmt', settings.TARGET_PIX_FMT,  # Normaliza fuentes de 10 bits o 4:2:2/4:4:4
+        '-profile:v', 'high',
+        '-fps_mode', 'cfr',      # Cadencia constante aunque la fuente sea variable
+        '-movflags', '+faststart',  # moov al inicio: la reproducción empieza sin leer el final
+    ]
+    if threads:
+        cmd += ['-threads', str(threads)]
+    cmd += ['-y', output_path] + salidas_imagen
+    return cmd
+
+def transcode_video(input_path: str, output_path: str, logo_path: str = None, progress=None,
+                    thumbnails_dir: str = None) -> bool:
+    """
+    Ejecuta la transcodificación. Si falla la superposición del logo, repite
+    sin logo. Retorna si el logo quedó incluido.
+    """
+    if logo_path:
+        try:
+            run_ffmpeg(build_transcode_command(input_path, output_path, logo_path, thumbnails_dir=thumbnails_dir), progress)
+            logger.info("✅ Video recortado, escalado y con logo")
+            return True
+        except subprocess.CalledProcessError as e:
+            logger.error(f"Error añadiendo logo: {e.stderr}")
+            logger.warning("Usando video sin logo debido a error")
+
+    run_ffmpeg(build_transcode_command(input_path, output_path, thumbnails_dir=thumbnails_dir), progress)
+    logger.info("✅ Video recortado y escalado sin logo")
+    return False
+
+def parallel_segment_count() -> int:
+    return settings.PARALLEL_SEGMENTS or os.cpu_count() or 1
+
+def transcode_video_parallel(input_path: str, output_path: str, logo_path: str = None,
+                             work_dir: str = None, duracion: float = None, segmentos: int = None,
+                             progress=None) -> bool:
+    """
+    Transcodificación por segmentos en paralelo.
+
+    Corta el original recortado en keyframes (copia, sin recodificar), codifica
+    cada segmento con el mismo comando que el modo serial y los une con el
+    demuxer concat sin pérdida. Cada segmento es un proceso ffmpeg propio, de
+    modo que el pool de hilos solo los coordina (los workers prefork de Celery
+    no pueden crear procesos hijos de multiprocessing).
+    Lanza CalledProcessError si falla algún paso; retorna si se aplicó el logo.
+    """
+    segmentos = segmentos or parallel_segment_count()
+    duracion = min(duracion or settings.TARGET_DURATION, settings.TARGET_DURATION)
+    segment_dir = tempfile.mkdtemp(prefix="segmentos_", dir=work_dir or os.path.dirname(output_path))
+
+    try:
+        # 1. Dividir en keyframes: el segmenter corta en el primer keyframe tras cada límite
+        subprocess.run([
             'ffmpeg',
             '-i', input_path,
-            '-i', logo_path,
-            '-filter_complex', 'overlay=10:10',  # Logo estático en esquina
-            '-an',  # Sin audio
-            '-c:v', 'libx264',
-            '-preset', 'medium',
-            '-crf', '23',
+            '-map', '0:v:0',
+            '-t', str(settings.TARGET_DURATION),
+            '-c:v', 'copy',
+            '-an',
+            '-f', 'segment',
+            '-segment_time', f"{max(duracion / segmentos, 1):.3f}",
+            '-reset_timestamps', '1',
+            '-y',
+            os.path.join(segment_dir, 'entrada_%03d.mp4')
+        ], capture_output=True, text=True, check=True)
+
+        entradas = sorted(f for f in os.listdir(segment_dir) if f.startswith('entrada_'))
+        if not entradas:
+            raise RuntimeError("No se generaron segmentos")
+
+        # 2. Codificar los segmentos concurrentemente, repartiendo los núcleos
+        hilos = max(1, (os.cpu_count() or 1) // len(entradas))
+
+        # El progreso total es la suma de lo codificado en cada segmento
+        codificado, velocidades = {}, {}
+
+        def codificar(nombre: str) -> str:
+            salida = os.path.join(segment_dir, nombre.replace('entrada_', 'salida_'))
+
+            def progreso_segmento(segundos, velocidad):
+                codificado[nombre] = segundos
+                velocidades[nombre] = velocidad or 0
+                progress(sum(codificado.values()), sum(velocidades.values()) or None)
+
+            run_ffmpeg(
+                build_transcode_command(os.path.join(segment_dir, nombre), salida, logo_path, threads=hilos),
+                progreso_segmento if progress else None
+            )
+            velocidades.pop(nombre, None)
+            return salida
+
+        with ThreadPoolExecutor(max_workers=min(segmentos, len(entradas))) as pool:
+            salidas = list(pool.map(codificar, entradas))
+
+        # 3. Unir sin recodificar
+        lista_path = os.path.join(segment_dir, 'segmentos.txt')
+        with open(lista_path, 'w') as lista:
+            for salida in salidas:
+                lista.write(f"file '{salida}'\n")
+
+        subprocess.run([
+            'ffmpeg',
+            '-f', 'concat',
+            '-safe', '0',
+            '-i', lista_path,
+            '-c', 'copy',
+            '-movflags', '+faststart',
             '-y',
             output_path
+        ], capture_output=True, text=True, check=True)
+
+        logger.info(f"✅ Video transcodificado en {len(salidas)} segmentos paralelos")
+        return logo_path is not None
+    finally:
+        shutil.rmtree(segment_dir, ignore_errors=True)
+
+def select_processing_route(mp4_info: dict, logo_path: str = None) -> str:
+    """
+    Elige cómo producir la salida a partir de los metadatos del original:
+    - ``remux``: ya cumple la especificación; se copia el stream sin logo
+    - ``overlay_rapido``: ya cumple la especificación; solo se superpone el logo
+    - ``transcode``: recorte, escalado y logo con la codificación completa
+
+    Cumplir exige además lo que normaliza la transcodificación: 8 bits 4:2:0,
+    un perfil H.264 compatible, píxeles cuadrados y cadencia constante.
+    """
+    cumple = (
+        mp4_info is not None
+        and mp4_info.get("codec") in settings.TARGET_CODECS
+        and mp4_info.get("resolucion") == settings.TARGET_RESOLUTION
+        and mp4_info.get("duracion", 0) <= settings.TARGET_DURATION
+        and mp4_info.get("pix_fmt") == settings.TARGET_PIX_FMT
+        and mp4_info.get("perfil") in settings.TARGET_H264_PROFILES
+        and mp4_info.get("sar", "1:1") == "1:1"
+        and not mp4_info.get("fps_variable")
+    )
+    if not cumple:
+        return "transcode"
+    if logo_path and settings.FAST_PATH_LOGO_OVERLAY:
+        return "overlay_rapido"
+    return "remux"
+
+def build_remux_command(input_path: str, output_path: str) -> list:
+    """Copia el video sin recodificar: corte en keyframe, sin audio y moov al inicio"""
+    return [
+        'ffmpeg',
+        '-i', input_path,
+        '-map', '0:v:0',
+        '-t', str(settings.TARGET_DURATION),
+        '-c:v', 'copy',
+        '-an',
+        '-movflags', '+faststart',
+        '-y',
+        output_path
+    ]
+
+def build_fast_overlay_command(input_path: str, output_path: str, logo_path: str,
+                               thumbnails_dir: str = None) -> list:
+    """Superpone el logo sin escalar, con un preset de codificación rápido"""
+    grafo, salidas_imagen = _with_thumbnails('[0:v][1:v]overlay=10:10', thumbnails_dir)
+    return [
+        'ffmpeg',
+        '-t', str(settings.TARGET_DURATION),
+        '-i', input_path,
+        '-i', logo_path,
+        '-filter_complex', grafo,
+        '-map', '[out]',
+        '-an',
+        '-c:v', 'libx264',
+        '-preset', 'veryfast',
+        '-crf', '23',
+        '-pix_fmt', settings.TARGET_PIX_FMT,
+        '-movflags', '+faststart',
+        '-y',
+        output_path
+    ] + salidas_imagen
+
+def probe_original(storage, input_key: str):
+    """Metadatos del original leyendo solo sus cajas de metadatos por rango (None si no se pueden leer)"""
+    def read_at(offset: int, length: int) -> bytes:
+        return b"".join(storage.open_range(input_key, offset, offset + length - 1))
+
+    try:
+        return probe_reader(read_at, storage.size(input_key))
+    except Mp4Error as e:
+        logger.warning(f"No se pudo inspeccionar el original, se usa transcodificación completa: {e}")
+        return None
+
+def produce_output(input_path: str, output_path: str, mp4_info: dict = None, logo_path: str = None,
+                   task_callback=None, thumbnails_dir: str = None) -> tuple:
+    """
+    Produce la salida por el camino más barato posible. Los caminos que
+    decodifican el video escriben además póster y sprite en ``thumbnails_dir``.
+    Retorna (ruta_procesamiento, logo_aplicado, velocidad_codificacion).
+    """
+    duracion = min(mp4_info["duracion"], settings.TARGET_DURATION) if mp4_info else settings.TARGET_DURATION
+    reporter = ProgressReporter(task_callback, duracion) if task_callback else None
+
+    ruta = select_processing_route(mp4_info, logo_path)
+    try:
+        if ruta == "remux":
+            run_ffmpeg(build_remux_command(input_path, output_path), reporter)
+            logger.info("✅ Video remuxado sin recodificar")
+            return ruta, False, _velocidad(reporter)
+        if ruta == "overlay_rapido":
+            run_ffmpeg(build_fast_overlay_command(input_path, output_path, logo_path, thumbnails_dir), reporter)
+            logger.info("✅ Logo añadido sin reescalar")
+            return ruta, True, _velocidad(reporter)
+    except subprocess.CalledProcessError as e:
+        logger.warning(f"Falló el camino rápido ({ruta}), se usa transcodificación completa: {e.stderr}")
+
+    if settings.PARALLEL_ENCODING and parallel_segment_count() > 1:
+        try:
+            logo_aplicado = transcode_video_parallel(
+                input_path, output_path, logo_path, os.path.dirname(output_path), duracion, progress=reporter
+            )
+            return "transcode_paralelo", logo_aplicado, _velocidad(reporter)
+        except (subprocess.CalledProcessError, RuntimeError) as e:
+            logger.warning(f"Falló la transcodificación paralela, se usa el modo serial: {getattr(e, 'stderr', e)}")
+
+    logo_aplicado = transcode_video(input_path, output_path, logo_path, reporter, thumbnails_dir)
+    return "transcode", logo_aplicado, _velocidad(reporter)
+
+def _velocidad(reporter):
+    return reporter.velocidad if reporter else None
+
+def parse_renditions(renditions: list = None) -> list:
+    """Convierte ``"1280x720:2800k"`` en (ancho, alto, kbps)"""
+    resultado = []
+    for rendition in renditions or settings.HLS_RENDITIONS:
+        tamaño, _, bitrate = rendition.partition(':')
+        ancho, alto = tamaño.lower().split('x')
+        resultado.append((int(ancho), int(alto), int(bitrate.lower().rstrip('k'))))
+    return resultado
+
+def build_hls_command(input_path: str, output_dir: str, renditions: list = None) -> list:
+    """
+    Escalera HLS en una sola invocación: el video se decodifica una vez y el
+    filtro split alimenta cada rendición. Los keyframes se fuerzan en los
+    mismos instantes para que los segmentos queden alineados entre rendiciones.
+    """
+    renditions = parse_renditions(renditions)
+    segundos = settings.HLS_SEGMENT_DURATION
+    n = len(renditions)
+
+    grafo = f"[0:v]split={n}" + "".join(f"[s{i}]" for i in range(n)) + ";" + ";".join(
+        f"[s{i}]scale={ancho}:{alto}:force_original_aspect_ratio=decrease,"
+        f"pad=ceil(iw/2)*2:ceil(ih/2)*2,setsar=1[v{i}]"
+        for i, (ancho, alto, _) in enumerate(renditions)
+    )
+
+    cmd = ['ffmpeg', '-i', input_path, '-filter_complex', grafo]
+    for i, (_, _, kbps) in enumerate(renditions):
+        cmd += [
+            '-map', f'[v{i}]',
+            f'-c:v:{i}', 'libx264',
+            f'-b:v:{i}', f'{kbps}k',
+            f'-maxrate:v:{i}', f'{kbps}k',
+            f'-bufsize:v:{i}', f'{kbps * 2}k',
         ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, check=True)
-        logger.info("✅ Logo añadido exitosamente")
+    cmd += [
+        '-preset', 'medium',
+        '-force_key_frames', f'expr:gte(t,n_forced*{segundos})',
+        '-sc_threshold', '0',
+        '-t', str(settings.TARGET_DURATION),
+        '-an',
+        '-f', 'hls',
+        '-hls_time', str(segundos),
+        '-hls_playlist_type', 'vod',
+        '-hls_flags', 'independent_segments',
+        '-hls_segment_filename', os.path.join(output_dir, 'v%v_%03d.ts'),
+        '-master_pl_name', 'master.m3u8',
+        '-var_stream_map', ' '.join(f'v:{i}' for i in range(n)),
+        '-y',
+        os.path.join(output_dir, 'v%v.m3u8')
+    ]
+    return cmd
+
+def generate_hls(input_path: str, hls_dir: str, progress=None):
+    """Genera la escalera HLS a partir de la salida procesada"""
+    os.makedirs(hls_dir, exist_ok=True)
+    run_ffmpeg(build_hls_command(input_path, hls_dir), progress)
+
+def publish_file(storage, key: str, path: str) -> bool:
+    """
+    Mueve ``path`` al almacenamiento. Si ya no está en disco, lo movió un
+    intento anterior de la misma etapa: cuenta como publicado si ``key`` existe.
+    """
+    if os.path.exists(path):
+        storage.put_file(key, path, remove_source=True)
         return True
-        
+    return storage.exists(key)
+
+def publish_hls(storage, video_id: str, hls_dir: str) -> str:
+    """Publica la escalera HLS con el master al final. Retorna la clave del master, o None"""
+    master = os.path.basename(hls_master_key(video_id))
+    for nombre in sorted(os.listdir(hls_dir), key=lambda nombre: nombre == master):
+        storage.put_file(f"{hls_prefix(video_id)}/{nombre}", os.path.join(hls_dir, nombre), remove_source=True)
+
+    # El master se mueve último: si está publicado, también lo están sus playlists y segmentos
+    if not publish_file(storage, hls_master_key(video_id), os.path.join(hls_dir, master)):
+        return None
+    logger.info(f"✅ Escalera HLS publicada para video {video_id}")
+    return hls_master_key(video_id)
+
+def generate_thumbnails(video_id: str, video_path: str, thumbnails_dir: str):
+    """
+    Si el camino usado no generó póster y sprite (remux, paralelo), se extraen
+    del video procesado. Un fallo aquí no invalida el video.
+    """
+    rutas = thumbnail_paths(thumbnails_dir)
+    if os.path.exists(rutas['poster']) and os.path.exists(rutas['sprite']):
+        return
+    try:
+        run_ffmpeg(build_thumbnails_command(video_path, thumbnails_dir))
     except subprocess.CalledProcessError as e:
-        logger.error(f"Error añadiendo logo: {e.stderr}")
-        return False
+        logger.warning(f"No se pudieron generar miniaturas para video {video_id}: {e.stderr}")
+        for ruta in rutas.values():
+            if os.path.exists(ruta):
+                os.remove(ruta)
 
-def process_video_sync(video_id: str, task_callback=None):
+def publish_thumbnails(storage, video_id: str, thumbnails_dir: str, duracion: float) -> dict:
+    """Publica póster, sprite e índice VTT junto al video procesado. Retorna las claves publicadas"""
+    rutas = thumbnail_paths(thumbnails_dir)
+    formato = settings.THUMBNAIL_FORMAT
+    claves = {
+        'poster': processed_asset_key(video_id, f"poster.{formato}"),
+        'sprite': processed_asset_key(video_id, f"sprite.{formato}"),
+        'vtt': processed_asset_key(video_id, "sprite.vtt"),
+    }
+    if not all(publish_file(storage, claves[nombre], rutas[nombre]) for nombre in ('poster', 'sprite')):
+        return {}
+
+    # El VTT referencia el sprite de forma relativa: ambos quedan en la misma carpeta
+    with open(rutas['vtt'], 'w') as vtt:
+        vtt.write(build_sprite_vtt(duracion, os.path.basename(claves['sprite'])))
+    publish_file(storage, claves['vtt'], rutas['vtt'])
+    return claves
+
+class StageRunner:
+    """
+    Ejecuta etapas con checkpoint. Una etapa completada (y cuyos artefactos
+    siguen disponibles) no se repite: su resultado se toma del checkpoint, de
+    modo que un reintento continúa desde la primera etapa incompleta.
+    """
+
+    def __init__(self, etapas: dict = None, guardar_etapa=None):
+        self.etapas = dict(etapas or {})
+        self.guardar_etapa = guardar_etapa
+
+    def completada(self, nombre: str) -> bool:
+        return self.etapas.get(nombre, {}).get('estado') == 'completado'
+
+    def run(self, nombre: str, funcion, valido=None, invalida: tuple = ()):
+        """
+        Ejecuta ``funcion`` salvo que la etapa ya esté completada y ``valido``
+        acepte su resultado. Si se ejecuta, descarta los checkpoints de las
+        etapas ``invalida`` que dependían de su salida anterior.
+        """
+        registro = self.etapas.get(nombre, {})
+        if registro.get('estado') == 'completado' and (valido is None or valido(registro.get('resultado'))):
+            logger.info(f"⏭️ Etapa '{nombre}' ya completada, se reutiliza su checkpoint")
+            return registro.get('resultado')
+
+        for dependiente in invalida:
+            self.etapas.pop(dependiente, None)
+
+        inicio = time.monotonic()
+        resultado = funcion()
+        registro = {
+            'estado': 'completado',
+            'duracion': round(time.monotonic() - inicio, 3),
+            'fin': datetime.utcnow().isoformat(),
+            'resultado': resultado
+        }
+        self.etapas[nombre] = registro
+        if self.guardar_etapa:
+            self.guardar_etapa(nombre, registro)
+        return resultado
+
+def work_dir_for(video_id: str) -> str:
+    # Directorio estable por video: los artefactos sobreviven a un reintento
+    return os.path.join(settings.PROCESSING_WORK_DIR, video_id)
+
+def cleanup_work_dir(video_id: str):
+    shutil.rmtree(work_dir_for(video_id), ignore_errors=True)
+
+def process_video_sync(video_id: str, task_callback=None, original_reference: str = None,
+                       content_hash: str = None, parametros: dict = None,
+                       etapas: dict = None, guardar_etapa=None):
     """
     Procesar video de forma SÍNCRONA - para usar en Celery
+
+    Etapas: sondeo → transcodificación → derivados (miniaturas, HLS) →
+    publicación. La finalización en BD la hace la tarea. Cada etapa deja un
+    checkpoint (``guardar_etapa``) y un reintento retoma desde la primera
+    incompleta. El original se obtiene y el resultado se publica a través del
+    backend de almacenamiento; ffmpeg trabaja sobre un directorio local.
     """
+    storage = get_storage()
+    runner = StageRunner(etapas, guardar_etapa)
+    work_dir = work_dir_for(video_id)
+    final_video_path = os.path.join(work_dir, 'final.mp4')
+    thumbnails_dir = os.path.join(work_dir, 'miniaturas')
+    hls_dir = os.path.join(work_dir, 'hls')
+    input_key = key_from_reference(original_reference) if original_reference else original_key(video_id)
+    cache = OutputCache() if settings.OUTPUT_CACHE_ENABLED and content_hash else None
+    cache_key = OutputCache.key(content_hash, parametros) if cache else None
+
+    def sondeo():
+        if not storage.exists(input_key):
+            raise FileNotFoundError(f"Video original no encontrado: {input_key}")
+        return {'mp4_info': probe_original(storage, input_key)}
+
+    def transcodificacion():
+        os.makedirs(thumbnails_dir, exist_ok=True)
+
+        # Reintentos y reprocesamientos sin cambios reutilizan la salida del caché
+        meta = cache.lookup(cache_key, work_dir) if cache else None
+        if meta:
+            logger.info(f"♻️ Salida de video {video_id} reutilizada desde caché")
+            return {**meta, 'desde_cache': True}
+
+        logo_path = settings.LOGO_PATH
+        if not os.path.exists(logo_path):
+            logger.warning("Logo NBA no encontrado, usando video sin logo")
+            logo_path = None
+
+        if task_callback:
+            task_callback(state='PROGRESS', meta={'current': 30, 'total': 100, 'status': 'Procesando video'})
+
+        with storage.local_copy(input_key) as input_path:
+            ruta_procesamiento, logo_aplicado, velocidad = produce_output(
+                input_path, final_video_path, sondeo_resultado['mp4_info'], logo_path, task_callback, thumbnails_dir
+            )
+        return {
+            'duracion_procesada': get_video_duration(final_video_path),
+            'ruta_procesamiento': ruta_procesamiento,
+            'logo_aplicado': logo_aplicado,
+            'velocidad_codificacion': velocidad,
+            'desde_cache': False
+        }
+
+    def derivados():
+        generate_thumbnails(video_id, final_video_path, thumbnails_dir)
+        # La escalera HLS parte de la salida ya recortada y con logo
+        if settings.HLS_ENABLED and not transcode['desde_cache']:
+            # Una escalera a medias de un intento anterior no se reutiliza
+            shutil.rmtree(hls_dir, ignore_errors=True)
+            if task_callback:
+                task_callback(state='PROGRESS', meta={'current': 80, 'total': 100, 'status': 'Generando HLS'})
+            generate_hls(final_video_path, hls_dir)
+        if cache and not transcode['desde_cache']:
+            meta = {clave: transcode[clave] for clave in
+                    ('duracion_procesada', 'ruta_procesamiento', 'logo_aplicado', 'velocidad_codificacion')}
+            cache.store(cache_key, work_dir, meta)
+        return {'hls': os.path.isdir(hls_dir)}
+
+    def publicacion():
+        if task_callback:
+            task_callback(state='PROGRESS', meta={'current': 90, 'total': 100, 'status': 'Publicando'})
+        miniaturas = publish_thumbnails(storage, video_id, thumbnails_dir, transcode['duracion_procesada'])
+        hls_key = publish_hls(storage, video_id, hls_dir) if os.path.isdir(hls_dir) else None
+        output_key = processed_key(video_id)
+        if not publish_file(storage, output_key, final_video_path):
+            raise FileNotFoundError(f"Video procesado no encontrado: {final_video_path}")
+        return {
+            'processed_path': output_key,
+            'hls_path': hls_key,
+            'poster_path': miniaturas.get('poster'),
+            'sprite_path': miniaturas.get('sprite'),
+            'vtt_path': miniaturas.get('vtt')
+        }
+
     try:
         if task_callback:
             task_callback(state='PROGRESS', meta={'current': 10, 'total': 100, 'status': 'Iniciando procesamiento'})
         
         logger.info(f"🎬 Iniciando procesamiento de video {video_id}")
-        
-        # 1. VERIFICAR ARCHIVO ORIGINAL
-        input_path = f"/storage/uploads/videos/originales/{video_id}.mp4"
-        if not os.path.exists(input_path):
-            import glob
-            pattern = f"/storage/uploads/videos/originales/{video_id}.*"
-            matching_files = glob.glob(pattern)
-            if not matching_files:
-                raise FileNotFoundError(f"Video original no encontrado: {pattern}")
-            input_path = matching_files[0]
-        
-        # 2. PROCESAR VIDEO - RECORTAR A 30 SEGUNDOS
-        if task_callback:
-            task_callback(state='PROGRESS', meta={'current': 30, 'total': 100, 'status': 'Recortando video'})
-        
-        temp_video_path = f"/storage/processed/videos/{video_id}_temp.mp4"
-        os.makedirs(os.path.dirname(temp_video_path), exist_ok=True)
-        
-        cmd_recortar = [
-            'ffmpeg',
-            '-i', input_path,
-            '-t', '30',              # Máximo 30 segundos
-            '-s', '1280x720',        # Resolución 1280x720
-            '-an',                   # Quitar audio
-            '-c:v', 'libx264',
-            '-preset', 'medium',
-            '-crf', '23',
-            '-y',
-            temp_video_path
-        ]
-        
-        subprocess.run(cmd_recortar, capture_output=True, check=True)
-        logger.info("✅ Video recortado y sin audio")
-        
-        # 3. AGREGAR LOGO NBA
-        if task_callback:
-            task_callback(state='PROGRESS', meta={'current': 60, 'total': 100, 'status': 'Añadiendo logo NBA'})
-        
-        final_video_path = f"/storage/processed/videos/{video_id}_final.mp4"
-        logo_path = "/storage/assets/logoANB.png"
-        
-        if not os.path.exists(logo_path):
-            logger.warning("Logo NBA no encontrado, usando video sin logo")
-            import shutil
-            shutil.copy2(temp_video_path, final_video_path)
+
+        if runner.completada('publicacion'):
+            # Falló la finalización en BD: los artefactos ya están publicados
+            transcode = runner.etapas['transcodificacion']['resultado']
+            publicado = runner.etapas['publicacion']['resultado']
         else:
-            success = add_logo_simple(temp_video_path, final_video_path, logo_path)
-            if not success:
-                import shutil
-                shutil.copy2(temp_video_path, final_video_path)
-                logger.warning("Usando video sin logo debido a error")
-        
-        # Limpiar archivo temporal
-        if os.path.exists(temp_video_path):
-            os.remove(temp_video_path)
-        
-        # 4. OBTENER METADATOS FINALES
-        if task_callback:
-            task_callback(state='PROGRESS', meta={'current': 80, 'total': 100, 'status': 'Finalizando'})
-        
-        duracion_procesada = get_video_duration(final_video_path)
-        
+            os.makedirs(work_dir, exist_ok=True)
+            # Los artefactos locales solo sirven si siguen en disco (otro worker pudo tomar el reintento)
+            artefactos_locales = lambda _: os.path.exists(final_video_path)
+
+            sondeo_resultado = runner.run('sondeo', sondeo)
+            transcode = runner.run('transcodificacion', transcodificacion, valido=artefactos_locales,
+                                   invalida=('derivados',))
+            runner.run('derivados', derivados, valido=artefactos_locales)
+            publicado = runner.run('publicacion', publicacion)
+
         if task_callback:
             task_callback(state='PROGRESS', meta={'current': 100, 'total': 100, 'status': 'Completado'})
-        
+
+        # Publicado: el directorio de trabajo ya no se necesita para reintentos
+        cleanup_work_dir(video_id)
+
         logger.info(f"✅ Procesamiento completado para video {video_id}")
         return {
             'success': True,
             'video_id': video_id,
-            'processed_path': final_video_path,
-            'duracion_procesada': duracion_procesada,
-            'resolucion_procesada': '1280x720'
+            **publicado,
+            'duracion_procesada': transcode['duracion_procesada'],
+            'resolucion_procesada': settings.TARGET_RESOLUTION,
+            'ruta_procesamiento': transcode['ruta_procesamiento'],
+            'logo_aplicado': transcode['logo_aplicado'],
+            'velocidad_codificacion': transcode['velocidad_codificacion'],
+            'desde_cache': transcode['desde_cache'],
+            'etapas': runner.etapas
         }
         
     except Exception as exc:
@@ -136,5 +741,6 @@ def process_video_sync(video_id: str, task_callback=None):
         return {
             'success': False,
             'video_id': video_id,
-            'error': str(exc)
-        }
\ No newline at end of file
+            'error': str(exc),
+            'etapas': runner.etapas
+        }
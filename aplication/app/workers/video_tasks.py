@@ -1,14 +1,20 @@
 import os
+import time
+import uuid
 import logging
+import redis
 from datetime import datetime
 from celery import current_task
 from app.workers.celery_app import celery_app
-from app.workers.video_processing import process_video_sync
+from app.workers.video_processing import process_video_sync, cleanup_work_dir
 
 # Importaciones SÍNCRONAS para base de datos
-from sqlalchemy import create_engine, update
+from sqlalchemy import create_engine, update, select
 from sqlalchemy.orm import sessionmaker
 from app.config.settings import settings
+from app.core.processing_params import current_processing_params
+from app.workers.queue_routing import record_queue_metric, elapsed_since
+from app.workers.locks import VideoLease, LeaseLost
 
 logger = logging.getLogger(__name__)
 
@@ -16,6 +22,9 @@ logger = logging.getLogger(__name__)
 sync_engine = create_engine(settings.DATABASE_URL.replace('aiomysql', 'pymysql'))
 SyncSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=sync_engine)
 
+# Concesiones por video y métricas de espera por clase de cola
+worker_redis = redis.Redis.from_url(settings.REDIS_URL)
+
 def update_video_estado_sync(video_id: str, estado: str):
     """Actualizar estado del video - SÍNCRONO"""
     with SyncSessionLocal() as session:
@@ -29,7 +38,7 @@ def update_video_estado_sync(video_id: str, estado: str):
 
 def update_procesamiento_estado_sync(video_id: str, estado: str, intentos: int, 
                                    fecha_inicio: datetime = None, fecha_fin: datetime = None, 
-                                   error_message: str = None):
+                                   error_message: str = None, version_parametros: str = None):
     """Actualizar estado del procesamiento - SÍNCRONO"""
     with SyncSessionLocal() as session:
         from app.schemas.procesamiento_video import ProcesamientoVideo
@@ -44,6 +53,8 @@ def update_procesamiento_estado_sync(video_id: str, estado: str, intentos: int,
             update_data["fecha_fin"] = fecha_fin
         if error_message:
             update_data["error_message"] = error_message
+        if version_parametros:
+            update_data["version_parametros"] = version_parametros
             
         session.execute(
             update(ProcesamientoVideo)
@@ -52,8 +63,59 @@ def update_procesamiento_estado_sync(video_id: str, estado: str, intentos: int,
         )
         session.commit()
 
+def update_procesamiento_parametros_sync(video_id: str, parametros: dict):
+    """Agregar datos a los parámetros del procesamiento - SÍNCRONO"""
+    with SyncSessionLocal() as session:
+        from app.schemas.procesamiento_video import ProcesamientoVideo
+        procesamiento = session.execute(
+            select(ProcesamientoVideo).where(ProcesamientoVideo.video_id == video_id)
+        ).scalar_one_or_none()
+        if procesamiento:
+            procesamiento.parametros = {**(procesamiento.parametros or {}), **parametros}
+            session.commit()
+
+def update_procesamiento_etapa_sync(video_id: str, nombre: str, registro: dict):
+    """Guardar el checkpoint de una etapa del pipeline - SÍNCRONO"""
+    with SyncSessionLocal() as session:
+        from app.schemas.procesamiento_video import ProcesamientoVideo
+        procesamiento = session.execute(
+            select(ProcesamientoVideo).where(ProcesamientoVideo.video_id == video_id)
+        ).scalar_one_or_none()
+        if procesamiento:
+            procesamiento.etapas = {**(procesamiento.etapas or {}), nombre: registro}
+            session.commit()
+
+def get_procesamiento_estado_sync(video_id: str):
+    """Obtener el estado del procesamiento - SÍNCRONO"""
+    with SyncSessionLocal() as session:
+        from app.schemas.procesamiento_video import ProcesamientoVideo
+        return session.execute(
+            select(ProcesamientoVideo.estado).where(ProcesamientoVideo.video_id == video_id)
+        ).scalar_one_or_none()
+
+def get_processing_inputs_sync(video_id: str) -> dict:
+    """Obtener original, hash, parámetros y checkpoints para procesar el video - SÍNCRONO"""
+    with SyncSessionLocal() as session:
+        from app.schemas.video import Video
+        from app.schemas.procesamiento_video import ProcesamientoVideo
+        row = session.execute(
+            select(Video.archivo_original, Video.hash_contenido,
+                   ProcesamientoVideo.parametros, ProcesamientoVideo.etapas)
+            .outerjoin(ProcesamientoVideo, ProcesamientoVideo.video_id == Video.id)
+            .where(Video.id == video_id)
+        ).first()
+        if row is None:
+            return {}
+        return {
+            "original_reference": row.archivo_original,
+            "content_hash": row.hash_contenido,
+            "parametros": row.parametros or {},
+            "etapas": row.etapas or {}
+        }
+
 def update_video_procesado_sync(video_id: str, archivo_procesado: str, 
-                              duracion_procesada: int, resolucion_procesada: str):
+                              duracion_procesada: int, resolucion_procesada: str,
+                              archivo_hls: str = None, miniaturas: dict = None):
     """Actualizar video procesado - SÍNCRONO"""
     with SyncSessionLocal() as session:
         from app.schemas.video import Video
@@ -63,6 +125,10 @@ def update_video_procesado_sync(video_id: str, archivo_procesado: str,
             .values(
                 estado="procesado",
                 archivo_procesado=archivo_procesado,
+                archivo_hls=archivo_hls,
+                archivo_poster=(miniaturas or {}).get('poster'),
+                archivo_sprite=(miniaturas or {}).get('sprite'),
+                archivo_vtt=(miniaturas or {}).get('vtt'),
                 duracion_procesada=duracion_procesada,
                 resolucion_procesada=resolucion_procesada,
                 fecha_procesamiento=datetime.utcnow()
@@ -71,82 +137,182 @@ def update_video_procesado_sync(video_id: str, archivo_procesado: str,
         session.commit()
 
 @celery_app.task(bind=True, max_retries=3, soft_time_limit=300)
-def process_video_task(self, video_id: str):
+def process_video_task(self, video_id: str, reprocesamiento: bool = False, clase: str = None,
+                       encolado_en: float = None):
     """
     Tarea Celery para procesar un video - VERSIÓN SÍNCRONA DEFINITIVA
+
+    En un reprocesamiento el video sigue publicado con su salida anterior
+    hasta que la nueva queda lista, y un fallo no lo marca como error.
+    ``clase`` y ``encolado_en`` alimentan las métricas de espera por cola.
     """
+    # Una entrega duplicada (reentrega con acks tardíos) sale sin trabajar
+    # El token identifica este intento: una reentrega conserva el id de la tarea
+    lease = VideoLease(worker_redis, video_id, token=f"{self.request.hostname}:{self.request.id}:{uuid.uuid4().hex[:8]}")
+    if not lease.acquire():
+        logger.warning(f"⏭️ Video {video_id} en proceso por otra tarea ({lease.holder()}), se omite")
+        return {
+            'video_id': video_id,
+            'status': 'skipped',
+            'message': 'El video ya está siendo procesado'
+        }
+
     try:
-        logger.info(f"🎬 Iniciando procesamiento de video {video_id}")
-        
-        # 1. ACTUALIZAR ESTADOS A "procesando"
-        update_video_estado_sync(video_id, "procesando")
-        update_procesamiento_estado_sync(
-            video_id, "procesando", 1, 
-            fecha_inicio=datetime.utcnow()
-        )
+        if get_procesamiento_estado_sync(video_id) == "completado":
+            logger.info(f"⏭️ Video {video_id} ya procesado, se omite la entrega duplicada")
+            return {
+                'video_id': video_id,
+                'status': 'skipped',
+                'message': 'El video ya estaba procesado'
+            }
+
+        try:
+            logger.info(f"🎬 Iniciando procesamiento de video {video_id}")
+            if self.request.retries == 0 and encolado_en:
+                record_queue_metric(worker_redis, clase, "espera", elapsed_since(encolado_en))
         
-        # 2. PROCESAR VIDEO (SÍNCRONO)
-        def progress_callback(state, meta):
-            self.update_state(state=state, meta=meta)
+            # 1. ACTUALIZAR ESTADOS A "procesando"
+            intento = self.request.retries + 1
+            if not reprocesamiento:
+                update_video_estado_sync(video_id, "procesando")
+            update_procesamiento_estado_sync(
+                video_id, "procesando", intento, 
+                fecha_inicio=datetime.utcnow()
+            )
         
-        result = process_video_sync(video_id, progress_callback)
+            # 2. PROCESAR VIDEO (SÍNCRONO), retomando desde la primera etapa incompleta
+            def progress_callback(state, meta):
+                self.update_state(state=state, meta=meta)
+
+            def guardar_etapa(nombre, registro):
+                update_procesamiento_etapa_sync(video_id, nombre, registro)
         
-        # 3. VERIFICAR RESULTADO
-        if result['success']:
-            # ✅ ÉXITO - Actualizar como procesado
-            update_video_procesado_sync(
-                video_id,
-                result['processed_path'],
-                result['duracion_procesada'],
-                result['resolucion_procesada']
-            )
-            update_procesamiento_estado_sync(
-                video_id, "completado", 1,
-                fecha_fin=datetime.utcnow()
+            result = process_video_sync(
+                video_id, progress_callback, guardar_etapa=guardar_etapa, **get_processing_inputs_sync(video_id)
             )
+        
+            # 3. VERIFICAR RESULTADO
+            if result['success']:
+                # ✅ ÉXITO - Actualizar como procesado (solo si la concesión sigue siendo propia)
+                lease.ensure()
+                inicio_finalizacion = time.monotonic()
+                update_video_procesado_sync(
+                    video_id,
+                    result['processed_path'],
+                    result['duracion_procesada'],
+                    result['resolucion_procesada'],
+                    result['hls_path'],
+                    {
+                        'poster': result['poster_path'],
+                        'sprite': result['sprite_path'],
+                        'vtt': result['vtt_path']
+                    }
+                )
+                # Solo se registra la versión vigente si la salida cumple lo solicitado;
+                # sin el logo pedido queda desactualizada y el reprocesamiento la retoma
+                vigentes = current_processing_params()
+                cumple = result['logo_aplicado'] or not vigentes["incluir_logo"]
+                update_procesamiento_estado_sync(
+                    video_id, "completado", intento,
+                    fecha_fin=datetime.utcnow(),
+                    version_parametros=vigentes["version_parametros"] if cumple else None
+                )
+                # Registrar el camino usado para medir la tasa de remux (incluir_logo queda como se pidió)
+                update_procesamiento_parametros_sync(video_id, {
+                    "ruta_procesamiento": result['ruta_procesamiento'],
+                    "logo_aplicado": result['logo_aplicado'],
+                    "velocidad_codificacion": result['velocidad_codificacion'],
+                    "salida_desde_cache": result['desde_cache']
+                })
+                if encolado_en:
+                    record_queue_metric(worker_redis, clase, "procesado", elapsed_since(encolado_en))
+                update_procesamiento_etapa_sync(video_id, "finalizacion", {
+                    'estado': 'completado',
+                    'duracion': round(time.monotonic() - inicio_finalizacion, 3),
+                    'fin': datetime.utcnow().isoformat()
+                })
+            
+                logger.info(f"✅ Procesamiento completado para video {video_id}")
+                return {
+                    'video_id': video_id,
+                    'status': 'completed',
+                    'processed_path': result['processed_path'],
+                    'duracion_procesada': result['duracion_procesada'],
+                    'message': 'Video procesado exitosamente'
+                }
+            else:
+                # ❌ ERROR
+                raise Exception(result['error'])
             
-            logger.info(f"✅ Procesamiento completado para video {video_id}")
+        except LeaseLost as exc:
+            # Otro worker tomó el video: no se toca su estado
+            logger.error(f"❌ {exc}; se abandona el procesamiento de video {video_id}")
             return {
                 'video_id': video_id,
-                'status': 'completed',
-                'processed_path': result['processed_path'],
-                'duracion_procesada': result['duracion_procesada'],
-                'message': 'Video procesado exitosamente'
+                'status': 'abandoned',
+                'message': 'Concesión perdida durante el procesamiento'
             }
-        else:
-            # ❌ ERROR
-            raise Exception(result['error'])
-            
-    except Exception as exc:
-        logger.error(f"❌ Error procesando video {video_id}: {str(exc)}")
+        except Exception as exc:
+            logger.error(f"❌ Error procesando video {video_id}: {str(exc)}")
         
-        # ACTUALIZAR ESTADO DE ERROR
-        update_video_estado_sync(video_id, "error")
-        update_procesamiento_estado_sync(
-            video_id, "fallado", 
-            self.request.retries + 1,
-            fecha_fin=datetime.utcnow(),
-            error_message=str(exc)
-        )
+            # ACTUALIZAR ESTADO DE ERROR
+            if not reprocesamiento:
+                update_video_estado_sync(video_id, "error")
+            update_procesamiento_estado_sync(
+                video_id, "fallado", 
+                self.request.retries + 1,
+                fecha_fin=datetime.utcnow(),
+                error_message=str(exc)
+            )
         
-        # Reintentar la tarea
-        if self.request.retries < self.max_retries:
-            raise self.retry(countdown=60, exc=exc)
-        else:
-            logger.error(f"❌ Máximo de reintentos alcanzado para video {video_id}")
-            return {
-                'video_id': video_id,
-                'status': 'failed',
-                'error': str(exc),
-                'message': 'Error procesando video después de múltiples intentos'
-            }
+            # Reintentar la tarea
+            if self.request.retries < self.max_retries:
+                raise self.retry(countdown=60, exc=exc)
+            else:
+                logger.error(f"❌ Máximo de reintentos alcanzado para video {video_id}")
+                # Sin más reintentos los artefactos intermedios ya no sirven
+                cleanup_work_dir(video_id)
+                return {
+                    'video_id': video_id,
+                    'status': 'failed',
+                    'error': str(exc),
+                    'message': 'Error procesando video después de múltiples intentos'
+                }
+    finally:
+        lease.release()
 
 @celery_app.task
 def cleanup_old_videos():
-    """Tarea de mantenimiento"""
+    """
+    Tarea de mantenimiento: recolecta un lote de archivos huérfanos del
+    almacenamiento local y guarda en Redis el cursor para la siguiente ejecución
+    """
+    from app.workers.storage_gc import build_collector, GC_STATE_KEY
+    from app.core.storage_backend import get_storage, LocalStorageBackend
     try:
-        logger.info("Ejecutando limpieza de videos antiguos")
-        return {"cleaned_files": 0, "status": "completed"}
+        if not isinstance(get_storage(), LocalStorageBackend):
+            # En S3 la limpieza de huérfanos corresponde a reglas de ciclo de vida del bucket
+            return {"cleaned_files": 0, "status": "skipped"}
+
+        estado = {k.decode(): v.decode() for k, v in worker_redis.hgetall(GC_STATE_KEY).items()}
+        destino, posicion = int(estado.get("destino", 0)), int(estado.get("posicion", 0))
+        logger.info(f"Ejecutando limpieza de almacenamiento desde {destino}:{posicion}")
+
+        result = build_collector(SyncSessionLocal, worker_redis).run(destino, posicion)
+
+        pipe = worker_redis.pipeline()
+        pipe.hset(GC_STATE_KEY, mapping={
+            "destino": result["destino"],
+            "posicion": result["posicion"],
+            "ultima_ejecucion": datetime.utcnow().isoformat()
+        })
+        pipe.hincrby(GC_STATE_KEY, "archivos_eliminados", result["cleaned_files"])
+        pipe.hincrby(GC_STATE_KEY, "bytes_liberados", result["bytes_reclaimed"])
+        pipe.execute()
+
+        if result["cleaned_files"]:
+            logger.info(f"🧹 {result['cleaned_files']} huérfanos, {result['bytes_reclaimed']} bytes liberados")
+        return {**result, "status": "completed"}
     except Exception as e:
         logger.error(f"Error en limpieza: {str(e)}")
-        return {"error": str(e), "status": "failed"}
\ No newline at end of file
+        return {"error": str(e), "status": "failed"}
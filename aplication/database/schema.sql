@@ -55,21 +55,30 @@ CREATE TABLE IF NOT EXISTS Video (
     titulo VARCHAR(255) NOT NULL,
     archivo_original VARCHAR(500) NOT NULL COMMENT 'Ruta en almacenamiento',
     archivo_procesado VARCHAR(500) NULL COMMENT 'Ruta del video procesado',
+    archivo_hls VARCHAR(500) NULL COMMENT 'Playlist maestra HLS',
+    archivo_poster VARCHAR(500) NULL COMMENT 'Imagen de portada',
+    archivo_sprite VARCHAR(500) NULL COMMENT 'Sprite de miniaturas',
+    archivo_vtt VARCHAR(500) NULL COMMENT 'Índice WebVTT del sprite',
     duracion_original INT NOT NULL COMMENT 'Duración en segundos',
     duracion_procesada INT NULL COMMENT 'Duración procesada en segundos',
     estado ENUM('subido', 'procesando', 'procesado', 'error') NOT NULL DEFAULT 'subido',
+    visibilidad ENUM('publico', 'privado') NOT NULL DEFAULT 'publico',
     formato_original VARCHAR(10) NOT NULL COMMENT 'mp4, avi, etc.',
     tamaño_archivo BIGINT NOT NULL COMMENT 'Tamaño en bytes',
     resolucion_original VARCHAR(20) NOT NULL COMMENT '1920x1080, 1280x720, etc.',
     resolucion_procesada VARCHAR(20) NULL COMMENT 'Resolución después de procesar',
+    hash_contenido CHAR(64) NULL COMMENT 'SHA-256 del archivo original',
     fecha_subida DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     fecha_procesamiento DATETIME NULL,
     contador_vistas INT NOT NULL DEFAULT 0,
     FOREIGN KEY (jugador_id) REFERENCES Jugador(id) ON DELETE CASCADE,
     INDEX idx_video_jugador (jugador_id),
     INDEX idx_video_estado (estado),
+    INDEX idx_video_estado_visibilidad (estado, visibilidad),
     INDEX idx_video_fecha_subida (fecha_subida),
-    INDEX idx_video_contador_vistas (contador_vistas DESC)
+    INDEX idx_video_estado_fecha_subida (estado, fecha_subida),
+    INDEX idx_video_contador_vistas (contador_vistas DESC),
+    INDEX idx_video_hash_contenido (hash_contenido)
 );
 
 -- Tabla: ProcesamientoVideo
@@ -83,10 +92,30 @@ CREATE TABLE IF NOT EXISTS ProcesamientoVideo (
     fecha_inicio DATETIME NULL,
     fecha_fin DATETIME NULL,
     parametros JSON NOT NULL COMMENT 'Parámetros de procesamiento',
+    version_parametros VARCHAR(16) NULL COMMENT 'Versión de parámetros con la que se produjo la salida',
+    etapas JSON NULL COMMENT 'Checkpoints por etapa del pipeline',
     FOREIGN KEY (video_id) REFERENCES Video(id) ON DELETE CASCADE,
     INDEX idx_procesamiento_estado (estado),
     INDEX idx_procesamiento_tarea (tarea_id),
-    INDEX idx_procesamiento_fecha_inicio (fecha_inicio)
+    INDEX idx_procesamiento_fecha_inicio (fecha_inicio),
+    INDEX idx_procesamiento_version (version_parametros),
+    INDEX idx_procesamiento_estado_inicio (estado, fecha_inicio)
+);
+
+-- Tabla: TareaPendiente (outbox de tareas Celery)
+CREATE TABLE IF NOT EXISTS TareaPendiente (
+    id CHAR(36) PRIMARY KEY COMMENT 'También es el id de la tarea en Celery',
+    tarea VARCHAR(255) NOT NULL COMMENT 'Nombre de la tarea Celery',
+    cola VARCHAR(100) NOT NULL,
+    argumentos JSON NOT NULL,
+    opciones JSON NOT NULL COMMENT 'kwargs de la tarea',
+    video_id CHAR(36) NULL,
+    fecha_creacion DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
+    fecha_envio DATETIME NULL,
+    intentos INT NOT NULL DEFAULT 0,
+    error_message TEXT NULL,
+    INDEX idx_tarea_pendiente_envio (fecha_envio, fecha_creacion),
+    INDEX idx_tarea_pendiente_video (video_id)
 );
 
 -- Tabla: Voto
@@ -114,8 +143,10 @@ CREATE TABLE IF NOT EXISTS Ranking (
     ciudad_id CHAR(36) NOT NULL,
     puntuacion_total INT NOT NULL DEFAULT 0,
     posicion INT NOT NULL DEFAULT 0,
+    posicion_ciudad INT NOT NULL DEFAULT 0 COMMENT 'Posición dentro de su ciudad',
     fecha_actualizacion DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
     temporada VARCHAR(10) NOT NULL COMMENT 'Ej: 2024-Q1, 2024-Q2',
+    version BIGINT NOT NULL DEFAULT 0 COMMENT 'Snapshot; RankingActivo indica el publicado',
     FOREIGN KEY (jugador_id) REFERENCES Jugador(id) ON DELETE CASCADE,
     FOREIGN KEY (ciudad_id) REFERENCES Ciudad(id) ON DELETE CASCADE,
     INDEX idx_ranking_ciudad (ciudad_id),
@@ -123,7 +154,16 @@ CREATE TABLE IF NOT EXISTS Ranking (
     INDEX idx_ranking_posicion (posicion),
     INDEX idx_ranking_temporada (temporada),
     INDEX idx_ranking_jugador_ciudad (jugador_id, ciudad_id),
-    UNIQUE KEY uk_ranking_jugador_temporada_ciudad (jugador_id, temporada, ciudad_id)
+    INDEX idx_ranking_puntuacion_jugador (temporada, version, puntuacion_total, jugador_id),
+    INDEX idx_ranking_ciudad_puntuacion_jugador (temporada, version, ciudad_id, puntuacion_total, jugador_id),
+    UNIQUE KEY uk_ranking_jugador_temporada_ciudad (jugador_id, temporada, version, ciudad_id)
+);
+
+-- Tabla: RankingActivo (snapshot publicado de cada temporada)
+CREATE TABLE IF NOT EXISTS RankingActivo (
+    temporada VARCHAR(10) PRIMARY KEY COMMENT 'Ej: 2024-Q1, 2024-Q2',
+    version BIGINT NOT NULL COMMENT 'Ranking.version que leen las consultas',
+    fecha_publicacion DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP
 );
 
 -- Insertar datos iniciales de ciudades
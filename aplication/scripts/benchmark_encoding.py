@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+"""
+Compara la transcodificación serial con la paralela por segmentos.
+
+Uso: python scripts/benchmark_encoding.py video.mp4 [--logo logo.png] [--segmentos N] [--repeticiones R]
+"""
+import sys
+import os
+import time
+import shutil
+import argparse
+import tempfile
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.mp4 import probe_file
+from app.workers.video_processing import transcode_video, transcode_video_parallel, parallel_segment_count
+
+
+def medir(nombre, funcion, repeticiones):
+    tiempos = []
+    for _ in range(repeticiones):
+        inicio = time.perf_counter()
+        funcion()
+        tiempos.append(time.perf_counter() - inicio)
+    mejor = min(tiempos)
+    print(f"{nombre:<10} mejor: {mejor:7.2f}s  promedio: {sum(tiempos) / len(tiempos):7.2f}s")
+    return mejor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de codificación serial vs paralela")
+    parser.add_argument("video")
+    parser.add_argument("--logo", default=None)
+    parser.add_argument("--segmentos", type=int, default=parallel_segment_count())
+    parser.add_argument("--repeticiones", type=int, default=3)
+    args = parser.parse_args()
+
+    duracion = probe_file(args.video)["duracion"]
+    work_dir = tempfile.mkdtemp(prefix="benchmark_")
+    print(f"🎬 {args.video} ({duracion:.1f}s), {os.cpu_count()} núcleos, {args.segmentos} segmentos")
+    print("=" * 50)
+
+    try:
+        serial = medir(
+            "serial",
+            lambda: transcode_video(args.video, os.path.join(work_dir, "serial.mp4"), args.logo),
+            args.repeticiones
+        )
+        paralelo = medir(
+            "paralelo",
+            lambda: transcode_video_parallel(
+                args.video, os.path.join(work_dir, "paralelo.mp4"), args.logo,
+                work_dir, duracion, args.segmentos
+            ),
+            args.repeticiones
+        )
+        print("=" * 50)
+        print(f"⚡ Aceleración: {serial / paralelo:.2f}x")
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+import os
+import json
+import pytest
+from datetime import datetime, timedelta
+from unittest.mock import MagicMock
+from redis.exceptions import WatchError
+
+from app.core.leaderboard import (
+    Leaderboard, global_key, city_key, cities_key, journal_key, watermark_key, player_profile, vote_mark
+)
+
+MARCA = datetime(1999, 2, 1, 12, 0, 0)
+
+
+def _antes(segundos: int = 1) -> datetime:
+    return MARCA - timedelta(seconds=segundos)
+
+def _despues(segundos: int = 1) -> datetime:
+    return MARCA + timedelta(seconds=segundos)
+
+
+class TestLeaderboardRebuild:
+    """Tests de la reconciliación con el diario de votos, sin Redis"""
+
+    def _board(self, pendientes, fallos: int = 0):
+        client = MagicMock()
+        pipe = client.pipeline.return_value.__enter__.return_value
+        pipe.smembers.return_value = {b"cali"}
+        pipe.zrangebyscore.return_value = [json.dumps(entrada).encode() for entrada in pendientes]
+        pipe.execute.side_effect = [WatchError()] * fallos + [[]]
+        return Leaderboard(client, "1999-Q1"), pipe
+
+    def test_rebuild_adds_votes_after_watermark(self):
+        """Test que los votos incrementados tras la marca se suman a los conteos, sin perderse ni duplicarse"""
+        board, pipe = self._board([["v1", "j1", "bogota", 1], ["v2", "j2", "cali", 1]])
+        board.rebuild([("j1", "bogota", 3, player_profile("Ana", "Ruiz", "Bogotá"))], MARCA)
+
+        pipe.zrangebyscore.assert_called_once_with(journal_key("1999-Q1"), f"({vote_mark(MARCA)}", "+inf")
+        pipe.zadd.assert_any_call(global_key("1999-Q1"), {"j1": 4, "j2": 1})
+        pipe.zadd.assert_any_call(city_key("1999-Q1", "cali"), {"j2": 1})
+        pipe.set.assert_called_once_with(watermark_key("1999-Q1"), vote_mark(MARCA))
+        pipe.zremrangebyscore.assert_called_once_with(journal_key("1999-Q1"), "-inf", vote_mark(MARCA))
+
+    def test_rebuild_retries_when_a_vote_arrives(self):
+        """Test que un voto registrado durante la reconciliación fuerza a releer el diario"""
+        board, pipe = self._board([], fallos=1)
+        board.rebuild([("j1", "bogota", 3, player_profile("Ana", "Ruiz", "Bogotá"))], MARCA)
+
+        assert pipe.watch.call_count == 2
+        assert pipe.execute.call_count == 2
+
+    def test_rebuild_without_votes_clears_board(self):
+        """Test que sin votos se eliminan los puntajes anteriores en lugar de conservarlos"""
+        board, pipe = self._board([])
+        board.rebuild([], MARCA)
+
+        pipe.delete.assert_called_once_with(global_key("1999-Q1"), cities_key("1999-Q1"), city_key("1999-Q1", "cali"))
+        pipe.zadd.assert_not_called()
+        pipe.set.assert_called_once_with(watermark_key("1999-Q1"), vote_mark(MARCA))
+
+
+@pytest.mark.integration
+@pytest.mark.skipif(not os.getenv("REDIS_TEST_URL"), reason="Requiere un Redis local (docker compose up redis)")
+class TestLeaderboard:
+    """Tests de la tabla de posiciones contra Redis"""
+
+    temporada = "1999-Q1"
+
+    def _board(self):
+        redis = pytest.importorskip("redis")
+        client = redis.Redis.from_url(os.getenv("REDIS_TEST_URL"))
+        client.delete(global_key(self.temporada), cities_key(self.temporada),
+                      city_key(self.temporada, "bogota"), city_key(self.temporada, "cali"),
+                      journal_key(self.temporada), watermark_key(self.temporada))
+        return Leaderboard(client, self.temporada)
+
+    def test_votes_before_rebuild_are_not_counted(self):
+        """Test que sin reconciliación previa el incremento no crea una tabla parcial"""
+        board = self._board()
+        assert not board.increment("v1", _despues(), "j1", "bogota", player_profile("Ana", "Ruiz", "Bogotá"))
+        assert board.top() is None
+
+    def test_increment_updates_global_and_city_order(self):
+        """Test que un voto reordena la tabla global y la de su ciudad"""
+        board = self._board()
+        board.rebuild([
+            ("j1", "bogota", 3, player_profile("Ana", "Ruiz", "Bogotá")),
+            ("j2", "cali", 2, player_profile("Luis", "Gil", "Cali")),
+        ], MARCA)
+        board.increment("v1", _despues(), "j2", "cali", player_profile("Luis", "Gil", "Cali"))
+        board.increment("v2", _despues(), "j2", "cali", player_profile("Luis", "Gil", "Cali"))
+
+        top = board.top()
+        assert [(r["player_id"], r["position"], r["votes"]) for r in top] == [("j2", 1, 4), ("j1", 2, 3)]
+        assert top[0]["username"] == "Luis Gil"
+        assert [r["player_id"] for r in board.top(ciudad_id="bogota")] == ["j1"]
+
+    def test_rebuild_replaces_drifted_scores(self):
+        """Test que la reconciliación corrige puntajes y elimina ciudades sin votos"""
+        board = self._board()
+        board.rebuild([("j1", "bogota", 9, player_profile("Ana", "Ruiz", "Bogotá"))], MARCA)
+        board.rebuild([("j2", "cali", 1, player_profile("Luis", "Gil", "Cali"))], MARCA)
+
+        assert [r["player_id"] for r in board.top()] == ["j2"]
+        assert board.top(ciudad_id="bogota") == []
+
+    def test_ties_share_position_across_pages(self):
+        """Test que los empates comparten posición como RANK(), también al inicio de una página"""
+        board = self._board()
+        board.rebuild([
+            (jugador, "bogota", votos, player_profile("N", jugador, "Bogotá"))
+            for jugador, votos in (("j1", 9), ("j2", 7), ("j3", 7), ("j4", 5))
+        ], MARCA)
+
+        assert [r["position"] for r in board.top()] == [1, 2, 2, 4]
+        assert [r["position"] for r in board.top(skip=2, limit=2)] == [2, 4]
+
+    def test_votes_during_rebuild_are_kept_once(self):
+        """Test que un voto posterior a la marca sobrevive a la reconciliación y uno ya contado no se duplica"""
+        board = self._board()
+        perfil = player_profile("Ana", "Ruiz", "Bogotá")
+        board.rebuild([("j1", "bogota", 1, perfil)], _antes(10))
+
+        # Votos registrados mientras la BD contaba hasta MARCA: v1 quedó en el conteo, v2 no
+        board.increment("v1", _antes(), "j1", "bogota", perfil)
+        board.increment("v2", _despues(), "j1", "bogota", perfil)
+        board.rebuild([("j1", "bogota", 2, perfil)], MARCA)
+        # Incremento tardío de un voto que la reconstrucción ya contó
+        board.increment("v3", _antes(), "j1", "bogota", perfil)
+
+        assert board.top()[0]["votes"] == 3
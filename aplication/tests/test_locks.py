@@ -0,0 +1,42 @@
+import os
+import pytest
+
+from app.workers.locks import VideoLease, LeaseLost
+
+
+@pytest.mark.integration
+@pytest.mark.skipif(not os.getenv("REDIS_TEST_URL"), reason="Requiere un Redis local (docker compose up redis)")
+class TestVideoLease:
+    """Tests de la concesión por video contra Redis"""
+
+    def _redis(self):
+        redis = pytest.importorskip("redis")
+        return redis.Redis.from_url(os.getenv("REDIS_TEST_URL"))
+
+    def test_second_holder_is_rejected(self):
+        """Test que una entrega duplicada no obtiene la concesión hasta que se libera"""
+        client = self._redis()
+        primera = VideoLease(client, "video-prueba", ttl=5)
+        segunda = VideoLease(client, "video-prueba", ttl=5)
+        try:
+            assert primera.acquire()
+            assert not segunda.acquire()
+            primera.ensure()
+        finally:
+            primera.release()
+
+        assert segunda.acquire()
+        segunda.release()
+
+    def test_lost_lease_is_detected(self):
+        """Test que un dueño cuya concesión tomó otro worker no puede finalizar"""
+        client = self._redis()
+        lease = VideoLease(client, "video-prueba-perdida", ttl=5)
+        assert lease.acquire()
+        client.set(lease.key, "otro-worker", ex=5)
+
+        with pytest.raises(LeaseLost):
+            lease.ensure()
+        lease.release()
+        assert client.get(lease.key) == b"otro-worker"
+        client.delete(lease.key)
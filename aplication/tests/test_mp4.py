@@ -0,0 +1,130 @@
+import struct
+import pytest
+
+from app.core.mp4 import Mp4Error, Mp4StreamInspector, parse_ftyp, probe_file
+
+
+def _box(box_type: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), box_type) + payload
+
+
+def _full_box(box_type: bytes, payload: bytes, version: int = 0) -> bytes:
+    return _box(box_type, struct.pack(">B3s", version, b"\0\0\0") + payload)
+
+
+def _avcc(sps: bytes) -> bytes:
+    """avcC con un SPS (cabecera NAL 0x67) y ningún PPS"""
+    return _box(b"avcC", bytes([1, sps[0], 0, sps[2], 0xFF, 0xE1]) + struct.pack(">H", len(sps) + 1)
+                + b"\x67" + sps + b"\x00")
+
+
+def _stts(*duraciones: int) -> bytes:
+    entradas = b"".join(struct.pack(">II", 10, duracion) for duracion in duraciones)
+    return _full_box(b"stts", struct.pack(">I", len(duraciones)) + entradas)
+
+
+def _video_trak(width: int, height: int, codec: bytes = b"avc1", entry_boxes: bytes = b"",
+                stbl_boxes: bytes = b"") -> bytes:
+    tkhd = _full_box(b"tkhd", b"\0" * 20 + b"\0" * 52 + struct.pack(">II", width << 16, height << 16))
+    hdlr = _full_box(b"hdlr", b"\0" * 4 + b"vide" + b"\0" * 12)
+    entry = _box(codec, b"\0" * 24 + struct.pack(">HH", width, height) + b"\0" * 50 + entry_boxes)
+    stsd = _full_box(b"stsd", struct.pack(">I", 1) + entry)
+    minf = _box(b"minf", _box(b"stbl", stsd + stbl_boxes))
+    return _box(b"trak", tkhd + _box(b"mdia", hdlr + minf))
+
+
+def build_mp4(duration: int = 10, width: int = 1280, height: int = 720,
+              faststart: bool = True, brand: bytes = b"isom") -> bytes:
+    ftyp = _box(b"ftyp", brand + struct.pack(">I", 512) + b"isomavc1")
+    mvhd = _full_box(b"mvhd", struct.pack(">IIII", 0, 0, 1000, duration * 1000) + b"\0" * 80)
+    moov = _box(b"moov", mvhd + _video_trak(width, height))
+    mdat = _box(b"mdat", b"\x00" * 4096)
+    return ftyp + moov + mdat if faststart else ftyp + mdat + moov
+
+
+class TestMp4Parser:
+    """Tests del lector de MP4 en Python puro"""
+
+    @pytest.mark.parametrize("faststart", [True, False])
+    def test_probe_file(self, tmp_path, faststart):
+        """Test que se obtienen duración, resolución y códec sin ffprobe"""
+        path = tmp_path / "video.mp4"
+        path.write_bytes(build_mp4(duration=42, width=1920, height=1080, faststart=faststart))
+
+        info = probe_file(str(path))
+        assert info["duracion"] == 42
+        assert info["resolucion"] == "1920x1080"
+        assert info["codec"] == "h264"
+        assert info["brand"] == "isom"
+
+    def test_probe_h264_format(self):
+        """Test que se leen perfil y formato de píxel del SPS, la relación de aspecto y la cadencia"""
+        from app.core.mp4 import parse_moov
+
+        def probar(trak):
+            mvhd = _full_box(b"mvhd", struct.pack(">IIII", 0, 0, 1000, 10000) + b"\0" * 80)
+            return parse_moov(mvhd + trak)
+
+        # High, 8 bits 4:2:0: sps_id=0, croma=1, profundidad 8/8
+        info = probar(_video_trak(1280, 720, entry_boxes=_avcc(bytes([100, 0, 31, 0b10101100])),
+                                  stbl_boxes=_stts(512, 512, 300)))
+        assert (info["perfil"], info["pix_fmt"], info["sar"], info["fps_variable"]) == (100, "yuv420p", "1:1", False)
+
+        # High 10: profundidad de luma 10 bits
+        info = probar(_video_trak(1280, 720, entry_boxes=_avcc(bytes([110, 0, 31, 0b10100110, 0b11000000]))))
+        assert (info["perfil"], info["pix_fmt"]) == (110, "yuv420p10le")
+
+        # Main (sin croma en el SPS), píxel no cuadrado y cadencia variable
+        info = probar(_video_trak(1280, 720, entry_boxes=_avcc(bytes([77, 0, 31, 0b10000000]))
+                                  + _box(b"pasp", struct.pack(">II", 4, 3)), stbl_boxes=_stts(512, 400, 512)))
+        assert (info["perfil"], info["pix_fmt"], info["sar"], info["fps_variable"]) == (77, "yuv420p", "4:3", True)
+
+    def test_reject_non_mp4(self, tmp_path):
+        """Test que un archivo sin ftyp se rechaza"""
+        path = tmp_path / "video.mp4"
+        path.write_bytes(b"RIFF" + b"\0" * 100)
+        with pytest.raises(Mp4Error):
+            probe_file(str(path))
+
+    def test_reject_unknown_brand(self):
+        """Test que una marca fuera de la familia MP4 se rechaza"""
+        with pytest.raises(Mp4Error):
+            parse_ftyp(b"qt  " + b"\0" * 4 + b"qt  ")
+
+    def test_stream_inspector_small_chunks(self):
+        """Test que el inspector obtiene los metadatos desde bloques pequeños"""
+        data = build_mp4(duration=15, faststart=False)
+        inspector = Mp4StreamInspector()
+        for i in range(0, len(data), 7):
+            inspector.feed(data[i:i + 7])
+        assert inspector.info["duracion"] == 15
+        assert inspector.info["resolucion"] == "1280x720"
+
+    def test_stream_inspector_faststart_detects_early(self):
+        """Test que con moov al inicio los metadatos están antes de recibir mdat"""
+        data = build_mp4(duration=600)
+        inspector = Mp4StreamInspector()
+        info = inspector.feed(data[:len(data) - 4096])
+        assert info is not None
+        assert info["duracion"] == 600
+
+    def test_stream_inspector_rejects_first_bytes(self):
+        """Test que el inspector rechaza con los primeros bytes si no es MP4"""
+        inspector = Mp4StreamInspector()
+        with pytest.raises(Mp4Error):
+            inspector.feed(b"\x00\x00\x00\x10wide" + b"\0" * 8)
+
+    def test_stream_validation_honours_zero_duration(self):
+        """Test que max_duration=0 no cae a la duración máxima por defecto"""
+        import asyncio
+        from fastapi import HTTPException
+        from app.core.storage import inspect_mp4_stream
+
+        async def bloques():
+            yield build_mp4(duration=1)
+
+        async def consumir(iterador):
+            return [bloque async for bloque in iterador]
+
+        with pytest.raises(HTTPException):
+            asyncio.run(consumir(inspect_mp4_stream(bloques(), Mp4StreamInspector(), max_duration=0)))
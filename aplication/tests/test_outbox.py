@@ -0,0 +1,106 @@
+from types import SimpleNamespace
+
+from app.config.settings import settings
+from app.workers.outbox import outbox_entry
+from app.workers import reaper_tasks
+from app.workers.reaper_tasks import _requeue_or_fail, _lost_upload
+
+
+class _Session:
+    def __init__(self):
+        self.agregados = []
+
+    def add(self, obj):
+        self.agregados.append(obj)
+
+
+class _Broker:
+    """Cola del transporte Redis con mensajes serializados como los de Celery"""
+
+    def __init__(self, mensajes=(), pendientes=None):
+        self.mensajes = list(mensajes)
+        self.pendientes = len(self.mensajes) if pendientes is None else pendientes
+
+    def llen(self, cola):
+        return self.pendientes
+
+    def lrange(self, cola, inicio, fin):
+        return self.mensajes
+
+    def hvals(self, clave):
+        return []
+
+
+def _video(estado="procesando"):
+    return SimpleNamespace(id="v1", estado=estado, duracion_original=10, resolucion_original="1280x720")
+
+
+def _procesamiento(reencolados=0):
+    return SimpleNamespace(estado="procesando", tarea_id="t0", fecha_fin=None, error_message=None,
+                           parametros={"reencolados": reencolados})
+
+
+class TestOutbox:
+    """Tests de la outbox y de la recuperación de videos atascados"""
+
+    def test_entry_id_is_task_id(self):
+        """Test que la fila lleva todo lo necesario para publicar la tarea"""
+        entrada = outbox_entry("tarea.x", "cola", ["v1"], {"clase": "bulk"}, video_id="v1")
+        assert entrada.id and entrada.fecha_envio is None
+        assert (entrada.tarea, entrada.cola, entrada.argumentos) == ("tarea.x", "cola", ["v1"])
+
+    def test_stuck_video_is_requeued_through_outbox(self):
+        """Test que un video atascado vuelve a 'subido' con una nueva tarea en la outbox"""
+        session, video, procesamiento = _Session(), _video(), _procesamiento()
+
+        assert _requeue_or_fail(session, video, procesamiento) == "reencolado"
+        entrada = session.agregados[0]
+        assert procesamiento.tarea_id == entrada.id
+        assert procesamiento.estado == "pendiente"
+        assert procesamiento.parametros["reencolados"] == 1
+        assert video.estado == "subido"
+        assert entrada.cola == settings.VIDEO_EXPRESS_QUEUE
+
+    def test_gives_up_after_max_requeues(self):
+        """Test que tras el máximo de reencolados se marca como error"""
+        session, video = _Session(), _video()
+        procesamiento = _procesamiento(settings.STUCK_MAX_REQUEUES)
+
+        assert _requeue_or_fail(session, video, procesamiento) == "fallado"
+        assert procesamiento.estado == "fallado"
+        assert video.estado == "error"
+        assert session.agregados == []
+
+    def test_stuck_reprocess_keeps_published_video(self):
+        """Test que un reprocesamiento atascado no despublica el video"""
+        session, video = _Session(), _video("procesado")
+
+        _requeue_or_fail(session, video, _procesamiento())
+        assert video.estado == "procesado"
+        assert session.agregados[0].cola == settings.REPROCESS_QUEUE
+        assert session.agregados[0].opciones["reprocesamiento"] is True
+
+    def test_upload_still_waiting_in_queue_is_not_requeued(self, monkeypatch):
+        """Test que un video enviado hace mucho pero aún en la cola no se da por perdido"""
+        monkeypatch.setattr(reaper_tasks, "_task_state", lambda task_id: "PENDING")
+        video, procesamiento = _video("subido"), _procesamiento()
+        tarea = SimpleNamespace(cola=settings.VIDEO_BULK_QUEUE)
+        mensaje = b'{"headers": {"id": "t0", "task": "process_video_task"}, "body": "..."}'
+
+        assert not _lost_upload(_Broker([b"{}", mensaje]), video, procesamiento, tarea, {})
+        assert _lost_upload(_Broker([b"{}"]), video, procesamiento, tarea, {})
+
+    def test_saturated_queue_skips_upload_rule(self, monkeypatch):
+        """Test que con la cola por encima del umbral no se reencola aunque no se vea el mensaje"""
+        monkeypatch.setattr(reaper_tasks, "_task_state", lambda task_id: "PENDING")
+        broker = _Broker(pendientes=settings.STUCK_MAX_BACKLOG + 1)
+        tarea = SimpleNamespace(cola=settings.VIDEO_BULK_QUEUE)
+
+        assert not _lost_upload(broker, _video("subido"), _procesamiento(), tarea, {})
+
+    def test_started_task_is_not_lost(self, monkeypatch):
+        """Test que una tarea que el backend registra en curso no se reencola"""
+        monkeypatch.setattr(reaper_tasks, "_task_state", lambda task_id: "STARTED")
+        tarea = SimpleNamespace(cola=settings.VIDEO_BULK_QUEUE)
+
+        assert not _lost_upload(_Broker(), _video("subido"), _procesamiento(), tarea, {})
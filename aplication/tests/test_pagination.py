@@ -0,0 +1,71 @@
+import asyncio
+import pytest
+from unittest.mock import MagicMock, AsyncMock
+
+from app.core.pagination import encode_cursor, decode_cursor, InvalidCursor
+
+
+class TestCursor:
+    """Tests de los cursores opacos de paginación"""
+
+    def test_roundtrip(self):
+        """Test que el cursor conserva la clave de orden y es seguro en una URL"""
+        cursor = encode_cursor("2024-05-01T10:00:00", "video-9")
+        assert "=" not in cursor and "+" not in cursor and "/" not in cursor
+        assert decode_cursor(cursor, 2) == ["2024-05-01T10:00:00", "video-9"]
+
+    def test_invalid_cursor(self):
+        """Test que un cursor alterado o de otro listado se rechaza"""
+        with pytest.raises(InvalidCursor):
+            decode_cursor("no-es-un-cursor", 2)
+        with pytest.raises(InvalidCursor):
+            decode_cursor(encode_cursor(1, "j1", "extra"), 2)
+
+
+class TestRankingsCursor:
+    """Tests del keyset (votos, jugador) de los rankings"""
+
+    def _service(self, db=None):
+        from app.services.vote_service import VoteService
+        return VoteService(db or MagicMock())
+
+    def test_full_last_page_has_no_cursor(self):
+        """Test que solo la fila extra genera cursor; una última página exacta no lo tiene"""
+        service = self._service()
+        filas = [{"votes": v, "player_id": f"j{i}", "position": i} for i, v in enumerate((9, 7, 7), 1)]
+
+        assert service._split_page(filas[:2], 2) == (filas[:2], None)
+        pagina, siguiente = service._split_page(filas, 2)
+        assert pagina == filas[:2]
+        assert decode_cursor(siguiente, 2) == [7, "j2"]
+
+    def test_table_path_filters_by_votes_and_player(self):
+        """Test que el snapshot pagina por (puntuacion_total, jugador_id) y no por posición"""
+        db = MagicMock()
+        version = MagicMock(scalar_one_or_none=MagicMock(return_value=1))
+        filas = MagicMock(all=MagicMock(return_value=[]))
+        db.execute = AsyncMock(side_effect=[version, filas])
+
+        asyncio.run(self._service(db)._calculate_rankings_from_table("c1", 0, 3, (7, "j5")))
+
+        sql = str(db.execute.call_args_list[1].args[0])
+        assert '"Ranking".puntuacion_total < :puntuacion_total_1' in sql
+        assert 'ORDER BY "Ranking".puntuacion_total DESC, "Ranking".jugador_id DESC' in sql
+        assert "OFFSET" not in sql
+
+    def test_leaderboard_resumes_after_key(self):
+        """Test que Redis reanuda tras la clave aunque el jugador haya cambiado de puntaje"""
+        from app.core.leaderboard import Leaderboard
+
+        client = MagicMock()
+        board = Leaderboard(client, "1999-Q1")
+
+        client.zscore.return_value = 7.0
+        client.zrevrank.return_value = 3
+        assert board._offset_after("k", 7, "j5") == 4
+
+        # Con otro puntaje: 2 con más votos y los empatados con id mayor (j9, j6)
+        client.zscore.return_value = 8.0
+        client.zcount.return_value = 2
+        client.zrevrangebyscore.return_value = [b"j9", b"j6", b"j3"]
+        assert board._offset_after("k", 7, "j5") == 4
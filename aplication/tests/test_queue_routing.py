@@ -0,0 +1,25 @@
+from app.config.settings import settings
+from app.workers.queue_routing import classify_job, percentile, EXPRESS, BULK
+
+
+class TestQueueRouting:
+    """Tests de la clasificación de trabajos por costo"""
+
+    def test_short_clip_goes_express(self):
+        """Test que un clip corto de baja resolución va a la cola express"""
+        assert classify_job(8, "1280x720") == (EXPRESS, settings.VIDEO_EXPRESS_QUEUE)
+
+    def test_long_high_resolution_goes_bulk(self):
+        """Test que un original largo en 1080p va a la cola bulk"""
+        assert classify_job(300, "1920x1080") == (BULK, settings.VIDEO_BULK_QUEUE)
+
+    def test_cost_capped_at_target_duration(self):
+        """Test que solo cuenta la duración que se procesa"""
+        assert classify_job(300, "640x360") == classify_job(settings.TARGET_DURATION, "640x360")
+
+    def test_percentile(self):
+        """Test del percentil por rango más cercano"""
+        valores = list(range(1, 101))
+        assert percentile(valores, 95) == 95
+        assert percentile(valores, 50) == 50
+        assert percentile([], 95) is None
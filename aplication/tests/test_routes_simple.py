@@ -78,4 +78,12 @@ class TestPublicRoutes:
         """Test obtener rankings"""
         response = client.get("/api/public/rankings")
         assert response.status_code == status.HTTP_200_OK
-        assert isinstance(response.json(), list)
\ No newline at end of file
+        assert isinstance(response.json(), list)
+
+    def test_public_pagination_limits(self, client):
+        """Test que skip tiene tope y un cursor inválido se rechaza antes de consultar"""
+        response = client.get("/api/public/videos", params={"skip": 10 ** 6})
+        assert response.status_code == status.HTTP_422_UNPROCESSABLE_ENTITY
+
+        response = client.get("/api/public/videos", params={"cursor": "no-es-un-cursor"})
+        assert response.status_code == status.HTTP_400_BAD_REQUEST
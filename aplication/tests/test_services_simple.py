@@ -1,5 +1,5 @@
 import pytest
-from unittest.mock import AsyncMock, MagicMock
+from unittest.mock import AsyncMock, MagicMock, patch
 import uuid
 from datetime import date
 
@@ -53,4 +53,113 @@ class TestSecurityCore:
     def test_invalid_token_returns_none(self):
         """Test que token inválido retorna None"""
         result = security_core.verify_token("invalid-token")
-        assert result is None
\ No newline at end of file
+        assert result is None
+
+
+class TestRankingServiceSetBased:
+    """Tests de la reconstrucción de rankings basada en conjuntos"""
+
+    def _run(self, rowcount):
+        import asyncio
+        from sqlalchemy.dialects import mysql
+        from app.services.ranking_service import RankingService
+
+        db = MagicMock()
+        db.execute = AsyncMock(return_value=MagicMock(rowcount=rowcount, all=MagicMock(return_value=[])))
+        db.rollback = AsyncMock()
+        db.commit = AsyncMock()
+
+        result = asyncio.run(RankingService(db, redis_client=MagicMock()).update_rankings("sql"))
+        sentencias = [str(call.args[0].compile(dialect=mysql.dialect())) for call in db.execute.call_args_list]
+        return db, result, sentencias
+
+    def test_rebuild_is_single_insert_select(self):
+        """Test que el ranking se calcula e inserta en una sola sentencia, hasta la marca de agua de votos"""
+        db, result, sentencias = self._run(rowcount=3)
+
+        assert sentencias[0].startswith("INSERT INTO `Ranking`")
+        assert "rank() OVER" in sentencias[0]
+        assert "PARTITION BY `Jugador`.ciudad_id" in sentencias[0]
+        assert "`Voto`.fecha_voto <= " in sentencias[0]
+
+    def test_rebuild_without_votes_publishes_empty_snapshot(self):
+        """Test que sin votos se publica un snapshot vacío y se reconcilia Redis, sin servir el anterior"""
+        with patch("app.services.ranking_service.Leaderboard") as leaderboard:
+            db, result, sentencias = self._run(rowcount=0)
+
+        assert len(sentencias) == 2
+        assert sentencias[1].startswith("INSERT INTO `RankingActivo`")
+        db.commit.assert_awaited_once()
+        leaderboard.return_value.rebuild.assert_called_once()
+        assert leaderboard.return_value.rebuild.call_args.args[0] == []
+        assert result == {"message": "No hay datos para generar rankings"}
+
+    def test_rebuild_publishes_new_snapshot_without_delete(self):
+        """Test que el snapshot nuevo se publica con el puntero en la misma transacción, sin borrar el anterior"""
+        db, result, sentencias = self._run(rowcount=3)
+
+        assert not any(sentencia.startswith("DELETE") for sentencia in sentencias)
+        assert sentencias[1].startswith("INSERT INTO `RankingActivo`")
+        assert "ON DUPLICATE KEY UPDATE" in sentencias[1]
+        db.commit.assert_awaited_once()
+        assert result["registros_insertados"] == 3
+
+
+class TestRankingTies:
+    """Tests de la regla de posiciones con empates, común a todos los caminos"""
+
+    def test_competition_rank(self):
+        """Test que los empates comparten posición y la siguiente salta, por grupo"""
+        from app.core.leaderboard import competition_rank
+
+        estado = {}
+        assert [competition_rank(estado, None, v) for v in (9, 7, 7, 5)] == [1, 2, 2, 4]
+        assert [competition_rank(estado, "c1", v) for v in (7, 7)] == [1, 1]
+
+    def test_orm_mode_matches_rank(self):
+        """Test que el modo orm asigna las mismas posiciones que RANK() del modo sql"""
+        import asyncio
+        from app.services.ranking_service import RankingService
+
+        filas = [
+            ("j4", "c1", "A", "A", "C1", 9),
+            ("j3", "c2", "B", "B", "C2", 7),
+            ("j2", "c1", "C", "C", "C1", 7),
+            ("j1", "c1", "D", "D", "C1", 5),
+        ]
+        db = MagicMock()
+        db.execute = AsyncMock(return_value=MagicMock(all=MagicMock(return_value=filas)))
+        db.commit = AsyncMock()
+        db.rollback = AsyncMock()
+
+        asyncio.run(RankingService(db, redis_client=MagicMock()).update_rankings("orm"))
+
+        rankings = {call.args[0].jugador_id: call.args[0] for call in db.add.call_args_list}
+        assert [rankings[j].posicion for j in ("j4", "j3", "j2", "j1")] == [1, 2, 2, 4]
+        assert [rankings[j].posicion_ciudad for j in ("j4", "j2", "j1")] == [1, 2, 3]
+        assert rankings["j3"].posicion_ciudad == 1
+
+
+class TestCityCatalog:
+    """Tests de la resolución del filtro de ciudad"""
+
+    def test_resolve_by_id_or_exact_slug(self):
+        """Test que la ciudad se resuelve por id o slug exacto, sin coincidencias parciales"""
+        import asyncio
+        import json
+        from app.services.city_catalog_service import CityCatalogService, city_slug
+
+        assert city_slug("Santa Marta") == "santa-marta"
+        assert city_slug("  Bogotá ") == "bogota"
+
+        redis_client = MagicMock()
+        redis_client.get.return_value = json.dumps({
+            "c1": {"nombre": "Bogotá", "slug": "bogota"},
+            "c2": {"nombre": "Santa Marta", "slug": "santa-marta"},
+        })
+        catalogo = CityCatalogService(MagicMock(), redis_client)
+
+        assert asyncio.run(catalogo.resolve("c2")) == "c2"
+        assert asyncio.run(catalogo.resolve("santa-marta")) == "c2"
+        assert asyncio.run(catalogo.resolve("Bogotá")) == "c1"
+        assert asyncio.run(catalogo.resolve("bog")) is None
@@ -0,0 +1,346 @@
+import asyncio
+import io
+import os
+import pytest
+from fastapi import HTTPException, UploadFile, status
+
+from app.core.storage import iter_upload_file, write_stream_to_file
+from app.core.streaming import parse_range, stream_response
+from app.core.storage_backend import (
+    StorageBackend, LocalStorageBackend, S3StorageBackend, key_from_reference, original_key
+)
+
+
+def _upload(content: bytes) -> UploadFile:
+    return UploadFile(file=io.BytesIO(content), filename="video.mp4")
+
+
+async def _chunks(*partes):
+    for parte in partes:
+        yield parte
+
+
+class _Redis:
+    """Lo mínimo de Redis que usan las subidas directas, en memoria"""
+
+    def __init__(self):
+        self.datos = {}
+
+    def hset(self, key, mapping):
+        self.datos.setdefault(key, {}).update({k: str(v) for k, v in mapping.items()})
+
+    def hgetall(self, key):
+        return dict(self.datos.get(key, {}))
+
+    def expire(self, key, segundos):
+        pass
+
+    def exists(self, key):
+        return int(key in self.datos)
+
+    def get(self, key):
+        return self.datos.get(key)
+
+    def set(self, key, valor, nx=False, ex=None, keepttl=False):
+        if nx and key in self.datos:
+            return None
+        self.datos[key] = valor
+        return True
+
+    def rename(self, origen, destino):
+        import redis
+        if origen not in self.datos:
+            raise redis.ResponseError("no such key")
+        self.datos[destino] = self.datos.pop(origen)
+
+    def delete(self, *keys):
+        return sum(self.datos.pop(key, None) is not None for key in keys)
+
+
+class TestStreamingUpload:
+    """Tests de escritura de uploads por bloques"""
+
+    def test_iter_upload_file_respects_chunk_size(self):
+        """Test que el archivo se lee en bloques de tamaño fijo"""
+        async def leer():
+            return [chunk async for chunk in iter_upload_file(_upload(b"x" * 10), chunk_size=4)]
+
+        chunks = asyncio.run(leer())
+        assert [len(chunk) for chunk in chunks] == [4, 4, 2]
+
+    def test_write_stream_to_file(self, tmp_path):
+        """Test que el contenido se escribe completo y sin archivo temporal"""
+        destino = tmp_path / "videos" / "video.mp4"
+        total = asyncio.run(write_stream_to_file(
+            iter_upload_file(_upload(b"abc" * 1000), chunk_size=64), str(destino), max_size=10_000
+        ))
+        assert total == 3000
+        assert destino.read_bytes() == b"abc" * 1000
+        assert not os.path.exists(f"{destino}.part")
+
+    def test_write_stream_to_file_too_large(self, tmp_path):
+        """Test que se aborta con 413 al superar el tamaño máximo"""
+        destino = tmp_path / "video.mp4"
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(write_stream_to_file(
+                iter_upload_file(_upload(b"x" * 100), chunk_size=10), str(destino), max_size=50
+            ))
+        assert exc_info.value.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+        assert not destino.exists()
+        assert not os.path.exists(f"{destino}.part")
+
+    def test_write_stream_to_file_zero_limit(self, tmp_path):
+        """Test que max_size=0 se respeta y no cae al límite por defecto"""
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(write_stream_to_file(
+                iter_upload_file(_upload(b"x"), chunk_size=10), str(tmp_path / "video.mp4"), max_size=0
+            ))
+        assert exc_info.value.status_code == status.HTTP_413_REQUEST_ENTITY_TOO_LARGE
+
+
+class TestLocalStorageBackend:
+    """Tests del backend de almacenamiento local"""
+
+    def test_put_and_read_stream(self, tmp_path):
+        """Test que se guarda y lee un objeto completo y por rangos"""
+        storage = LocalStorageBackend(root=str(tmp_path), public_url="/storage")
+        total = storage.put_stream("processed/videos/a_final.mp4", iter([b"0123", b"456789"]))
+
+        assert total == 10
+        assert storage.exists("processed/videos/a_final.mp4")
+        assert storage.size("processed/videos/a_final.mp4") == 10
+        assert b"".join(storage.get_stream("processed/videos/a_final.mp4")) == b"0123456789"
+        assert b"".join(storage.open_range("processed/videos/a_final.mp4", 2, 5)) == b"2345"
+        assert b"".join(storage.open_range("processed/videos/a_final.mp4", 7)) == b"789"
+        assert list(storage.open_range("processed/videos/a_final.mp4", 0, 4, chunk_size=2)) == [b"01", b"23", b"4"]
+        assert storage.url_for("processed/videos/a_final.mp4") == "/storage/processed/videos/a_final.mp4"
+
+        storage.delete("processed/videos/a_final.mp4")
+        assert not storage.exists("processed/videos/a_final.mp4")
+
+    def test_put_file_moves_source(self, tmp_path):
+        """Test que put_file con remove_source mueve el archivo"""
+        storage = LocalStorageBackend(root=str(tmp_path / "storage"), public_url="/storage")
+        source = tmp_path / "staging.mp4"
+        source.write_bytes(b"video")
+
+        storage.put_file(original_key("abc"), str(source), remove_source=True)
+        assert not source.exists()
+        assert b"".join(storage.get_stream("uploads/videos/originales/abc.mp4")) == b"video"
+
+    def test_rejects_keys_outside_root(self, tmp_path):
+        """Test que una clave no puede salir de la raíz del almacenamiento"""
+        storage = LocalStorageBackend(root=str(tmp_path), public_url="/storage")
+        with pytest.raises(ValueError):
+            storage.path_for("../etc/passwd")
+
+    def test_presigned_put_signature(self, tmp_path):
+        """Test que la firma local de subida directa solo vale para su clave y vigencia"""
+        storage = LocalStorageBackend(root=str(tmp_path), public_url="/storage")
+        target = storage.presign_put(original_key("abc"), 60)
+        assert target["method"] == "PUT"
+        assert target["url"].startswith("/api/storage/uploads/videos/originales/abc.mp4?")
+
+        signature = storage.sign_put(original_key("abc"), 4102444800)
+        assert storage.verify_put_signature(original_key("abc"), 4102444800, signature)
+        assert not storage.verify_put_signature(original_key("otro"), 4102444800, signature)
+        assert not storage.verify_put_signature(original_key("abc"), 1, storage.sign_put(original_key("abc"), 1))
+
+    def test_backend_interface_is_abstract(self):
+        """Test que un backend incompleto falla al instanciarse y no en la primera llamada"""
+        class Incompleto(StorageBackend):
+            def exists(self, key):
+                return False
+
+        with pytest.raises(TypeError):
+            Incompleto()
+
+    def test_key_from_legacy_path(self):
+        """Test que las rutas absolutas antiguas se normalizan a claves"""
+        assert key_from_reference("/storage/uploads/videos/originales/x.mp4") == "uploads/videos/originales/x.mp4"
+        assert key_from_reference("processed/videos/x_final.mp4") == "processed/videos/x_final.mp4"
+
+
+class TestDirectUploadTarget:
+    """Tests del destino firmado de un solo uso del backend local"""
+
+    def _service(self, tmp_path, monkeypatch):
+        from unittest.mock import MagicMock
+        from app.config.settings import settings
+        from app.services.direct_upload_service import DirectUploadService
+
+        monkeypatch.setattr(settings, "STORAGE_STAGING_DIR", str(tmp_path / "staging"))
+        service = DirectUploadService(MagicMock())
+        service.storage = LocalStorageBackend(root=str(tmp_path / "storage"), public_url="/storage")
+        service.redis_client = _Redis()
+        service.redis_client.hset(service._pending_key("abc"), mapping={
+            "user_id": "u1", "storage_key": original_key("abc"), "total_size": 5
+        })
+        return service
+
+    def test_signed_put_is_single_use(self, tmp_path, monkeypatch):
+        """Test que la firma no sirve para sobrescribir el archivo ya enviado"""
+        service = self._service(tmp_path, monkeypatch)
+        asyncio.run(service.receive_signed_upload(original_key("abc"), _chunks(b"video")))
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(service.receive_signed_upload(original_key("abc"), _chunks(b"otro!")))
+        assert exc_info.value.status_code == status.HTTP_409_CONFLICT
+        assert b"".join(service.storage.get_stream(original_key("abc"))) == b"video"
+
+    def test_no_put_after_confirmation_starts(self, tmp_path, monkeypatch):
+        """Test que la subida reclamada por la confirmación ya no acepta escrituras"""
+        service = self._service(tmp_path, monkeypatch)
+        service.redis_client.rename(service._pending_key("abc"), service._claimed_key("abc"))
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(service.receive_signed_upload(original_key("abc"), _chunks(b"video")))
+        assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
+        assert not service.storage.exists(original_key("abc"))
+
+    def test_confirmation_waits_for_write_in_progress(self, tmp_path, monkeypatch):
+        """Test que no se confirma mientras un envío sigue escribiendo, y la subida sigue pendiente"""
+        from app.services.direct_upload_service import PUT_WRITING
+
+        service = self._service(tmp_path, monkeypatch)
+        service.storage.put_stream(original_key("abc"), iter([b"video"]))
+        service.redis_client.set(service._put_key("abc"), PUT_WRITING)
+
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(service.complete_upload("u1", "abc"))
+        assert exc_info.value.status_code == status.HTTP_409_CONFLICT
+        assert service.redis_client.exists(service._pending_key("abc"))
+
+
+@pytest.mark.integration
+@pytest.mark.skipif(not os.getenv("S3_TEST_ENDPOINT_URL"), reason="Requiere un servicio compatible con S3 (p. ej. MinIO)")
+class TestS3StorageBackend:
+    """Tests del backend S3 contra un servicio local compatible (docker compose up minio)"""
+
+    def test_multipart_roundtrip(self):
+        """Test de subida multipart concurrente y lectura por rangos"""
+        pytest.importorskip("boto3")
+        bucket = os.getenv("S3_TEST_BUCKET", "anb-tests")
+        storage = S3StorageBackend(
+            bucket=bucket,
+            endpoint_url=os.getenv("S3_TEST_ENDPOINT_URL"),
+            region="us-east-1",
+            access_key_id=os.getenv("S3_TEST_ACCESS_KEY_ID", "minioadmin"),
+            secret_access_key=os.getenv("S3_TEST_SECRET_ACCESS_KEY", "minioadmin"),
+            part_size=5 * 1024 * 1024,
+            max_concurrency=3,
+        )
+        try:
+            storage.client.create_bucket(Bucket=bucket)
+        except Exception:
+            pass
+
+        content = os.urandom(12 * 1024 * 1024 + 123)
+        chunks = (content[i:i + 1024 * 1024] for i in range(0, len(content), 1024 * 1024))
+        assert storage.put_stream("tests/multipart.bin", chunks) == len(content)
+        assert storage.size("tests/multipart.bin") == len(content)
+        assert b"".join(storage.open_range("tests/multipart.bin", 100, 199)) == content[100:200]
+        assert b"".join(storage.get_stream("tests/multipart.bin")) == content
+
+        storage.delete("tests/multipart.bin")
+        assert not storage.exists("tests/multipart.bin")
+
+
+class TestStreaming:
+    """Tests de la entrega con HTTP Range"""
+
+    def test_parse_range(self):
+        """Test de rangos abiertos, cerrados y de sufijo"""
+        assert parse_range(None, 100) is None
+        assert parse_range("bytes=0-9", 100) == (0, 9)
+        assert parse_range("bytes=90-", 100) == (90, 99)
+        assert parse_range("bytes=-10", 100) == (90, 99)
+        assert parse_range("bytes=50-500", 100) == (50, 99)
+
+        with pytest.raises(HTTPException) as exc_info:
+            parse_range("bytes=100-", 100)
+        assert exc_info.value.status_code == status.HTTP_416_REQUESTED_RANGE_NOT_SATISFIABLE
+
+    def test_partial_content_from_local_backend(self, tmp_path):
+        """Test que un rango se responde con 206 y Content-Range"""
+        storage = LocalStorageBackend(root=str(tmp_path), public_url="/storage")
+        storage.put_stream("processed/videos/a_final.mp4", [b"0123456789"])
+
+        response = stream_response(storage, "processed/videos/a_final.mp4", "bytes=2-5")
+
+        assert response.status_code == status.HTTP_206_PARTIAL_CONTENT
+        assert response.headers["content-range"] == "bytes 2-5/10"
+        assert response.headers["content-length"] == "4"
+        # Las claves procesadas se reescriben al reprocesar: nunca se cachean como inmutables
+        assert response.headers["cache-control"] == "private, no-cache"
+
+    def test_missing_file_is_not_found(self, tmp_path):
+        """Test que un archivo ausente en el almacenamiento responde 404 y no 500"""
+        storage = LocalStorageBackend(root=str(tmp_path), public_url="/storage")
+        with pytest.raises(HTTPException) as exc_info:
+            stream_response(storage, "processed/videos/no_final.mp4")
+        assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
+
+    def _video_service(self, **campos):
+        from unittest.mock import AsyncMock, MagicMock
+        from app.services.video_service import VideoService
+
+        video = MagicMock(
+            id="v1", jugador_id="j1", estado="procesado", visibilidad="publico",
+            archivo_procesado="processed/videos/v1_final.mp4", archivo_hls="processed/hls/v1/master.m3u8",
+            archivo_poster="processed/videos/v1_poster.jpg", archivo_sprite="processed/videos/v1_sprite.jpg",
+            archivo_vtt="processed/videos/v1_sprite.vtt"
+        )
+        for campo, valor in campos.items():
+            setattr(video, campo, valor)
+        db = MagicMock()
+        db.get = AsyncMock(return_value=video)
+        return VideoService(db)
+
+    def test_assets_go_through_access_control(self):
+        """Test que los archivos derivados se resuelven solo dentro del video y con su visibilidad"""
+        service = self._video_service()
+        assert asyncio.run(service.get_asset_key(None, "v1", "v1_poster.jpg")) == "processed/videos/v1_poster.jpg"
+        assert asyncio.run(service.get_asset_key(None, "v1", "hls/v0_001.ts")) == "processed/hls/v1/v0_001.ts"
+        for nombre in ("hls/../../videos/v2_final.mp4", "v2_poster.jpg", "hls/.."):
+            with pytest.raises(HTTPException) as exc_info:
+                asyncio.run(service.get_asset_key(None, "v1", nombre))
+            assert exc_info.value.status_code == status.HTTP_404_NOT_FOUND
+
+        privado = self._video_service(visibilidad="privado")
+        with pytest.raises(HTTPException) as exc_info:
+            asyncio.run(privado.get_asset_key(None, "v1", "v1_poster.jpg"))
+        assert exc_info.value.status_code == status.HTTP_401_UNAUTHORIZED
+
+
+class TestUploadSessionCompletion:
+    """Tests de la finalización de subidas reanudables entre réplicas"""
+
+    def _service(self, *lecturas):
+        from unittest.mock import MagicMock
+        from app.services.upload_service import UploadSessionService
+
+        service = UploadSessionService(MagicMock())
+        service.redis_client = MagicMock()
+        service.redis_client.hgetall.side_effect = list(lecturas)
+        service.redis_client.set.return_value = True
+        service._assemble_chunks = MagicMock()
+        return service
+
+    def test_session_finalized_by_other_replica_is_not_registered_again(self):
+        """Test que la sesión se relee bajo el lock y no se ensambla dos veces"""
+        sesion = {"user_id": "u1", "total_chunks": "1", "total_size": "5"}
+        service = self._service(sesion, {"0": "5"}, dict(sesion, task_id="t1"))
+
+        response = asyncio.run(service.complete_session("u1", "s1"))
+
+        assert response.task_id == "t1"
+        service._assemble_chunks.assert_not_called()
+        service.redis_client.delete.assert_called_once_with(f"{service._session_key('s1')}:lock")
+
+    def test_finalized_session_returns_same_video(self):
+        """Test que reintentar la finalización devuelve el mismo video sin tomar el lock"""
+        service = self._service({"user_id": "u1", "total_chunks": "1", "total_size": "5", "task_id": "t1"})
+
+        assert asyncio.run(service.complete_session("u1", "s1")).task_id == "t1"
+        service.redis_client.set.assert_not_called()
@@ -0,0 +1,74 @@
+import os
+
+from app.workers.storage_gc import StorageGarbageCollector, REFERENCIA, HLS, TEMPORAL
+
+
+def _archivo(ruta, contenido=b"x" * 10, antiguo=True):
+    ruta.parent.mkdir(parents=True, exist_ok=True)
+    ruta.write_bytes(contenido)
+    if antiguo:
+        os.utime(ruta, (1, 1))
+    return ruta
+
+
+def _collector(tmp_path, vivas=(), batch_size=100):
+    consultas = []
+
+    def referenced_keys(ids, claves):
+        consultas.append((set(ids), set(claves)))
+        return set(vivas) & claves
+
+    targets = [
+        ("originales", str(tmp_path / "uploads/videos/originales"), REFERENCIA),
+        ("hls", str(tmp_path / "processed/hls"), HLS),
+        ("staging", str(tmp_path / "uploads/tmp"), TEMPORAL),
+    ]
+    collector = StorageGarbageCollector(
+        targets, str(tmp_path), referenced_keys,
+        active_session=lambda _: False, active_lease=lambda _: False,
+        grace=3600, batch_size=batch_size, dry_run=False
+    )
+    return collector, consultas
+
+
+class TestStorageGarbageCollector:
+    """Tests del recolector de huérfanos"""
+
+    def test_removes_only_old_unreferenced(self, tmp_path):
+        """Test que se conservan los referenciados y los recientes"""
+        originales = tmp_path / "uploads/videos/originales"
+        _archivo(originales / "vivo.mp4")
+        huerfano = _archivo(originales / "borrado.mp4")
+        reciente = _archivo(originales / "nuevo.mp4", antiguo=False)
+        hls = _archivo(tmp_path / "processed/hls/borrado/master.m3u8")
+        os.utime(hls.parent, (1, 1))
+
+        collector, consultas = _collector(tmp_path, vivas={"uploads/videos/originales/vivo.mp4"})
+        result = collector.run()
+
+        assert result["cleaned_files"] == 2
+        assert result["bytes_reclaimed"] == 20
+        assert not huerfano.exists() and not hls.parent.exists()
+        assert reciente.exists() and (originales / "vivo.mp4").exists()
+        # Una sola consulta por lote con los ids del nombre de archivo
+        assert len(consultas) == 1
+        assert consultas[0][0] == {"vivo", "borrado"}
+
+    def test_cursor_resumes_across_runs(self, tmp_path):
+        """Test que cada ejecución revisa un lote y continúa desde su cursor"""
+        for i in range(5):
+            _archivo(tmp_path / "uploads/tmp" / f"{i}.chunk")
+        _archivo(tmp_path / "uploads/videos/originales/vivo.mp4")
+        collector, _ = _collector(tmp_path, vivas={"uploads/videos/originales/vivo.mp4"}, batch_size=2)
+
+        destino = posicion = 0
+        eliminados = 0
+        for _ in range(6):
+            result = collector.run(destino, posicion)
+            assert result["scanned"] <= 2
+            eliminados += result["cleaned_files"]
+            destino, posicion = result["destino"], result["posicion"]
+
+        assert eliminados == 5
+        assert not os.listdir(tmp_path / "uploads/tmp")
+        assert (tmp_path / "uploads/videos/originales/vivo.mp4").exists()
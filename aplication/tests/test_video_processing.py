@@ -0,0 +1,329 @@
+import os
+import pytest
+
+from app.config.settings import settings
+from app.core.processing_params import params_version, current_processing_params
+from app.workers.output_cache import OutputCache
+from app.workers.video_processing import (
+    build_transcode_command, build_remux_command, build_hls_command, select_processing_route,
+    build_sprite_vtt, parse_progress, ProgressReporter, StageRunner, run_ffmpeg,
+    publish_thumbnails, publish_hls
+)
+
+
+class TestTranscodeCommand:
+    """Tests de los comandos ffmpeg del worker (sin ejecutar ffmpeg)"""
+
+    def test_single_pass_with_logo(self):
+        """Test que recorte, escalado y logo van en una sola invocación"""
+        cmd = build_transcode_command("in.mp4", "out.mp4", "logo.png")
+
+        assert cmd.count("-i") == 2
+        assert cmd.count("-c:v") == 1
+        graph = cmd[cmd.index("-filter_complex") + 1]
+        assert "force_original_aspect_ratio=decrease" in graph
+        assert "pad=1280:720" in graph
+        assert "overlay=10:10" in graph
+        assert cmd[cmd.index("-t") + 1] == str(settings.TARGET_DURATION)
+        assert "-an" in cmd
+        assert "+faststart" in cmd
+        assert cmd[-1] == "out.mp4"
+
+    def test_without_logo(self):
+        """Test que sin logo solo se aplica el filtro de escalado"""
+        cmd = build_transcode_command("in.mp4", "out.mp4")
+
+        assert cmd.count("-i") == 1
+        assert "-filter_complex" not in cmd
+        assert "overlay" not in cmd[cmd.index("-vf") + 1]
+
+
+class TestProcessingRoute:
+    """Tests de la elección entre remux y transcodificación"""
+
+    def _info(self, **cambios):
+        info = {"codec": "h264", "resolucion": "1280x720", "duracion": 20.0, "perfil": 100,
+                "pix_fmt": "yuv420p", "sar": "1:1", "fps_variable": False}
+        info.update(cambios)
+        return info
+
+    def test_matching_input_is_remuxed(self):
+        """Test que un original que ya cumple la especificación no se recodifica"""
+        assert select_processing_route(self._info()) == "remux"
+        assert select_processing_route(self._info(), "logo.png") == "overlay_rapido"
+
+    def test_non_matching_input_is_transcoded(self):
+        """Test que cualquier diferencia con la especificación usa la transcodificación completa"""
+        assert select_processing_route(self._info(codec="hevc")) == "transcode"
+        assert select_processing_route(self._info(resolucion="1920x1080")) == "transcode"
+        assert select_processing_route(self._info(duracion=45.0)) == "transcode"
+        assert select_processing_route(None) == "transcode"
+
+    def test_sources_needing_normalization_are_transcoded(self):
+        """Test que 10 bits, croma 4:2:2/4:4:4, High 10, píxel no cuadrado o VFR no se copian"""
+        assert select_processing_route(self._info(perfil=110, pix_fmt="yuv420p10le")) == "transcode"
+        assert select_processing_route(self._info(perfil=122, pix_fmt="yuv422p")) == "transcode"
+        assert select_processing_route(self._info(perfil=244, pix_fmt="yuv444p")) == "transcode"
+        assert select_processing_route(self._info(sar="4:3")) == "transcode"
+        assert select_processing_route(self._info(fps_variable=True)) == "transcode"
+        assert select_processing_route(self._info(pix_fmt=None), "logo.png") == "transcode"
+
+        cmd = build_transcode_command("in.mp4", "out.mp4")
+        assert cmd[cmd.index("-pix_fmt") + 1] == "yuv420p"
+
+    def test_remux_copies_stream(self):
+        """Test que el remux copia el video y mueve moov al inicio"""
+        cmd = build_remux_command("in.mp4", "out.mp4")
+        assert cmd[cmd.index("-c:v") + 1] == "copy"
+        assert "+faststart" in cmd
+
+
+class TestProgress:
+    """Tests del progreso reportado a partir de -progress de ffmpeg"""
+
+    def test_parse_progress_block(self):
+        """Test que se interpretan tiempo codificado y velocidad"""
+        assert parse_progress({"out_time_ms": "15000000", "speed": "2.5x"}) == (15.0, 2.5)
+        assert parse_progress({"out_time_us": "500000", "speed": "N/A"}) == (0.5, None)
+
+    def test_reporter_throttles_updates(self):
+        """Test que las actualizaciones se limitan y exponen velocidad y ETA"""
+        estados = []
+        reporter = ProgressReporter(lambda state, meta: estados.append(meta), duracion=30, intervalo=60)
+
+        reporter(15.0, 3.0)
+        reporter(20.0, 4.0)
+
+        assert len(estados) == 1
+        assert estados[0]["current"] == 55
+        assert estados[0]["speed"] == 3.0
+        assert estados[0]["eta"] == 5.0
+        assert reporter.velocidad == 4.0
+
+    def _fake_ffmpeg(self, tmp_path, final="sleep 30"):
+        """Ejecutable que reporta progreso como ffmpeg y anota su pid"""
+        script = tmp_path / "ffmpeg"
+        script.write_text(
+            "#!/bin/sh\n"
+            f"echo $$ > {tmp_path / 'pid'}\n"
+            "for i in 1 2 3; do echo out_time_us=${i}000000; echo speed=1x; echo progress=continue; sleep 0.1; done\n"
+            f"echo progress=end; {final}\n"
+        )
+        script.chmod(0o755)
+        return [str(script), "-i", "in.mp4", "out.mp4"]
+
+    def test_progress_errors_do_not_abort_encode(self, tmp_path):
+        """Test que un fallo del callback de progreso no interrumpe ffmpeg"""
+        def progress(segundos, velocidad):
+            raise ConnectionError("redis caído")
+
+        run_ffmpeg(self._fake_ffmpeg(tmp_path, final="exit 0"), progress)
+
+    def test_interrupted_encode_kills_ffmpeg(self, tmp_path):
+        """Test que una interrupción durante la lectura (p. ej. SoftTimeLimitExceeded) no deja ffmpeg huérfano"""
+        class Interrupcion(BaseException):
+            pass
+
+        def progress(segundos, velocidad):
+            if segundos >= 2:
+                raise Interrupcion()
+
+        with pytest.raises(Interrupcion):
+            run_ffmpeg(self._fake_ffmpeg(tmp_path), progress)
+
+        pid = int((tmp_path / "pid").read_text())
+        with pytest.raises(ProcessLookupError):
+            os.kill(pid, 0)
+
+
+class TestHlsLadder:
+    """Tests del comando de la escalera HLS"""
+
+    def test_single_invocation_with_split(self):
+        """Test que todas las rendiciones salen de una decodificación con keyframes alineados"""
+        cmd = build_hls_command("final.mp4", "/tmp/hls", ["1280x720:2800k", "640x360:800k"])
+
+        assert cmd.count("-i") == 1
+        assert cmd[cmd.index("-filter_complex") + 1].startswith("[0:v]split=2[s0][s1];")
+        assert cmd[cmd.index("-var_stream_map") + 1] == "v:0 v:1"
+        assert "-b:v:1" in cmd and cmd[cmd.index("-b:v:1") + 1] == "800k"
+        assert cmd[cmd.index("-sc_threshold") + 1] == "0"
+        assert cmd[-1] == "/tmp/hls/v%v.m3u8"
+
+
+class TestThumbnails:
+    """Tests del póster, sprite e índice VTT"""
+
+    def test_thumbnails_share_main_decode(self):
+        """Test que póster y sprite salen del mismo grafo que la codificación principal"""
+        cmd = build_transcode_command("in.mp4", "out.mp4", "logo.png", thumbnails_dir="/tmp/min")
+
+        assert cmd.count("ffmpeg") == 1
+        graph = cmd[cmd.index("-filter_complex") + 1]
+        assert "split=3[out][p][s]" in graph
+        assert "tile=" in graph
+        assert cmd.index("out.mp4") < cmd.index("/tmp/min/poster.jpg")
+
+    def test_sprite_vtt_coordinates(self):
+        """Test que el índice VTT apunta a cada celda del sprite"""
+        vtt = build_sprite_vtt(12, "abc_sprite.jpg")
+        lineas = vtt.splitlines()
+
+        assert lineas[0] == "WEBVTT"
+        assert "00:00:00.000 --> 00:00:02.000" in lineas
+        assert "abc_sprite.jpg#xywh=160,0,160,90" in lineas
+        assert vtt.count("#xywh=") == 6
+
+
+class TestOutputCache:
+    """Tests del caché de salidas procesadas"""
+
+    def _salida(self, directorio, contenido=b"video"):
+        (directorio / "miniaturas").mkdir(parents=True)
+        (directorio / "final.mp4").write_bytes(contenido)
+        (directorio / "miniaturas" / "poster.jpg").write_bytes(b"img")
+
+    def test_key_depends_on_hash_and_params(self):
+        """Test que la clave cambia con el original o los parámetros solicitados"""
+        parametros = {"duracion_maxima": 30, "resolucion_objetivo": "1280x720", "incluir_logo": True}
+        clave = OutputCache.key("a" * 64, parametros)
+
+        assert clave == OutputCache.key("a" * 64, {**parametros, "ruta_procesamiento": "remux"})
+        assert clave != OutputCache.key("b" * 64, parametros)
+        assert clave != OutputCache.key("a" * 64, {**parametros, "incluir_logo": False})
+
+    def test_store_and_lookup(self, tmp_path):
+        """Test que un acierto replica los artefactos y su meta"""
+        cache = OutputCache(root=str(tmp_path / "cache"), max_bytes=10_000)
+        self._salida(tmp_path / "trabajo")
+        cache.store("k1", str(tmp_path / "trabajo"), {"ruta_procesamiento": "transcode"})
+
+        destino = tmp_path / "reintento"
+        meta = cache.lookup("k1", str(destino))
+
+        assert meta["ruta_procesamiento"] == "transcode"
+        assert (destino / "final.mp4").read_bytes() == b"video"
+        assert (destino / "miniaturas" / "poster.jpg").exists()
+        assert cache.lookup("otra", str(tmp_path / "nada")) is None
+
+    def test_evicts_least_recently_used(self, tmp_path):
+        """Test que al superar el presupuesto se expulsa la entrada usada hace más tiempo"""
+        cache = OutputCache(root=str(tmp_path / "cache"), max_bytes=25)
+        self._salida(tmp_path / "a", b"x" * 8)
+        self._salida(tmp_path / "b", b"y" * 8)
+        self._salida(tmp_path / "c", b"z" * 8)
+
+        cache.store("a", str(tmp_path / "a"), {})
+        os.utime(tmp_path / "cache" / "a", (1, 1))
+        cache.store("b", str(tmp_path / "b"), {})
+        cache.store("c", str(tmp_path / "c"), {})
+
+        assert not (tmp_path / "cache" / "a").exists()
+        assert (tmp_path / "cache" / "b").exists()
+        assert (tmp_path / "cache" / "c").exists()
+
+
+class TestStageRunner:
+    """Tests de las etapas con checkpoint"""
+
+    def test_records_and_resumes(self):
+        """Test que un reintento no repite las etapas completadas"""
+        guardadas = {}
+        ejecutadas = []
+        runner = StageRunner(guardar_etapa=guardadas.__setitem__)
+        runner.run("sondeo", lambda: ejecutadas.append("sondeo") or {"duracion": 30})
+
+        assert guardadas["sondeo"]["estado"] == "completado"
+        assert guardadas["sondeo"]["duracion"] >= 0
+
+        reintento = StageRunner(etapas=guardadas)
+        assert reintento.run("sondeo", lambda: ejecutadas.append("sondeo")) == {"duracion": 30}
+        reintento.run("transcodificacion", lambda: ejecutadas.append("transcodificacion"))
+        assert ejecutadas == ["sondeo", "transcodificacion"]
+
+    def test_invalid_checkpoint_reruns_and_invalidates_dependents(self):
+        """Test que sin artefactos se repite la etapa y se descartan las dependientes"""
+        etapas = {
+            "transcodificacion": {"estado": "completado", "resultado": {}},
+            "derivados": {"estado": "completado", "resultado": {}},
+        }
+        runner = StageRunner(etapas=etapas)
+        runner.run("transcodificacion", lambda: {"nuevo": True}, valido=lambda _: False, invalida=("derivados",))
+
+        assert runner.etapas["transcodificacion"]["resultado"] == {"nuevo": True}
+        assert not runner.completada("derivados")
+
+
+class TestPublication:
+    """Tests de la etapa de publicación interrumpida y reintentada"""
+
+    def _storage(self, tmp_path):
+        from app.core.storage_backend import LocalStorageBackend
+        return LocalStorageBackend(root=str(tmp_path / "storage"), public_url="/storage")
+
+    def test_retry_keeps_already_published_thumbnails(self, tmp_path):
+        """Test que un reintento tras mover póster y sprite devuelve las mismas claves"""
+        storage = self._storage(tmp_path)
+        miniaturas = tmp_path / "miniaturas"
+        miniaturas.mkdir()
+        (miniaturas / f"poster.{settings.THUMBNAIL_FORMAT}").write_bytes(b"img")
+        (miniaturas / f"sprite.{settings.THUMBNAIL_FORMAT}").write_bytes(b"img")
+
+        claves = publish_thumbnails(storage, "abc", str(miniaturas), 30)
+        assert claves and all(storage.exists(clave) for clave in claves.values())
+        assert publish_thumbnails(storage, "abc", str(miniaturas), 30) == claves
+
+    def test_retry_finishes_partial_hls(self, tmp_path):
+        """Test que un reintento publica lo que quedó en disco y devuelve el master"""
+        storage = self._storage(tmp_path)
+        hls = tmp_path / "hls"
+        hls.mkdir()
+        (hls / "master.m3u8").write_text("#EXTM3U")
+        (hls / "v0.m3u8").write_text("#EXTM3U")
+        # Un intento anterior alcanzó a mover un segmento
+        storage.put_stream("processed/hls/abc/v0_000.ts", iter([b"ts"]))
+
+        assert publish_hls(storage, "abc", str(hls)) == "processed/hls/abc/master.m3u8"
+        assert storage.exists("processed/hls/abc/v0.m3u8")
+        assert publish_hls(storage, "abc", str(hls)) == "processed/hls/abc/master.m3u8"
+        assert publish_hls(self._storage(tmp_path / "otro"), "abc", str(hls)) is None
+
+
+class TestProcessingParams:
+    """Tests de la versión de los parámetros de procesamiento"""
+
+    def test_version_tracks_params_and_logo(self, tmp_path, monkeypatch):
+        """Test que la versión cambia con los parámetros y con LOGO_VERSION, no con el archivo visible"""
+        monkeypatch.setattr(settings, "LOGO_PATH", str(tmp_path / "logo.png"))
+        parametros = {"duracion_maxima": 30, "resolucion_objetivo": "1280x720", "incluir_logo": True}
+        version = params_version(parametros)
+
+        assert version == params_version({**parametros, "ruta_procesamiento": "remux"})
+        assert version != params_version({**parametros, "resolucion_objetivo": "854x480"})
+
+        # Un proceso sin el archivo de logo calcula la misma versión que uno que sí lo tiene
+        (tmp_path / "logo.png").write_bytes(b"logo")
+        assert version == params_version(parametros)
+
+        monkeypatch.setattr(settings, "LOGO_VERSION", "2")
+        assert version != params_version(parametros)
+        assert current_processing_params()["version_parametros"] == params_version(parametros)
+
+    def test_duplicate_without_requested_logo_is_not_reused(self, monkeypatch):
+        """Test que una salida cuyo overlay falló no se reutiliza para un video que pide logo"""
+        import asyncio
+        from types import SimpleNamespace
+        from unittest.mock import AsyncMock, MagicMock
+        from app.services import video_service
+        from app.services.video_service import VideoService
+
+        monkeypatch.setattr(video_service, "get_storage", lambda: None)
+        parametros = {"duracion_maxima": 30, "resolucion_objetivo": "1280x720", "incluir_logo": True,
+                      "version_parametros": "v"}
+        sin_logo = (SimpleNamespace(id="a"), SimpleNamespace(parametros={**parametros, "logo_aplicado": False}))
+        con_logo = (SimpleNamespace(id="b"), SimpleNamespace(parametros={**parametros, "logo_aplicado": True}))
+        db = MagicMock()
+        db.execute = AsyncMock(return_value=MagicMock(all=MagicMock(return_value=[sin_logo, con_logo])))
+
+        duplicado = asyncio.run(VideoService(db)._find_processed_duplicate("h" * 64, parametros))
+        assert duplicado.id == "b"